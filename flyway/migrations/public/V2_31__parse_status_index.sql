@@ -0,0 +1,24 @@
+-- Parsing status of the raw data files (S3 object versions), written and
+-- read by the file ingest. Replaces the lookup of the object tags of every
+-- version. Objects which are not yet indexed are backfilled from their tags.
+--
+-- The workers connect with the DSM user, but the dsm_db schema is managed
+-- by the alembic migrations of the data source management, so the table
+-- lives in its own schema.
+CREATE SCHEMA IF NOT EXISTS file_ingest;
+GRANT USAGE ON SCHEMA file_ingest TO ${dsm_db_user};
+
+CREATE TABLE IF NOT EXISTS file_ingest.parse_status
+(
+    bucket         TEXT NOT NULL,
+    object_name    TEXT NOT NULL,
+    version_id     TEXT NOT NULL,
+    last_modified  TIMESTAMP WITH TIME ZONE,
+    parser_id      TEXT,
+    parsing_status TEXT,
+    parsed_at      TIMESTAMP WITH TIME ZONE,
+
+    PRIMARY KEY (bucket, object_name, version_id)
+);
+
+GRANT ALL PRIVILEGES ON TABLE file_ingest.parse_status TO ${dsm_db_user};
@@ -0,0 +1,155 @@
+-- Add the hourly and daily observation rollups (see src/sql/postgres-ddl.sql)
+-- to all existing thing schemas. The existing datastreams are queued in
+-- observation_rollup_backfill, the rollup worker logs their hours and fills
+-- the new tables a few datastreams at a time (timeio.rollups), so the
+-- migration itself does not need to scan the observations.
+DO $$
+DECLARE
+    schema_name TEXT;
+    reader      TEXT;
+BEGIN
+    FOR schema_name IN
+        SELECT schemaname
+        FROM pg_tables
+        WHERE tablename = 'observation'
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %1$I.observation_rollup_log (
+                "datastream_id" bigint                   NOT NULL,
+                "bucket"        timestamp with time zone NOT NULL,
+                CONSTRAINT observation_rollup_log_pk PRIMARY KEY ("datastream_id", "bucket")
+            )',
+            schema_name
+        );
+
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %1$I.observation_hourly (
+                "datastream_id" bigint                   NOT NULL,
+                "bucket"        timestamp with time zone NOT NULL,
+                "count"         bigint                   NOT NULL,
+                "count_number"  bigint                   NOT NULL,
+                "min"           double precision         NULL,
+                "max"           double precision         NULL,
+                "mean"          double precision         NULL,
+                "last"          double precision         NULL,
+                "last_time"     timestamp with time zone NOT NULL,
+                "flagged"       bigint                   NOT NULL,
+                CONSTRAINT observation_hourly_pk PRIMARY KEY ("datastream_id", "bucket")
+            )',
+            schema_name
+        );
+
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %1$I.observation_daily (
+                "datastream_id" bigint                   NOT NULL,
+                "bucket"        timestamp with time zone NOT NULL,
+                "count"         bigint                   NOT NULL,
+                "count_number"  bigint                   NOT NULL,
+                "min"           double precision         NULL,
+                "max"           double precision         NULL,
+                "mean"          double precision         NULL,
+                "last"          double precision         NULL,
+                "last_time"     timestamp with time zone NOT NULL,
+                "flagged"       bigint                   NOT NULL,
+                CONSTRAINT observation_daily_pk PRIMARY KEY ("datastream_id", "bucket")
+            )',
+            schema_name
+        );
+
+        EXECUTE format(
+            'COMMENT ON COLUMN %1$I.observation_hourly.count IS ''Number of observations, of any result type.''',
+            schema_name
+        );
+        EXECUTE format(
+            'COMMENT ON COLUMN %1$I.observation_hourly.count_number IS ''Number of numerical observations, the weight of the mean.''',
+            schema_name
+        );
+        EXECUTE format(
+            'COMMENT ON COLUMN %1$I.observation_hourly.flagged IS ''Number of observations with a quality flag, like shown in the dashboards.''',
+            schema_name
+        );
+
+        EXECUTE format(
+            'CREATE OR REPLACE FUNCTION %1$I.observation_rollup_log_changes() RETURNS trigger
+                LANGUAGE plpgsql
+                SET search_path = %1$I
+            AS
+            $f$
+            BEGIN
+                IF TG_OP IN (''INSERT'', ''UPDATE'') THEN
+                    INSERT INTO observation_rollup_log (datastream_id, bucket)
+                    SELECT DISTINCT datastream_id, date_trunc(''hour'', result_time, ''UTC'')
+                    FROM new_rows
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                IF TG_OP IN (''UPDATE'', ''DELETE'') THEN
+                    INSERT INTO observation_rollup_log (datastream_id, bucket)
+                    SELECT DISTINCT datastream_id, date_trunc(''hour'', result_time, ''UTC'')
+                    FROM old_rows
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END
+            $f$',
+            schema_name
+        );
+
+        EXECUTE format(
+            'CREATE OR REPLACE TRIGGER observation_rollup_insert
+                AFTER INSERT ON %1$I.observation
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION %1$I.observation_rollup_log_changes()',
+            schema_name
+        );
+        EXECUTE format(
+            'CREATE OR REPLACE TRIGGER observation_rollup_update
+                AFTER UPDATE ON %1$I.observation
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION %1$I.observation_rollup_log_changes()',
+            schema_name
+        );
+        EXECUTE format(
+            'CREATE OR REPLACE TRIGGER observation_rollup_delete
+                AFTER DELETE ON %1$I.observation
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION %1$I.observation_rollup_log_changes()',
+            schema_name
+        );
+
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %1$I.observation_rollup_backfill (
+                "datastream_id" bigint NOT NULL,
+                CONSTRAINT observation_rollup_backfill_pk PRIMARY KEY ("datastream_id")
+            )',
+            schema_name
+        );
+        EXECUTE format(
+            'INSERT INTO %1$I.observation_rollup_backfill (datastream_id)
+            SELECT id FROM %1$I.datastream
+            ON CONFLICT DO NOTHING',
+            schema_name
+        );
+
+        -- the schema owner writes observations (and thus the log), the
+        -- read-only users of STA and Grafana read the observations
+        IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = schema_name) THEN
+            EXECUTE format(
+                'GRANT ALL PRIVILEGES ON %1$I.observation_rollup_log, %1$I.observation_rollup_backfill, %1$I.observation_hourly, %1$I.observation_daily TO %1$I',
+                schema_name
+            );
+        END IF;
+        FOR reader IN
+            SELECT DISTINCT grantee
+            FROM information_schema.role_table_grants
+            WHERE table_schema = schema_name
+              AND table_name = 'observation'
+              AND privilege_type = 'SELECT'
+              AND grantee NOT IN (schema_name, 'PUBLIC')
+        LOOP
+            EXECUTE format(
+                'GRANT SELECT ON %1$I.observation_hourly, %1$I.observation_daily TO %2$I',
+                schema_name, reader
+            );
+        END LOOP;
+    END LOOP;
+END $$;
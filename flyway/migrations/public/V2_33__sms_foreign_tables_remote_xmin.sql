@@ -0,0 +1,22 @@
+-- Expose the xmin system column of the remote rows in all postgres_fdw
+-- foreign tables (the SMS tables). The SMS views syncer detects changed
+-- tables by the sum of hashxidextended(remote_xmin, 0), an aggregate that
+-- postgres_fdw runs on the remote server, so the rows are not transferred
+-- (see timeio.sms.SmsMaterializedViewsSyncer).
+DO $$
+DECLARE
+    rel regclass;
+BEGIN
+    FOR rel IN
+        SELECT ft.ftrelid::regclass
+        FROM pg_foreign_table ft
+        JOIN pg_foreign_server s ON s.oid = ft.ftserver
+        JOIN pg_foreign_data_wrapper w ON w.oid = s.srvfdw
+        WHERE w.fdwname = 'postgres_fdw'
+    LOOP
+        EXECUTE format(
+            'ALTER FOREIGN TABLE %s ADD COLUMN IF NOT EXISTS remote_xmin xid OPTIONS (column_name ''xmin'')',
+            rel
+        );
+    END LOOP;
+END $$;
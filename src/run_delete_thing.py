@@ -13,6 +13,8 @@ from crontab import CronTab
 from minio.credentials import StaticProvider
 from minio.deleteobjects import DeleteObject
 
+from timeio.partitioning import DEFAULT, is_partitioned, partitions
+
 # Configure logging to output to console
 logging.basicConfig(
     level=logging.INFO, format="[%(asctime)s | %(name)s] %(levelname)s: %(message)s"
@@ -127,6 +129,29 @@ def delete_qc(cursor, sta_datastream_ids):
         cursor.execute(query)
 
 
+def truncate_exclusive_partitions(cur, schema, datastream_ids):
+    """
+    Truncate the partitions of a partitioned observation table, which only
+    hold observations of the given datastreams, which is way cheaper than
+    deleting their rows one by one.
+    """
+    if not is_partitioned(cur, schema):
+        return
+    for partition in partitions(cur, schema):
+        if partition == DEFAULT:
+            continue
+        cur.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM {schema}.{partition})
+            AND NOT EXISTS (
+                SELECT 1 FROM {schema}.{partition}
+                WHERE datastream_id NOT IN ({",".join(datastream_ids)})
+            )
+            """)
+        if cur.fetchone()[0]:
+            logger.info(f"Truncate partition {schema}.{partition}")
+            cur.execute(f"TRUNCATE {schema}.{partition}")
+
+
 def delete_thing_from_schema(cur, schema, thing_uuid):
     """
     NOTE:
@@ -142,12 +167,22 @@ def delete_thing_from_schema(cur, schema, thing_uuid):
     )
     datastream_ids = [str(i[0]) for i in cur.fetchall()]
     if datastream_ids:
+        truncate_exclusive_partitions(cur, schema, datastream_ids)
         cur.execute(f"""
             DELETE FROM {schema}.observation WHERE datastream_id in ({",". join(datastream_ids)})
             """)
         cur.execute(f"""
             DELETE FROM {schema}.datastream WHERE id in ({",". join(datastream_ids)});
             """)
+        # truncated partitions are not logged for the rollup refresh
+        for table in [
+            "observation_hourly",
+            "observation_daily",
+            "observation_rollup_log",
+        ]:
+            cur.execute(f"""
+                DELETE FROM {schema}.{table} WHERE datastream_id in ({",". join(datastream_ids)})
+                """)
 
     cur.execute(
         f"""
@@ -5,23 +5,29 @@ import json
 import logging
 import codecs
 from datetime import datetime, timezone
-import warnings
+from typing import Iterator
 
-from minio import Minio, S3Error
+import pandas as pd
+
+from minio import Minio
 from minio.commonconfig import Tags
+from minio.datatypes import Object
 
-from timeio.common import get_envvar, setup_logging
+from timeio.common import collect_warnings, get_envvar, setup_logging
 from timeio.errors import UserInputError, ParsingError, ParsingWarning, EmptyDataError
-from timeio.feta import Thing, FileParser
+from timeio.feta import ThingCache, get_pool
 from timeio.journaling import Journal
 from timeio.mqtt import AbstractHandler, MQTTMessage
+from timeio.parse_status import ParseStatus, ParseStatusIndex, tag_parse_status
 from timeio.parser import get_parser
+from timeio.remote_fs import MANIFEST_PATH as SFTP_SYNC_MANIFEST
 from timeio.databases import DBapi
 
 _FILE_MAX_SIZE = 256 * 1024 * 1024
+_STREAM_READ_SIZE = 1024 * 1024
 
 logger = logging.getLogger("file-ingest")
-journal = Journal("Parser", errors="warn")
+journal = Journal("Parser", errors="warn", background=True)
 
 
 class ParserJobHandler(AbstractHandler):
@@ -44,9 +50,32 @@ class ParserJobHandler(AbstractHandler):
         )
         self.pub_topic = get_envvar("TOPIC_DATA_PARSED")
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
+        self.things = ThingCache(
+            self.dsmdb_dsn,
+            maxsize=get_envvar("THING_CACHE_SIZE", 1024, cast_to=int),
+            ttl=get_envvar("THING_CACHE_TTL", 300, cast_to=float),
+        )
+        # The configdb-updater publishes the update after storing the Thing
+        self.subscribe(
+            get_envvar("TOPIC_CONFIG_DB_UPDATE", "configdb_update"),
+            self.things.on_thing_update,
+        )
         self.dbapi = DBapi(
             get_envvar("DB_API_BASE_URL"), get_envvar("DB_API_AUTH_TOKEN")
         )
+        # Parse files chunk-wise to keep the memory footprint bounded,
+        # only applies to parsers that support it (see AbcParser.is_streamable)
+        self.streaming = get_envvar("STREAMING", default=False, cast_to=bool)
+        self.chunksize = get_envvar("STREAMING_CHUNK_SIZE", 100_000, cast_to=int)
+        # Keep the parsing status of the files in the DSM database, to
+        # find the parser of a re-uploaded file with a single lookup
+        self.parse_status = None
+        if get_envvar("PARSE_STATUS_INDEX", default=True, cast_to=bool):
+            self.parse_status = ParseStatusIndex(get_pool(self.dsmdb_dsn))
+
+    def ordering_key(self, content: dict, message: MQTTMessage) -> str | None:
+        # files of the same thing (bucket) are parsed in order
+        return content.get("Key", "").split("/", maxsplit=1)[0] or None
 
     def act(self, content: dict, message: MQTTMessage):
 
@@ -57,20 +86,20 @@ class ParserJobHandler(AbstractHandler):
         # Directories are part of the filename
         # eg: foo/bar/file.ext -> bucket: foo, file: bar/file.ext
         bucket_name, filename = content["Key"].split("/", maxsplit=1)
+        if filename == SFTP_SYNC_MANIFEST:
+            logger.debug("ignoring the manifest of the SFTP sync")
+            return
 
-        thing = Thing.from_s3_bucket_name(bucket_name, dsn=self.dsmdb_dsn)
+        thing = self.things.from_s3_bucket_name(bucket_name)
         thing_uuid = thing.uuid
-        file_parser = FileParser.from_id(
-            thing.s3_store.file_parser_id, dsn=self.dsmdb_dsn
-        )
+        file_parser = thing.s3_store.file_parser
         schema = thing.project.database.schema
         pattern = thing.s3_store.filename_pattern
         if not fnmatch.fnmatch(filename, pattern):
             logger.debug(f"{filename} is excluded by filename_pattern {pattern!r}")
             return
-        tags = self.get_parser_tags(bucket_name, filename)
-        if tags is not None:
-            parser_uuid = tags["parser_id"]
+        parser_uuid = self.get_parser_id(bucket_name, filename)
+        if parser_uuid is not None:
             logger.info(f"Re-parsing file with parser from file tag {parser_uuid}")
         else:
             parser_uuid = file_parser.uuid
@@ -85,62 +114,87 @@ class ParserJobHandler(AbstractHandler):
 
         file = "/".join(source_uri.split("/")[1:])  # remove bucket name from source_uri
 
-        with warnings.catch_warnings(record=True) as recorded_warnings:
-            warnings.simplefilter("always", ParsingWarning)
-            try:
-                rawdata = self.read_file(
-                    bucket_name, filename, encoding, parser.is_binary
-                )
-                df = parser.do_parse(rawdata, schema, thing_uuid)
-                obs = parser.to_observations(df, source_uri, str(parser_uuid))
-            except ParsingError as e:
-                journal.error(
-                    f"Parsing failed. File: {file!r} | Detail: {e}", thing_uuid
-                )
-                self.set_tags(bucket_name, filename, str(parser_uuid), "failed")
-                raise e
-            except EmptyDataError:
-                journal.warning("Parsing skipped. File: {file!r} is empty.", thing_uuid)
-                return
-            except Exception as e:
-                journal.error(
-                    f"Parsing failed. File: {file!r} | Detail: {e}", thing_uuid
-                )
-                self.set_tags(bucket_name, filename, str(parser_uuid), "failed")
-                raise UserInputError("Parsing failed") from e
+        # the version which is read and tagged, even if a new one is
+        # uploaded in the meantime
+        obj = self.minio.stat_object(bucket_name, filename)
+
+        # In streaming mode every chunk is stored as soon as it is parsed. If
+        # a later chunk fails, the observations of the previous chunks stay
+        # in the database, while the file is tagged as failed. We report the
+        # stored rows to the user, a fixed parser stores the file completely,
+        # as the observations are upserted.
+        n_rows = n_obs = 0
+        with collect_warnings(ParsingWarning) as recorded_warnings:
+            chunks = self.parse_chunks(
+                parser,
+                obj,
+                encoding,
+                schema,
+                thing_uuid,
+                str(parser_uuid),
+            )
+            while True:
+                try:
+                    df, obs = next(chunks)
+                except StopIteration:
+                    break
+                except ParsingError as e:
+                    journal.error(
+                        f"Parsing failed. File: {file!r} | Detail: {e}"
+                        + self.stored_before_failure(n_rows),
+                        thing_uuid,
+                    )
+                    self.set_tags(obj, str(parser_uuid), "failed")
+                    raise e
+                except EmptyDataError:
+                    journal.warning(
+                        "Parsing skipped. File: {file!r} is empty.", thing_uuid
+                    )
+                    return
+                except Exception as e:
+                    journal.error(
+                        f"Parsing failed. File: {file!r} | Detail: {e}"
+                        + self.stored_before_failure(n_rows),
+                        thing_uuid,
+                    )
+                    self.set_tags(obj, str(parser_uuid), "failed")
+                    raise UserInputError("Parsing failed") from e
+
+                logger.debug("storing observations to database ...")
+                try:
+                    self.dbapi.upsert_observations_and_datastreams(
+                        thing_uuid, obs, mutable=False
+                    )
+                except Exception as e:
+                    # Tell the user that his parsing was successful
+                    journal.error(
+                        f"Parsing was successful, but storing data "
+                        f"in database failed. File: {file!r}"
+                        + self.stored_before_failure(n_rows),
+                        thing_uuid,
+                    )
+                    self.set_tags(obj, str(parser_uuid), "db_insert_failed")
+                    raise e
+                n_rows += df.shape[0]
+                n_obs += len(obs)
 
             for w in recorded_warnings:
                 logger.info(f"{w.message!r}")
                 journal.warning(f"{w.message}", thing_uuid)
 
-        logger.debug("storing observations to database ...")
-        try:
-            self.dbapi.upsert_observations_and_datastreams(
-                thing_uuid, obs, mutable=False
-            )
-        except Exception as e:
-            # Tell the user that his parsing was successful
-            journal.error(
-                f"Parsing was successful, but storing data "
-                f"in database failed. File: {file!r}",
-                thing_uuid,
-            )
-            self.set_tags(bucket_name, filename, str(parser_uuid), "db_insert_failed")
-            raise e
-
-        if len(obs) == 0:
+        if n_obs == 0:
             journal.warning(f"Parsed file: {file!r} is empty.", thing_uuid)
             return
 
         # Now everything is fine and we tell the user
         journal.info(
             f"Parsed file: {file!r} | "
-            f"Data rows: {df.shape[0]} | "
-            f"Stored observations: {len(obs)}",
+            f"Data rows: {n_rows} | "
+            f"Stored observations: {n_obs}",
             thing_uuid,
         )
 
-        self.set_tags(bucket_name, filename, str(parser_uuid), "successful")
+        self.set_tags(obj, str(parser_uuid), "successful")
         payload = json.dumps(
             {
                 "thing_uuid": str(thing_uuid),
@@ -153,6 +207,12 @@ class ParserJobHandler(AbstractHandler):
             topic=self.pub_topic, payload=payload, qos=self.mqtt_qos
         )
 
+    @staticmethod
+    def stored_before_failure(n_rows: int) -> str:
+        if n_rows == 0:
+            return ""
+        return f" | Data rows stored before the failure: {n_rows}"
+
     @staticmethod
     def is_valid_event(content: dict):
         logger.debug(f'{content["EventName"]=}')
@@ -161,6 +221,51 @@ class ParserJobHandler(AbstractHandler):
             "s3:ObjectCreated:CompleteMultipartUpload",
         )
 
+    def parse_chunks(
+        self,
+        parser,
+        obj: Object,
+        encoding: str,
+        schema: str,
+        thing_uuid: str,
+        parser_uuid: str,
+    ) -> Iterator[tuple[pd.DataFrame, list]]:
+        """
+        Parse a file and yield the parsed data and its observations.
+
+        In streaming mode the file is read and parsed in chunks, otherwise
+        the whole file is parsed at once and a single chunk is yielded.
+        """
+        source_uri = f"{obj.bucket_name}/{obj.object_name}"
+        if self.streaming and parser.is_streamable:
+            self.is_valid_encoding(encoding)
+            frames = parser.iter_parse(
+                self.stream_file(obj),
+                schema,
+                thing_uuid,
+                encoding=encoding,
+                chunksize=self.chunksize,
+            )
+        else:
+            rawdata = self.read_file(obj, encoding, parser.is_binary)
+            frames = [parser.do_parse(rawdata, schema, thing_uuid)]
+
+        for df in frames:
+            yield df, parser.to_observations(df, source_uri, parser_uuid)
+
+    def get_parser_id(self, bucket_name, filename) -> str | None:
+        """Return the parser of the latest object version that was parsed
+        successfully, or None if no version was parsed successfully.
+        """
+        if self.parse_status is None:
+            tags = self.get_parser_tags(bucket_name, filename)
+            return None if tags is None else tags["parser_id"]
+
+        status = self.parse_status.lookup_or_backfill(self.minio, bucket_name, filename)
+        if status is None or status.parsing_status != "successful":
+            return None
+        return status.parser_id
+
     def get_parser_tags(self, bucket_name, filename) -> Tags | None:
         """Search the latest object that was parsed successful and return its tags.
         If no object version was parsed successful or no tags exist, return None.
@@ -181,43 +286,52 @@ class ParserJobHandler(AbstractHandler):
                 return tags
         return None
 
-    def set_tags(
-        self,
-        bucket_name,
-        filename,
-        parser_uuid,
-        parsing_status,
-    ):
-        # Reparsing won't create a new object version, so we need to
-        # overwrite the tags of the latest version
-        try:
-            object_tags = self.minio.get_object_tags(bucket_name, filename)
-        except S3Error:
-            object_tags = None
-
-        if object_tags is None:
-            object_tags = Tags.new_object_tags()
-
-        object_tags["parsed_at"] = datetime.now(tz=timezone.utc).isoformat()
-        object_tags["parser_id"] = parser_uuid
-        object_tags["parsing_status"] = parsing_status
-        self.minio.set_object_tags(bucket_name, filename, object_tags)
+    def set_tags(self, obj: Object, parser_uuid, parsing_status):
+        # Reparsing won't create a new object version, so we overwrite
+        # the tags of the version, which was parsed
+        status = ParseStatus(
+            obj.version_id,
+            obj.last_modified,
+            parser_uuid,
+            parsing_status,
+            datetime.now(tz=timezone.utc),
+        )
+        tag_parse_status(
+            self.minio, self.parse_status, obj.bucket_name, obj.object_name, status
+        )
 
-    def read_file(
-        self, bucket_name: str, object_name: str, encoding: str, is_binary: bool
-    ) -> str:
+    def read_file(self, obj: Object, encoding: str, is_binary: bool) -> str:
 
-        stat = self.minio.stat_object(bucket_name, object_name)
-        if stat.size > _FILE_MAX_SIZE:
+        if obj.size > _FILE_MAX_SIZE:
             raise IOError("Maximum filesize of 256M exceeded")
 
-        rawdata = self.minio.get_object(bucket_name, object_name).read()
+        response = self.minio.get_object(
+            obj.bucket_name, obj.object_name, version_id=obj.version_id
+        )
+        try:
+            rawdata = response.read()
+        finally:
+            response.close()
+            response.release_conn()
         if is_binary:
             return rawdata
 
         self.is_valid_encoding(encoding)
         return rawdata.decode(encoding).rstrip("\x03")
 
+    def stream_file(self, obj: Object) -> Iterator[bytes]:
+        if obj.size > _FILE_MAX_SIZE:
+            raise IOError("Maximum filesize of 256M exceeded")
+
+        response = self.minio.get_object(
+            obj.bucket_name, obj.object_name, version_id=obj.version_id
+        )
+        try:
+            yield from response.stream(_STREAM_READ_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
     @staticmethod
     def is_valid_encoding(encoding: str):
         try:
@@ -2,25 +2,27 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import sys
 import typing
 
 from paho.mqtt.client import MQTTMessage
 
-from timeio.mqtt import AbstractHandler
+from timeio.mqtt import AsyncAbstractHandler
 from timeio.common import get_envvar, setup_logging
-from timeio.errors import UserInputError
-from timeio.journaling import Journal
-from timeio.databases import DBapi
-from timeio.feta import Thing
+from timeio.errors import ParsingError, ProcessingError, UserInputError
+from timeio.journaling import AsyncJournal
+from timeio.databases import AsyncDBapi
+from timeio.feta import ThingCache
 from timeio.parser import get_parser, MqttParser
 
 logger = logging.getLogger("mqtt-ingest")
-journal = Journal("Parser")
+journal = AsyncJournal("Parser", background=True)
 
 
-class ParseMqttDataHandler(AbstractHandler):
+class ParseMqttDataHandler(AsyncAbstractHandler):
     def __init__(self):
         super().__init__(
             topic=get_envvar("TOPIC"),
@@ -33,52 +35,159 @@ class ParseMqttDataHandler(AbstractHandler):
         )
 
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
-        self.dbapi = DBapi(
-            get_envvar("DB_API_BASE_URL"), get_envvar("DB_API_AUTH_TOKEN")
+        self.things = ThingCache(
+            self.dsmdb_dsn,
+            maxsize=get_envvar("THING_CACHE_SIZE", 1024, cast_to=int),
+            ttl=get_envvar("THING_CACHE_TTL", 300, cast_to=float),
+        )
+        # The configdb-updater publishes the update after storing the Thing
+        self.subscribe(
+            get_envvar("TOPIC_CONFIG_DB_UPDATE", "configdb_update"),
+            self.things.on_thing_update,
+        )
+        self.dbapi = AsyncDBapi(
+            get_envvar("DB_API_BASE_URL"),
+            get_envvar("DB_API_AUTH_TOKEN"),
+            pool_size=self.concurrency,
         )
         self.pub_topic = get_envvar("TOPIC_DATA_PARSED")
 
-    def act(self, content: typing.Any, message: MQTTMessage):
-        origin = f"{self.mqtt_broker}/{message.topic}"
-
+        # Micro-batching: messages are collected for up to MQTT_BATCH_WINDOW
+        # seconds or MQTT_BATCH_SIZE messages and stored with one datastream
+        # insert and one upsert per thing, the things of a batch concurrently.
+        # QoS>0 messages are acknowledged after the batch was stored. Keep the
+        # batch size below the maximum number of unacknowledged messages the
+        # broker sends to a client (mosquitto: max_inflight_messages), else
+        # batches are only ever completed by the window.
+        self.batch_size = get_envvar("MQTT_BATCH_SIZE", 1, cast_to=int)
+        self.batch_window = get_envvar("MQTT_BATCH_WINDOW", 1.0, cast_to=float)
+        self._queue: asyncio.Queue | None = None
+        self._batcher: asyncio.Task | None = None
+
+    def _init_loop(self) -> None:
+        super()._init_loop()
+        if self.batch_size > 1:
+            self._queue = asyncio.Queue(maxsize=self.batch_size * 2)
+            self._batcher = self._loop.create_task(self._batch_loop())
+
+    def ordering_key(self, content: typing.Any, message: MQTTMessage) -> str:
+        # messages of the same thing (mqtt user) are stored in order
+        return message.topic.split("/")[1]
+
+    async def act(self, content: typing.Any, message: MQTTMessage):
+        if self.batch_size > 1:
+            # acknowledged by the batch loop, once the data is stored
+            self.defer_ack(message)
+            await self._queue.put((content, message))
+            return
+        await self.store(message.topic.split("/")[1], [(content, message)])
+
+    async def _batch_loop(self) -> typing.NoReturn:
+        while True:
+            await self._store_batch(await self._next_batch())
+
+    async def _next_batch(self) -> list[tuple[typing.Any, MQTTMessage]]:
+        """
+        Collect up to `batch_size` messages or as many messages as
+        arrive within `batch_window` seconds after the first one.
+        """
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = max(0.0, deadline - self._loop.time())
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _store_batch(self, batch: list[tuple[typing.Any, MQTTMessage]]) -> None:
+        logger.info(f"storing batch of {len(batch)} messages")
+        groups: dict[str, list[tuple[typing.Any, MQTTMessage]]] = {}
+        for content, message in batch:
+            groups.setdefault(message.topic.split("/")[1], []).append(
+                (content, message)
+            )
+        results = await asyncio.gather(
+            *(self.store(u, m) for u, m in groups.items()), return_exceptions=True
+        )
+        for mqtt_user, result in zip(groups, results):
+            if isinstance(result, (UserInputError, ParsingError)):
+                logger.error(
+                    f"Failed to parse messages of {mqtt_user}", exc_info=result
+                )
+            elif isinstance(result, Exception):
+                logger.critical(
+                    f"Failed to store messages of {mqtt_user}, exiting. "
+                    f"Unacknowledged messages are redelivered after restart.",
+                    exc_info=result,
+                )
+                sys.exit(1)
+        for _, message in batch:
+            self.ack(message)
+
+    async def store(
+        self, mqtt_user: str, messages: list[tuple[typing.Any, MQTTMessage]]
+    ) -> None:
+        """Parse and store the messages of a single thing at once."""
         logger.info(f"get thing")
-        mqtt_user = message.topic.split("/")[1]
-
         try:
-            thing = Thing.from_mqtt_user_name(mqtt_user, dsn=self.dsmdb_dsn)
+            thing = await asyncio.to_thread(self.things.from_mqtt_user_name, mqtt_user)
         except:
             logger.error(f"Thing for mqtt_username {mqtt_user} not found")
             return
         thing_uuid = thing.uuid
 
         logger.info("persisting rawdata")
-        self.dbapi.insert_mqtt_message(thing_uuid, content)
+        await self.dbapi.insert_mqtt_messages(thing_uuid, [c for c, _ in messages])
 
         logger.info(f"get parser")
         parser: MqttParser = get_parser(thing.mqtt.mqtt_device_type.name, None)
 
         logger.info(f"parsing rawdata")
-        try:
-            data = parser.do_parse(content, origin)
-            observations = parser.to_observations(data, thing_uuid)
-        except Exception as e:
-            raise UserInputError("Parsing data failed") from e
+        observations = []
+        origins = []
+        errors = []
+        for content, message in messages:
+            origin = f"{self.mqtt_broker}/{message.topic}"
+            try:
+                data = parser.do_parse(content, origin)
+                observations.extend(parser.to_observations(data, thing_uuid))
+            except Exception as e:
+                errors.append(e)
+                continue
+            if origin not in origins:
+                origins.append(origin)
+
+        if observations:
+            logger.info(f"store observations")
+            try:
+                await self.dbapi.upsert_observations_and_datastreams(
+                    thing_uuid, observations, mutable=False
+                )
+            except Exception as e:
+                raise ProcessingError(f"Failed to store data: {e}") from e
+            n = len(messages) - len(errors)
+            await journal.info(
+                f"parsed mqtt data from {', '.join(origins)}"
+                + (f" ({n} messages)" if n > 1 else ""),
+                thing_uuid,
+            )
 
-        logger.info(f"store observations")
-        try:
-            self.dbapi.upsert_observations_and_datastreams(
-                thing_uuid, observations, mutable=False
+            logger.info(f"send mqtt message")
+            self.mqtt_client.publish(
+                topic=self.pub_topic,
+                payload=json.dumps({"thing_uuid": str(thing_uuid)}),
+                qos=self.mqtt_qos,
             )
-        except Exception as e:
-            logger.exception(f"Failed to store data: {e}")
-        journal.info(f"parsed mqtt data from {origin}", thing_uuid)
-
-        logger.info(f"send mqtt message")
-        self.mqtt_client.publish(
-            topic=self.pub_topic,
-            payload=json.dumps({"thing_uuid": str(thing_uuid)}),
-            qos=self.mqtt_qos,
-        )
+
+        if errors:
+            raise UserInputError(
+                f"Parsing data failed for {len(errors)} of {len(messages)} messages"
+            ) from errors[0]
 
 
 if __name__ == "__main__":
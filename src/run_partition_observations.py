@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convert the observation tables of thing schemas into monthly partitioned
+tables and create the partitions of the upcoming months.
+
+    run_partition_observations.py convert --schema myproject_abc
+    run_partition_observations.py maintain --all
+
+`maintain` is meant to run regularly (e.g. daily from cron). Until the
+partition of a month exists, its observations land in the default
+partition, from where `maintain` moves them.
+"""
+
+from __future__ import annotations
+
+import logging
+
+import click
+
+from timeio.common import setup_logging
+from timeio.databases import Database
+from timeio.partitioning import convert_observation, create_partitions, is_partitioned
+
+logger = logging.getLogger("partition-observations")
+
+
+def _schemas(conn, schemas: tuple[str, ...], all_: bool) -> list[str]:
+    if all_:
+        return [
+            s
+            for (s,) in conn.execute(
+                "SELECT schemaname FROM pg_tables WHERE tablename = 'observation' "
+                "ORDER BY schemaname"
+            )
+        ]
+    if not schemas:
+        raise click.UsageError("Either pass --schema or --all")
+    return list(schemas)
+
+
+@click.group()
+@click.option("--dsn", envvar="DATABASE_DSN", required=True)
+@click.option("--schema", "schemas", multiple=True)
+@click.option("--all", "all_", is_flag=True, help="Process all thing schemas.")
+@click.option("--months-ahead", default=3, show_default=True)
+@click.option("--log-level", default="INFO", envvar="LOG_LEVEL")
+@click.pass_context
+def cli(ctx, dsn, schemas, all_, months_ahead, log_level):
+    setup_logging(log_level)
+    ctx.obj = dict(
+        db=Database(dsn), schemas=schemas, all_=all_, months_ahead=months_ahead
+    )
+
+
+@cli.command()
+@click.pass_obj
+def convert(obj):
+    """Convert unpartitioned observation tables."""
+    with obj["db"].connection(autocommit=True) as conn:
+        for schema in _schemas(conn, obj["schemas"], obj["all_"]):
+            if convert_observation(conn, schema, obj["months_ahead"]):
+                logger.info(f"Converted {schema}.observation")
+
+
+@cli.command()
+@click.pass_obj
+def maintain(obj):
+    """Create upcoming partitions of partitioned observation tables."""
+    with obj["db"].connection(autocommit=True) as conn:
+        for schema in _schemas(conn, obj["schemas"], obj["all_"]):
+            if not is_partitioned(conn, schema):
+                continue
+            try:
+                created = create_partitions(conn, schema, obj["months_ahead"])
+            except Exception:
+                logger.exception(f"Failed to create partitions in {schema}")
+                continue
+            if created:
+                logger.info(f"Created {', '.join(created)} in {schema}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -4,6 +4,13 @@ from __future__ import annotations
 
 import json
 import logging
+import multiprocessing
+import os
+import threading
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 
 import pandas as pd
@@ -20,12 +27,50 @@ from timeio.journaling import Journal
 from timeio.mqtt import AbstractHandler
 
 from timeio.qc.io import read_stream_data, write_qc_data
-from timeio.qc.saqc import SaQCWrapper
-from timeio.qc.qcfunction import get_qc_functions, filter_qc_functions, get_qc_things
+from timeio.qc.saqc import (
+    QcExecutionError,
+    SaQCResult,
+    SaQCWrapper,
+    execute_functions,
+)
+from timeio.qc.qcfunction import (
+    QcFunction,
+    QcFunctionStream,
+    filter_qc_functions,
+    get_qc_functions,
+    get_qc_things,
+    split_independent_functions,
+)
 from timeio.typehints import MqttPayload, check_dict_by_TypedDict as _chkmsg
 
 logger = logging.getLogger("run-quality-control")
-journal = Journal("QualityControl")
+journal = Journal("QualityControl", background=True)
+
+
+@dataclass
+class _PendingRun:
+    """QC triggers for the same target, merged into a single run."""
+
+    content: dict
+    first: float
+    last: float
+    messages: list[MQTTMessage] = field(default_factory=list)
+
+    def due(self, window: float, max_latency: float) -> float:
+        return min(self.last + window, self.first + max_latency)
+
+    def merge(self, content: dict, now: float) -> None:
+        self.last = now
+        for key, pick in (("start_date", min), ("end_date", max)):
+            self.content[key] = pick(
+                _timestamp(self.content[key]), _timestamp(content[key])
+            ).isoformat()
+
+
+def _timestamp(value: str) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    # naive timestamps are interpreted like in `read_stream_data`
+    return ts.tz_localize("Europe/Berlin") if ts.tz is None else ts
 
 
 class QcHandler(AbstractHandler):
@@ -41,12 +86,42 @@ class QcHandler(AbstractHandler):
         )
         self.publish_topic = get_envvar("TOPIC_QC_DONE")
         self.publish_qos = get_envvar("TOPIC_QC_DONE_QOS", cast_to=int)
-        self.db = Database(get_envvar("DATABASE_DSN"))
+        self.configdb_dsn = get_envvar("DATABASE_DSN")
+        self.db = Database(self.configdb_dsn)
+        # read the QC input directly from the observation tables
+        self.direct_read = get_envvar("QC_DIRECT_READ", True, cast_to=bool)
+        self.label_batch_size = get_envvar("QC_LABEL_BATCH_SIZE", 10_000, cast_to=int)
+        # independent chains of QC functions run in separate processes
+        self.executor = None
+        if (workers := get_envvar("QC_WORKERS", 1, cast_to=int)) > 1:
+            self.executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
         self.dbapi = DBapi(
             get_envvar("DB_API_BASE_URL"),
             get_envvar("DB_API_AUTH_TOKEN"),
         )
 
+        # Coalescing: triggers for the same thing (v1) or QC setting (v2) are
+        # collected until none arrived for QC_COALESCE_WINDOW seconds, but at
+        # most QC_COALESCE_MAX_LATENCY seconds after the first one. Then QC
+        # runs once over the union of their periods and the triggers are
+        # acknowledged. Unacknowledged triggers are redelivered after a
+        # restart. The broker sends at most max_inflight_messages of them.
+        self.coalesce_window = get_envvar("QC_COALESCE_WINDOW", 0.0, cast_to=float)
+        self.coalesce_max_latency = get_envvar(
+            "QC_COALESCE_MAX_LATENCY", 300.0, cast_to=float
+        )
+        self._pending: dict[tuple, _PendingRun] = {}
+        self._pending_changed = threading.Condition()
+        if self.coalesce_window > 0:
+            self.enable_manual_ack()
+
+    def run_loop(self) -> typing.NoReturn:
+        if self.coalesce_window > 0:
+            threading.Thread(target=self._coalesce_loop, daemon=True).start()
+        super().run_loop()
+
     @staticmethod
     def _parse_message_v1(
         conn, content: dict
@@ -98,45 +173,158 @@ class QcHandler(AbstractHandler):
             )
         return project, config, thing
 
+    def _execute_parallel(
+        self,
+        data: dict[QcFunctionStream, pd.DataFrame],
+        chains: list[list[QcFunction]],
+        things: list[str],
+    ) -> SaQCResult:
+        logger.info("Running %s independent chains of tests", len(chains))
+        futures = []
+        for chain in chains:
+            streams = set(sum([f.streams for f in chain], []))
+            chain_data = {s: df for s, df in data.items() if s in streams}
+            futures.append(self.executor.submit(execute_functions, chain_data, chain))
+        try:
+            results = [f.result() for f in futures]
+        except QcExecutionError as e:
+            for f in futures:
+                f.cancel()
+            for uuid in things:
+                journal.error(str(e), uuid)
+            raise ProcessingError(f"Executing SaQC function '{e.func}' failed") from e
+        return SaQCResult.merge(results)
+
+    @staticmethod
+    def _coalesce_key(content: dict) -> tuple | None:
+        version = content.get("version") or 1
+        checked = dict(content, version=version)
+        try:
+            if version == 1:
+                _chkmsg(checked, MqttPayload.DataParsedV1, "v1 message")
+                key = version, content["thing_uuid"]
+            elif version == 2:
+                _chkmsg(checked, MqttPayload.DataParsedV2, "v2 message")
+                key = version, content["project_uuid"], content["qc_settings_name"]
+            else:
+                return None
+            # the periods of coalesced triggers are merged
+            _timestamp(content["start_date"])
+            _timestamp(content["end_date"])
+        except (KeyError, TypeError, ValueError):
+            # malformed triggers are not coalesced, but fail right away
+            # in `run_qc`
+            return None
+        return key
+
     def act(self, content: dict, message: MQTTMessage):
+        if self.coalesce_window > 0:
+            if (key := self._coalesce_key(content)) is not None:
+                # acknowledged by the coalescing loop, once QC ran
+                self.defer_ack(message)
+                self._enqueue(key, content, message)
+                return
+        self.run_qc(content)
+
+    def _enqueue(self, key: tuple, content: dict, message: MQTTMessage):
+        now = time.monotonic()
+        with self._pending_changed:
+            if (pending := self._pending.get(key)) is None:
+                pending = self._pending[key] = _PendingRun(dict(content), now, now)
+            else:
+                pending.merge(content, now)
+            pending.messages.append(message)
+            self._pending_changed.notify()
+
+    def _next_due(self) -> list[_PendingRun]:
+        """Wait for and return all pending runs that are due."""
+        window, max_latency = self.coalesce_window, self.coalesce_max_latency
+        with self._pending_changed:
+            while True:
+                now = time.monotonic()
+                due = [
+                    key
+                    for key, run in self._pending.items()
+                    if run.due(window, max_latency) <= now
+                ]
+                if due:
+                    return [self._pending.pop(key) for key in due]
+                timeout = min(
+                    (r.due(window, max_latency) for r in self._pending.values()),
+                    default=None,
+                )
+                self._pending_changed.wait(None if timeout is None else timeout - now)
+
+    def _coalesce_loop(self) -> typing.NoReturn:
+        while True:
+            for run in self._next_due():
+                self._run_pending(run)
+
+    def _run_pending(self, run: _PendingRun) -> None:
+        logger.info(f"running QC for {len(run.messages)} coalesced triggers")
+        try:
+            self.run_qc(run.content)
+        except Exception:
+            try:
+                self._log_act_error(run.content)
+            except SystemExit:
+                # sys.exit would only end this thread
+                os._exit(1)
+        else:
+            self._log_done()
+        for message in run.messages:
+            self.ack(message)
+
+    def run_qc(self, content: dict):
 
         t0 = datetime.now()
 
         self.dbapi.ping_dbapi()
 
-        with self.db.connection() as conn:
-            logger.debug("successfully connected to configdb")
+        # feta borrows a pooled connection for every query
+        conn = feta.get_pool(self.configdb_dsn)
+        logger.debug("successfully connected to configdb")
 
-            # get QC settings
-            project, qc_settings, thing = self._parse_message(conn, content)
-            if qc_settings is None:
-                return
-            logger.info(f"Got the following configurations {qc_settings}")
+        # get QC settings
+        project, qc_settings, thing = self._parse_message(conn, content)
+        if qc_settings is None:
+            return
+        logger.info(f"Got the following configurations {qc_settings}")
 
-            # get QC functions
-            qc_funcs = get_qc_functions(qc_settings)
-            if not qc_funcs:
-                return
-            if thing is not None:
-                qc_funcs = filter_qc_functions(qc_funcs, thing.id)
-            logger.info(f"COLLECTED TESTS: {qc_funcs}")
-
-            N = len(qc_funcs)
-            things = get_qc_things(qc_funcs)
-
-            # load data
-            streams = list(set(sum([f.streams for f in qc_funcs], [])))
-            start_date = pd.Timestamp(content["start_date"])
-            end_date = pd.Timestamp(content["end_date"])
-            data = read_stream_data(self.dbapi, streams, start_date, end_date)
-            for k, v in data.items():
-                if v.empty:
-                    msg = f"no data found for stream: {k}"
-                    logger.warning(msg)
-                    for uuid in things:
-                        journal.warning(msg, uuid)
+        # get QC functions
+        qc_funcs = get_qc_functions(qc_settings)
+        if not qc_funcs:
+            return
+        if thing is not None:
+            qc_funcs = filter_qc_functions(qc_funcs, thing.id)
+        logger.info(f"COLLECTED TESTS: {qc_funcs}")
 
-            # execute QC functions
+        N = len(qc_funcs)
+        things = get_qc_things(qc_funcs)
+
+        # load data
+        streams = list(set(sum([f.streams for f in qc_funcs], [])))
+        start_date = pd.Timestamp(content["start_date"])
+        end_date = pd.Timestamp(content["end_date"])
+        data = read_stream_data(
+            self.dbapi,
+            streams,
+            start_date,
+            end_date,
+            conn=conn if self.direct_read else None,
+        )
+        for k, v in data.items():
+            if v.empty:
+                msg = f"no data found for stream: {k}"
+                logger.warning(msg)
+                for uuid in things:
+                    journal.warning(msg, uuid)
+
+        # execute QC functions
+        chains = split_independent_functions(qc_funcs)
+        if self.executor is not None and len(chains) > 1:
+            qc = self._execute_parallel(data, chains, things)
+        else:
             qc = SaQCWrapper(data)
             for i, func in enumerate(qc_funcs, start=1):
                 logger.info("Test %s of %s: %s", i, N, func)
@@ -148,8 +336,8 @@ class QcHandler(AbstractHandler):
                         journal.error(f"{msg}, because of {e}", uuid)
                     raise ProcessingError(msg) from e
 
-            # write data
-            write_qc_data(self.dbapi, qc)
+        # write data
+        write_qc_data(self.dbapi, qc, label_batch_size=self.label_batch_size)
 
         # push journal entries
         config_names = [c.name for c in qc_settings]
@@ -167,6 +355,7 @@ class QcHandler(AbstractHandler):
                 "version": 1,
                 "project_uuid": project.uuid,
                 "config": config_names,
+                "things": sorted(str(uuid) for uuid in things),
             }
         )
         self.mqtt_client.publish(
@@ -3,19 +3,224 @@
 
 import logging
 import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from fnmatch import fnmatch
 
 import click
+import pandas as pd
 from datetime import datetime, timezone
 from minio import Minio
 import paho.mqtt.client as mqtt
 
-from timeio.feta import Thing
+from timeio.databases import DBapi
+from timeio.feta import Thing, get_pool
 from timeio.journaling import Journal
+from timeio.observations import ObservationBatch
+from timeio.parse_status import ParseStatus, ParseStatusIndex, tag_parse_status
+from timeio.parser import get_parser
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("reprocess-files")
-journal = Journal("Reprocessing")
+journal = Journal("Reprocessing", background=True)
+
+
+_FILE_MAX_SIZE = 256 * 1024 * 1024
+
+# state of the bulk reparse worker processes, see `_init_worker`
+_worker = {}
+
+
+def _init_worker(minio_kwargs, parser_type, parser_params, schema, thing_uuid):
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker["minio"] = Minio(**minio_kwargs)
+    _worker["parser"] = get_parser(parser_type, dict(parser_params))
+    _worker["encoding"] = parser_params.get("encoding", None) or "utf-8"
+    _worker["schema"] = schema
+    _worker["thing_uuid"] = thing_uuid
+
+
+def _parse_file(bucket: str, fname: str, parser_uuid: str):
+    """Parse a single file in a worker process, like the file ingest does."""
+    minio, parser = _worker["minio"], _worker["parser"]
+    stat = minio.stat_object(bucket, fname)
+    if stat.size > _FILE_MAX_SIZE:
+        raise IOError("Maximum filesize of 256M exceeded")
+    # the parsed version is tagged, even if a new one is uploaded meanwhile
+    version = ParseStatus(stat.version_id, stat.last_modified, parser_uuid)
+    resp = minio.get_object(bucket, fname, version_id=stat.version_id)
+    try:
+        rawdata = resp.read()
+    finally:
+        resp.close()
+        resp.release_conn()
+    if not parser.is_binary:
+        rawdata = rawdata.decode(_worker["encoding"]).rstrip("\x03")
+    df = parser.do_parse(rawdata, _worker["schema"], _worker["thing_uuid"])
+    obs = parser.to_observations(df, f"{bucket}/{fname}", parser_uuid)
+    return obs, parser.start_date, parser.end_date, version
+
+
+class _Checkpoint:
+    """Names of the files whose observations are stored, kept in a JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)["done"])
+            logger.info(f"resuming from {path}, {len(self.done)} files done")
+
+    def save(self, names):
+        self.done.update(names)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _utc(timestamp: str) -> pd.Timestamp:
+    """
+    Make the timestamps of the parsers comparable. Naive timestamps are
+    local time, see the note in `timeio.qc.io.read_stream_data`.
+    """
+    ts = pd.Timestamp(timestamp)
+    if ts.tz is None:
+        ts = ts.tz_localize("Europe/Berlin")
+    return ts.tz_convert("UTC")
+
+
+def _concat(observations: list) -> list | ObservationBatch:
+    if len(observations) == 1:
+        return observations[0]
+    if all(isinstance(o, ObservationBatch) for o in observations):
+        try:
+            return ObservationBatch.concat(observations)
+        except ValueError:
+            pass
+    return [payload for obs in observations for payload in obs]
+
+
+def reparse_bulk(
+    thing: Thing,
+    files: list[str],
+    minio: Minio,
+    minio_kwargs: dict,
+    dbapi: DBapi,
+    index: ParseStatusIndex | None,
+    checkpoint: _Checkpoint,
+    workers: int,
+    rate: float,
+    batch_size: int,
+) -> tuple[str | None, str | None]:
+    """
+    Parse `files` in a process pool and store their observations in batches
+    of at least `batch_size` observations.
+
+    At most `rate` files per second are started (0 means unlimited). After
+    every stored batch the checkpoint is updated, so an interrupted run can
+    be resumed. Returns the overall start and end date of the parsed data.
+    """
+    bucket = thing.s3_store.bucket
+    pobj = thing.s3_store.file_parser
+    parser_uuid = str(pobj.uuid)
+    todo = [f for f in files if f not in checkpoint.done]
+    logger.info(f"bulk reparsing {len(todo)} of {len(files)} files")
+
+    # parsed but not yet stored observations, the files they came from
+    # and all files, which are done once those observations are stored
+    pending_obs, pending_files, pending_done, n_pending = [], [], [], 0
+    start_date = end_date = None
+    n_files = n_obs = n_failed = 0
+    t0 = last_report = time.monotonic()
+
+    def flush():
+        nonlocal pending_obs, pending_files, pending_done, n_pending, n_obs
+        if pending_obs:
+            dbapi.upsert_observations_and_datastreams(
+                thing.uuid, _concat(pending_obs), mutable=False
+            )
+        for fname, version in pending_files:
+            version.parsing_status = "successful"
+            version.parsed_at = datetime.now(tz=timezone.utc)
+            tag_parse_status(minio, index, bucket, fname, version)
+        if pending_done:
+            checkpoint.save(pending_done)
+        n_obs += n_pending
+        pending_obs, pending_files, pending_done, n_pending = [], [], [], 0
+
+    def collect(future, fname):
+        nonlocal n_pending, n_files, n_failed, start_date, end_date
+        try:
+            obs, start, end, version = future.result()
+        except Exception as e:
+            n_failed += 1
+            logger.error(f"parsing {fname!r} failed: {e}")
+            journal.error(f"Parsing failed. File: {fname!r} | Detail: {e}", thing.uuid)
+            return
+        n_files += 1
+        pending_done.append(fname)
+        if not len(obs):
+            journal.warning(f"Parsed file: {fname!r} is empty.", thing.uuid)
+            return
+        pending_obs.append(obs)
+        pending_files.append((fname, version))
+        n_pending += len(obs)
+        start_date = min(filter(None, [start_date, start]), key=_utc, default=None)
+        end_date = max(filter(None, [end_date, end]), key=_utc, default=None)
+        if n_pending >= batch_size:
+            flush()
+
+    initargs = (
+        minio_kwargs,
+        pobj.file_parser_type.name,
+        pobj.params,
+        thing.project.database.schema,
+        thing.uuid,
+    )
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=initargs
+    ) as ex:
+        running = {}
+        for i, fname in enumerate(todo):
+            if rate > 0 and (delay := t0 + i / rate - time.monotonic()) > 0:
+                time.sleep(delay)
+            # bound the number of parsed, but not yet stored files
+            while len(running) >= 2 * workers:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, running.pop(future))
+            running[ex.submit(_parse_file, bucket, fname, parser_uuid)] = fname
+
+            if (now := time.monotonic()) - last_report > 10:
+                last_report = now
+                logger.info(
+                    f"{n_files + n_failed}/{len(todo)} files, "
+                    f"{n_files / (now - t0):.1f} files/s, "
+                    f"{n_obs / (now - t0):.0f} stored observations/s"
+                )
+        for future in list(running):
+            collect(future, running.pop(future))
+    flush()
+
+    elapsed = time.monotonic() - t0
+    msg = (
+        f"Bulk reparsing done: {n_files} files parsed, {n_failed} failed, "
+        f"{n_obs} observations stored in {elapsed:.0f}s "
+        f"({n_files / max(elapsed, 1e-9):.1f} files/s, "
+        f"{n_obs / max(elapsed, 1e-9):.0f} observations/s)"
+    )
+    logger.info(msg)
+    journal.info(msg, thing.uuid)
+    if n_failed == 0:
+        checkpoint.remove()
+    return start_date, end_date
 
 
 def setupMQTT(host, username, password):
@@ -55,6 +260,30 @@ def setupMQTT(host, username, password):
 @click.option("--filename-pattern", default=None)
 @click.option("--start-date", default=None)
 @click.option("--end-date", default=None)
+@click.option(
+    "--bulk",
+    is_flag=True,
+    help="Parse the files in this process instead of republishing them "
+    "to the file ingest workers.",
+)
+@click.option("--workers", default=4, help="Number of parser processes (--bulk).")
+@click.option(
+    "--rate", default=0.0, help="Maximal files started per second, 0 is unlimited."
+)
+@click.option(
+    "--batch-size",
+    default=50_000,
+    help="Number of observations stored at once (--bulk).",
+)
+@click.option(
+    "--checkpoint",
+    default=None,
+    help="Progress file to resume from (--bulk), "
+    "defaults to reparse-<thing-uuid>.json",
+)
+@click.option("--db-api-url", default=None, envvar="DB_API_BASE_URL")
+@click.option("--db-api-token", default=None, envvar="DB_API_AUTH_TOKEN")
+@click.option("--data-parsed-topic", default="data_parsed", envvar="TOPIC_DATA_PARSED")
 def main(
     dsmdb_dsn,
     thing_uuid,
@@ -67,17 +296,26 @@ def main(
     filename_pattern,
     start_date,
     end_date,
+    bulk,
+    workers,
+    rate,
+    batch_size,
+    checkpoint,
+    db_api_url,
+    db_api_token,
+    data_parsed_topic,
 ):
     thing = Thing.from_uuid(thing_uuid, dsn=dsmdb_dsn)
     store = thing.raw_data_storage
     bucket = store.bucket
 
-    minio = Minio(
+    minio_kwargs = dict(
         endpoint=minio_host,
         access_key=minio_user,
         secret_key=minio_password,
         secure=not minio_host.startswith("localhost"),
     )
+    minio = Minio(**minio_kwargs)
     mqtt = setupMQTT(mqtt_host, mqtt_user, mqtt_password)
 
     fnpattern_from_thing = store.filename_pattern
@@ -91,7 +329,7 @@ def main(
 
     mqtt.loop_start()
 
-    message = {"EventName": "s3:ObjectCreated:Put", "reparsing": True}
+    files = []
     for obj in minio.list_objects(bucket):
         fname = obj.object_name
         fdate = obj.last_modified
@@ -100,17 +338,44 @@ def main(
             cond3 = True if not start_date else fdate >= start
             cond4 = True if not end_date else fdate <= end
             if cond2 and cond3 and cond4:
-                message["Key"] = f"{bucket}/{fname}"
-                logging.info(f"republishing file: {message['Key']}")
-                result = mqtt.publish(
-                    topic="object_storage_notification_triggered",
-                    payload=json.dumps(message),
-                    qos=1,
-                )
-                if result[0] != 0:
-                    logger.warning(
-                        f"Failed to deliver reprocessing message for file: {message['Key']}"
-                    )
+                files.append(fname)
+
+    if bulk:
+        first, last = reparse_bulk(
+            thing,
+            files,
+            minio,
+            minio_kwargs,
+            DBapi(db_api_url, db_api_token),
+            ParseStatusIndex(get_pool(dsmdb_dsn)),
+            _Checkpoint(checkpoint or f"reparse-{thing_uuid}.json"),
+            workers,
+            rate,
+            batch_size,
+        )
+        if first is not None:
+            # trigger the QC once for everything
+            payload = {"thing_uuid": thing_uuid, "start_date": first, "end_date": last}
+            mqtt.publish(topic=data_parsed_topic, payload=json.dumps(payload), qos=1)
+        mqtt.loop_stop()
+        mqtt.disconnect()
+        return
+
+    message = {"EventName": "s3:ObjectCreated:Put", "reparsing": True}
+    for fname in files:
+        if rate > 0:
+            time.sleep(1 / rate)
+        message["Key"] = f"{bucket}/{fname}"
+        logging.info(f"republishing file: {message['Key']}")
+        result = mqtt.publish(
+            topic="object_storage_notification_triggered",
+            payload=json.dumps(message),
+            qos=1,
+        )
+        if result[0] != 0:
+            logger.warning(
+                f"Failed to deliver reprocessing message for file: {message['Key']}"
+            )
 
     mqtt.loop_stop()
     mqtt.disconnect()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+
+from paho.mqtt.client import MQTTMessage
+
+from timeio.common import get_envvar, setup_logging
+from timeio.databases import Database
+from timeio.mqtt import AbstractHandler
+from timeio.rollups import refresh_rollups
+
+logger = logging.getLogger("rollup-refresh")
+
+
+class RollupRefreshHandler(AbstractHandler):
+    """
+    Keep the hourly and daily observation rollups up to date.
+
+    Runs after every ingest (data_parsed) and, to also catch changed
+    quality flags, after every QC run (qaqc_done).
+    """
+
+    def __init__(self):
+        super().__init__(
+            topic=get_envvar("TOPIC"),
+            mqtt_broker=get_envvar("MQTT_BROKER"),
+            mqtt_user=get_envvar("MQTT_USER"),
+            mqtt_password=get_envvar("MQTT_PASSWORD"),
+            mqtt_client_id=get_envvar("MQTT_CLIENT_ID"),
+            mqtt_qos=get_envvar("MQTT_QOS", cast_to=int),
+            mqtt_clean_session=get_envvar("MQTT_CLEAN_SESSION", cast_to=bool),
+        )
+        self.db = Database(get_envvar("DATABASE_DSN"))
+        # every batch of changed hours is committed on its own
+        self.batch_size = get_envvar("ROLLUP_BATCH_SIZE", 10_000, cast_to=int)
+        # datastreams of the backfill queue, logged per refresh of a schema
+        self.backfill = get_envvar("ROLLUP_BACKFILL_DATASTREAMS", 1, cast_to=int)
+        self.subscribe(get_envvar("TOPIC_QC_DONE", "qaqc_done"), self.act)
+
+    def act(self, content: dict, message: MQTTMessage):
+        # data_parsed is sent per thing, qaqc_done lists the things,
+        # whose quality labels were written
+        if thing_uuid := content.get("thing_uuid"):
+            things = [thing_uuid]
+        else:
+            things = content.get("things")
+        with self.db.connection(autocommit=True) as conn:
+            if things:
+                schemas = conn.execute(
+                    "SELECT DISTINCT schema FROM public.schema_thing_mapping "
+                    "WHERE thing_uuid = ANY(%s::uuid[])",
+                    [things],
+                ).fetchall()
+            else:
+                # messages of older QC workers and user triggered messages
+                # don't name the things, so all schemas are checked
+                schemas = conn.execute(
+                    "SELECT schemaname FROM pg_tables "
+                    "WHERE tablename = 'observation_rollup_log'"
+                ).fetchall()
+
+            for (schema,) in schemas:
+                n_hours = refresh_rollups(
+                    conn, schema, batch_size=self.batch_size, backfill=self.backfill
+                )
+                if n_hours:
+                    logger.info(f"Refreshed {n_hours} hours of rollups in {schema}")
+
+
+if __name__ == "__main__":
+    setup_logging(get_envvar("LOG_LEVEL", "INFO"))
+    RollupRefreshHandler().run_loop()
@@ -7,7 +7,7 @@ from random import randint
 from crontab import CronItem, CronTab, CronRange, CronSlices
 
 from timeio.mqtt import AbstractHandler, MQTTMessage
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.journaling import Journal
 from timeio.typehints import MqttPayload
@@ -35,7 +35,7 @@ class CreateThingInCrontabHandler(AbstractHandler):
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
     def act(self, content: MqttPayload.UpdateThing, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         with CronTab(tabfile=self.tabfile) as crontab:
             for job in crontab:
                 if self.job_belongs_to_thing(job, thing):
@@ -1,7 +1,7 @@
 import logging
 
 from timeio.mqtt import AbstractHandler, MQTTMessage
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.typehints import MqttPayload
 from timeio import frost
@@ -25,7 +25,7 @@ class CreateFrostInstanceHandler(AbstractHandler):
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
     def act(self, content: MqttPayload.UpdateThing, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         frost.write_context_file(
             schema=thing.database.schema,
             user=f"sta_{thing.database.ro_username.lower()}",
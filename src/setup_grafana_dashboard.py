@@ -5,7 +5,7 @@ from urllib.parse import urlparse
 
 from timeio.grafana.api import TimeioGrafanaApi
 from timeio.mqtt import AbstractHandler, MQTTMessage
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.crypto import decrypt, get_crypt_key
 from timeio.typehints import MqttPayload
@@ -38,7 +38,7 @@ class CreateThingInGrafanaHandler(AbstractHandler):
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
     def act(self, content: MqttPayload.UpdateThing, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         org = self.api.t.org.get_by_name(thing.project.name)
         if org is None:
             org = self.api.t.org.create(thing.project.name)
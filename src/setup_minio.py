@@ -6,7 +6,7 @@ from timeio.minio.client import MinioClient
 from timeio.minio.admin_client import MinioAdminClient
 
 from timeio.mqtt import AbstractHandler, MQTTMessage
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.crypto import decrypt, get_crypt_key
 from timeio.typehints import MqttPayload
@@ -42,7 +42,7 @@ class CreateThingInMinioHandler(AbstractHandler):
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
     def act(self, content: MqttPayload.UpdateThing, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         if thing.raw_data_storage is None or thing.raw_data_storage.username is None:
             logger.info(
                 f"Ignoring message, because no s3 storage is associated "
@@ -6,7 +6,7 @@ import logging
 import psycopg
 
 from timeio.mqtt import AbstractHandler, MQTTMessage
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.journaling import Journal
 from timeio.typehints import MqttPayload
@@ -31,7 +31,7 @@ class CreateMqttUserHandler(AbstractHandler):
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
     def act(self, content: MqttPayload.UpdateThing, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
 
         if not thing.mqtt:
             logger.info(f"Thing {thing.name} has no MQTT configuration. Skipping.")
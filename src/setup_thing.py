@@ -19,7 +19,15 @@ logger = logging.getLogger("thing-setup")
 
 
 class SetupThingHandler(AbstractHandler):
-    """Orchestrates multiple thing/project setup actions"""
+    """
+    Orchestrates multiple thing/project setup actions
+
+    Messages are processed one after another on purpose (it is no
+    AsyncAbstractHandler): the actions create project wide resources
+    (database user and schema, Grafana organisation, FROST instance)
+    after checking that they don't exist, which races, if two things
+    of a project are set up at once. Setup messages are rare anyway.
+    """
 
     HANDLERS = {
         "database": CreateThingInPostgresHandler,
@@ -10,10 +10,11 @@ from typing import cast, Literal
 
 from timeio.mqtt import AbstractHandler, MQTTMessage
 from timeio.databases import Database
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.common import get_envvar, setup_logging
 from timeio.journaling import Journal
 from timeio.crypto import decrypt, get_crypt_key
+from timeio.partitioning import convert_observation
 
 logger = logging.getLogger("db-setup")
 journal = Journal("System", errors="ignore")
@@ -35,9 +36,11 @@ class CreateThingInPostgresHandler(AbstractHandler):
         )
         self.db = Database(get_envvar("DATABASE_URL"))
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
+        # deploy the observation table of new schemas as monthly partitions
+        self.partitioning = get_envvar("OBSERVATION_PARTITIONING", False, cast_to=bool)
 
     def act(self, content: dict, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         logger.info(f"start processing. {thing.name=}, {thing.uuid=}")
         ro_user = thing.database.ro_username.lower()
         user = thing.database.username.lower()
@@ -208,6 +211,10 @@ class CreateThingInPostgresHandler(AbstractHandler):
                     ).format(user=user)
                 )
 
+        if self.partitioning:
+            with self.db.connection(autocommit=True) as conn:
+                convert_observation(conn, thing.database.username.lower())
+
     def deploy_dml(self, thing):
         file = os.path.join(os.path.dirname(__file__), "sql", "postgres-dml.sql")
         with open(file) as fh:
@@ -277,6 +284,7 @@ class CreateThingInPostgresHandler(AbstractHandler):
                 c.execute(
                     sql.SQL(
                         "GRANT SELECT ON TABLE thing, datastream, observation, "
+                        "observation_hourly, observation_daily, "
                         'journal, datastream_properties, "LOCATIONS", "THINGS", '
                         '"THINGS_LOCATIONS", "SENSORS", "OBS_PROPERTIES", "DATASTREAMS", '
                         '"OBSERVATIONS" TO {grf_user}'
@@ -293,7 +301,7 @@ class CreateThingInPostgresHandler(AbstractHandler):
             os.path.join(base_path, "observed_property.sql"),
             os.path.join(base_path, "datastream.sql"),
             os.path.join(base_path, "helper_views", "foi_ts_action_type_coord.sql"),
-            os.path.join(base_path, "helper_views", "obs_ts_action_type_coord.sql"),
+            os.path.join(base_path, "helper_views", "sta_observation_link.sql"),
             os.path.join(base_path, "feature.sql"),
             os.path.join(base_path, "observation.sql"),
         ]
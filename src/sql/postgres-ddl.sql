@@ -131,3 +131,93 @@ CREATE TABLE mqtt_message
 
     CONSTRAINT "mqtt_message_thing_id_fk_thing_id" FOREIGN KEY ("thing_id") REFERENCES "thing" ("id") DEFERRABLE INITIALLY DEFERRED
 );
+
+
+--
+-- Create model Observation rollups
+--
+-- Hourly and daily aggregates of the observations of each datastream.
+-- The statement level triggers below only log the changed hours, the
+-- aggregates of those hours (and their days) are recomputed later by
+-- the rollup worker (timeio.rollups.refresh_rollups). The rollups are
+-- never rebuilt from scratch.
+CREATE TABLE observation_rollup_log
+(
+    "datastream_id" bigint                   NOT NULL,
+    "bucket"        timestamp with time zone NOT NULL,
+
+    CONSTRAINT observation_rollup_log_pk PRIMARY KEY ("datastream_id", "bucket")
+);
+
+CREATE TABLE observation_hourly
+(
+    "datastream_id" bigint                   NOT NULL,
+    "bucket"        timestamp with time zone NOT NULL,
+    "count"         bigint                   NOT NULL,
+    "count_number"  bigint                   NOT NULL,
+    "min"           double precision         NULL,
+    "max"           double precision         NULL,
+    "mean"          double precision         NULL,
+    "last"          double precision         NULL,
+    "last_time"     timestamp with time zone NOT NULL,
+    "flagged"       bigint                   NOT NULL,
+
+    CONSTRAINT observation_hourly_pk PRIMARY KEY ("datastream_id", "bucket")
+);
+
+CREATE TABLE observation_daily
+(
+    "datastream_id" bigint                   NOT NULL,
+    "bucket"        timestamp with time zone NOT NULL,
+    "count"         bigint                   NOT NULL,
+    "count_number"  bigint                   NOT NULL,
+    "min"           double precision         NULL,
+    "max"           double precision         NULL,
+    "mean"          double precision         NULL,
+    "last"          double precision         NULL,
+    "last_time"     timestamp with time zone NOT NULL,
+    "flagged"       bigint                   NOT NULL,
+
+    CONSTRAINT observation_daily_pk PRIMARY KEY ("datastream_id", "bucket")
+);
+
+COMMENT ON COLUMN observation_hourly.count IS 'Number of observations, of any result type.';
+COMMENT ON COLUMN observation_hourly.count_number IS 'Number of numerical observations, the weight of the mean.';
+COMMENT ON COLUMN observation_hourly.flagged IS 'Number of observations with a quality flag, like shown in the dashboards.';
+
+CREATE FUNCTION observation_rollup_log_changes() RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path FROM CURRENT
+AS
+$$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO observation_rollup_log (datastream_id, bucket)
+        SELECT DISTINCT datastream_id, date_trunc('hour', result_time, 'UTC')
+        FROM new_rows
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO observation_rollup_log (datastream_id, bucket)
+        SELECT DISTINCT datastream_id, date_trunc('hour', result_time, 'UTC')
+        FROM old_rows
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER observation_rollup_insert
+    AFTER INSERT ON observation
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION observation_rollup_log_changes();
+
+CREATE TRIGGER observation_rollup_update
+    AFTER UPDATE ON observation
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION observation_rollup_log_changes();
+
+CREATE TRIGGER observation_rollup_delete
+    AFTER DELETE ON observation
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION observation_rollup_log_changes();
@@ -0,0 +1,165 @@
+-- The observations are linked to the SMS metadata (mounts, locations
+-- and datastream links) by time ranges of their datastreams. The links
+-- only change with the SMS metadata, so they are stored in the table
+-- sta_observation_link, which is synced with sta_observation_link_source
+-- by refresh_sta_observation_link(). The "OBSERVATIONS" view joins the
+-- observations against the indexed link table instead of joining all the
+-- SMS tables on every request.
+--
+-- The feature ids of dynamic locations depend on the coordinates observed
+-- at the same time, so they are still computed in "OBSERVATIONS".
+
+DROP VIEW IF EXISTS obs_ts_action_type_coord CASCADE;
+
+CREATE OR REPLACE VIEW sta_observation_link_source AS
+
+WITH static_links AS (
+    SELECT
+        dsl.datastream_id,
+        GREATEST(sla.begin_date, dsl.begin_date) AS begin_time,
+        LEAST(sla.end_date, dsl.end_date) AS end_time,
+        sla.id AS action_id,
+        FALSE AS is_dynamic,
+        dsl.device_property_id,
+        hashtextextended(
+                CONCAT(
+                        ARRAY [sla.x, sla.y, COALESCE(sla.z, 0)]::text,
+                        sla.id,
+                        FALSE
+                ),
+                0
+        ) AS feature_id,
+        NULL::bigint AS x_datastream_id,
+        NULL::bigint AS y_datastream_id,
+        NULL::bigint AS z_datastream_id
+     FROM public.sms_configuration_static_location_begin_action sla
+       JOIN public.sms_device_mount_action dma
+            ON dma.configuration_id = sla.configuration_id
+       JOIN public.sms_configuration c
+            ON c.id = dma.configuration_id
+                AND c.is_public
+       JOIN public.sms_device d
+            ON d.id = dma.device_id
+                AND d.is_public
+       JOIN public.sms_datastream_link dsl
+            ON dsl.device_mount_action_id = dma.id
+                AND dsl.datasource_id = '{tsm_schema}'
+    -- GREATEST ignores NULLs, but a range without a begin never
+    -- contained any observation
+    WHERE sla.begin_date IS NOT NULL
+        AND dsl.begin_date IS NOT NULL
+),
+
+xyzDatastream AS MATERIALIZED (
+    SELECT DISTINCT
+        dma.configuration_id,
+        dla.id AS dla_id,
+        dsl_main.datastream_id AS main_datastream_id,
+        dsl_x.datastream_id AS x_datastream_id,
+        dsl_y.datastream_id AS y_datastream_id,
+        dsl_z.datastream_id AS z_datastream_id
+    FROM public.sms_configuration_dynamic_location_begin_action dla
+        JOIN public.sms_device_mount_action dma
+            ON dma.configuration_id = dla.configuration_id
+        JOIN public.sms_datastream_link dsl_main
+            ON dsl_main.device_mount_action_id = dma.id
+            AND dsl_main.datasource_id = '{tsm_schema}'
+        JOIN public.sms_datastream_link dsl_x
+            ON dsl_x.device_mount_action_id = dma.id
+            AND dsl_x.device_property_id = dla.x_property_id
+        JOIN public.sms_datastream_link dsl_y
+            ON dsl_y.device_mount_action_id = dma.id
+            AND dsl_y.device_property_id = dla.y_property_id
+        LEFT JOIN public.sms_datastream_link dsl_z
+            ON dsl_z.device_mount_action_id = dma.id
+            AND dsl_z.device_property_id = dla.z_property_id
+),
+
+dynamic_links AS (
+    SELECT
+        dsl.datastream_id,
+        dsl.begin_date AS begin_time,
+        dsl.end_date AS end_time,
+        dla.id AS action_id,
+        TRUE AS is_dynamic,
+        dsl.device_property_id,
+        NULL::bigint AS feature_id,
+        data.x_datastream_id::bigint,
+        data.y_datastream_id::bigint,
+        data.z_datastream_id::bigint
+    FROM public.sms_configuration_dynamic_location_begin_action dla
+        JOIN public.sms_device_mount_action dma
+            ON dma.configuration_id = dla.configuration_id
+        JOIN public.sms_configuration c
+            ON c.id = dma.configuration_id
+            AND c.is_public
+        JOIN public.sms_device d
+            ON d.id = dma.device_id
+            AND d.is_public
+        JOIN public.sms_datastream_link dsl
+            ON dsl.device_mount_action_id = dma.id
+            AND dsl.datasource_id = '{tsm_schema}'
+        JOIN xyzDatastream data
+            ON data.main_datastream_id = dsl.datastream_id
+    WHERE dsl.begin_date IS NOT NULL
+)
+
+SELECT * FROM static_links
+WHERE end_time IS NULL OR begin_time <= end_time
+
+UNION ALL
+
+SELECT * FROM dynamic_links
+;
+
+
+CREATE TABLE IF NOT EXISTS sta_observation_link AS
+    SELECT * FROM sta_observation_link_source WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS sta_observation_link_datastream_id_idx
+    ON sta_observation_link (datastream_id, begin_time);
+
+CREATE INDEX IF NOT EXISTS sta_observation_link_device_property_id_idx
+    ON sta_observation_link (device_property_id);
+
+
+-- Only the changed links are written, returns their number.
+CREATE OR REPLACE FUNCTION refresh_sta_observation_link() RETURNS bigint
+    LANGUAGE plpgsql
+    SET search_path FROM CURRENT
+AS
+$$
+DECLARE
+    n_deleted bigint;
+    n_inserted bigint;
+BEGIN
+    -- Concurrent refreshes would insert the same links twice, readers
+    -- are not blocked by this lock mode.
+    LOCK TABLE sta_observation_link IN SHARE ROW EXCLUSIVE MODE;
+
+    CREATE TEMP TABLE sta_observation_link_new ON COMMIT DROP AS
+        SELECT * FROM sta_observation_link_source;
+
+    -- Delete the set difference of the rows. Their text representation
+    -- treats NULLs as equal, like EXCEPT, and can be hashed, unlike rows
+    -- compared by IS NOT DISTINCT FROM, which need a nested loop.
+    DELETE FROM sta_observation_link l
+    WHERE l::text IN (
+        SELECT o::text FROM sta_observation_link o
+        EXCEPT
+        SELECT s::text FROM sta_observation_link_new s
+    );
+    GET DIAGNOSTICS n_deleted = ROW_COUNT;
+
+    INSERT INTO sta_observation_link
+    SELECT * FROM sta_observation_link_new
+    EXCEPT
+    SELECT * FROM sta_observation_link;
+    GET DIAGNOSTICS n_inserted = ROW_COUNT;
+
+    DROP TABLE sta_observation_link_new;
+    RETURN n_deleted + n_inserted;
+END;
+$$;
+
+SELECT refresh_sta_observation_link();
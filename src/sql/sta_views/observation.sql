@@ -3,21 +3,31 @@ CREATE VIEW "OBSERVATIONS" AS
 
 
 SELECT
-    o_id AS "ID",
-    result_boolean AS "RESULT_BOOLEAN",
-    result_quality AS "RESULT_QUALITY",
-    result_time AS "PHENOMENON_TIME_START",
+    o.id AS "ID",
+    o.result_boolean AS "RESULT_BOOLEAN",
+    o.result_quality AS "RESULT_QUALITY",
+    o.result_time AS "PHENOMENON_TIME_START",
     '{}'::jsonb AS "PARAMETERS",
-    device_property_id AS "DATASTREAM_ID",
-    result_string AS "RESULT_STRING",
-    result_type AS "RESULT_TYPE",
-    valid_time_end AS "VALID_TIME_END",
-    result_time AS "PHENOMENON_TIME_END",
-    feature_id AS "FEATURE_ID",
-    result_json AS "RESULT_JSON",
-    result_time AS "RESULT_TIME",
-    result_number AS "RESULT_NUMBER",
-    valid_time_start AS "VALID_TIME_START",
+    l.device_property_id AS "DATASTREAM_ID",
+    o.result_string AS "RESULT_STRING",
+    o.result_type AS "RESULT_TYPE",
+    o.valid_time_end AS "VALID_TIME_END",
+    o.result_time AS "PHENOMENON_TIME_END",
+    CASE
+        WHEN l.is_dynamic THEN hashtextextended(
+            CONCAT(
+                ARRAY[ox.result_number, oy.result_number, COALESCE(oz.result_number, 0)]::text,
+                l.action_id,
+                TRUE
+            ),
+            0
+        )
+        ELSE l.feature_id
+    END AS "FEATURE_ID",
+    o.result_json AS "RESULT_JSON",
+    o.result_time AS "RESULT_TIME",
+    o.result_number AS "RESULT_NUMBER",
+    o.valid_time_start AS "VALID_TIME_START",
     '{
     "@context": {
         "@version": "1.1",
@@ -27,6 +37,25 @@ SELECT
       "jsonld.type": "ObservationProperties",
       "dataSource": null
     }'::jsonb AS "PROPERTIES"
-FROM obs_ts_action_type_coord
+FROM sta_observation_link l
+    JOIN observation o
+        ON o.datastream_id = l.datastream_id
+        AND o.result_time >= l.begin_time
+        AND (l.end_time IS NULL OR o.result_time <= l.end_time)
+    -- the coordinates of dynamic locations
+    LEFT JOIN observation ox
+        ON l.is_dynamic
+        AND ox.datastream_id = l.x_datastream_id
+        AND ox.result_time = o.result_time
+    LEFT JOIN observation oy
+        ON l.is_dynamic
+        AND oy.datastream_id = l.y_datastream_id
+        AND oy.result_time = o.result_time
+    LEFT JOIN observation oz
+        ON l.is_dynamic
+        AND oz.datastream_id = l.z_datastream_id
+        AND oz.result_time = o.result_time
+WHERE NOT l.is_dynamic
+    OR (ox.id IS NOT NULL AND oy.id IS NOT NULL)
 ;
 
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import json
 
 from requests.exceptions import HTTPError
 
-from timeio.mqtt import AbstractHandler, MQTTMessage
+from timeio.mqtt import AsyncAbstractHandler, MQTTMessage
 from timeio.common import get_envvar, setup_logging
-from timeio.feta import Thing
+from timeio.feta import Thing, get_pool
 from timeio.typehints import MqttPayload
-from timeio.journaling import Journal
-from timeio.databases import DBapi
+from timeio.journaling import AsyncJournal
+from timeio.databases import AsyncDBapi
 from timeio.ext_api import (
     ExtApiSyncer,
     BoschApiSyncer,
@@ -25,10 +26,10 @@ from timeio.ext_api import (
 )
 
 logger = logging.getLogger("sync-extapi-manager")
-journal = Journal("sync_ext_apis")
+journal = AsyncJournal("sync_ext_apis", background=True)
 
 
-class SyncExtApiManager(AbstractHandler):
+class SyncExtApiManager(AsyncAbstractHandler):
 
     def __init__(self):
         super().__init__(
@@ -40,48 +41,65 @@ class SyncExtApiManager(AbstractHandler):
             mqtt_qos=get_envvar("MQTT_QOS", cast_to=int),
             mqtt_clean_session=get_envvar("MQTT_CLEAN_SESSION", cast_to=bool),
         )
-        self.dbapi = DBapi(
-            get_envvar("DB_API_BASE_URL"), get_envvar("DB_API_AUTH_TOKEN")
+        self.dbapi = AsyncDBapi(
+            get_envvar("DB_API_BASE_URL"),
+            get_envvar("DB_API_AUTH_TOKEN"),
+            pool_size=self.concurrency,
         )
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
         self.sync_handlers: dict[str, ExtApiSyncer] = {
             "tsystems": TsystemsApiSyncer(),
             "bosch": BoschApiSyncer(),
-            "uba": UbaApiSyncer(),
+            "uba": UbaApiSyncer(
+                max_workers=get_envvar("UBA_MAX_WORKERS", 8, cast_to=int),
+                catalogue_ttl=get_envvar("UBA_CATALOGUE_TTL", 3600, cast_to=float),
+            ),
             "dwd": DwdApiSyncer(),
             "ttn": TtnApiSyncer(),
             "nm": NmApiSyncer(),
             "sensoto": SensotoApiSyncer(),
         }
 
-    def act(self, content: MqttPayload.SyncExtApiT, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+    def ordering_key(self, content: MqttPayload.SyncExtApiT, message: MQTTMessage):
+        return content.get("thing")
+
+    @staticmethod
+    def _get_thing(uuid: str, dsn: str) -> Thing:
+        thing = Thing.from_uuid(uuid, dsn=get_pool(dsn))
+        _ = thing.ext_api.api_type_name
+        return thing
+
+    async def act(self, content: MqttPayload.SyncExtApiT, message: MQTTMessage):
+        # feta and the syncers are blocking, so they run in the executor
+        thing = await asyncio.to_thread(
+            self._get_thing, content["thing"], self.dsmdb_dsn
+        )
         ext_api_name = thing.ext_api.api_type_name
         syncer = self.sync_handlers[ext_api_name]
         try:
-            data = syncer.fetch_api_data(thing, content)
+            data = await asyncio.to_thread(syncer.fetch_api_data, thing, content)
         except (ExtApiRequestError, NoHttpsError) as e:
-            journal.error(e.msg, thing.uuid)
+            await journal.error(e.msg, thing.uuid)
             return
         except Exception as e:
-            journal.error(
+            await journal.error(
                 f"Unknown error in fetching data. Please check URL.", thing.uuid
             )
             logger.exception(e)
             return
         try:
-            obs = syncer.do_parse(data)
-            self.dbapi.upsert_observations_and_datastreams(
+            obs = await asyncio.to_thread(syncer.do_parse, data)
+            await self.dbapi.upsert_observations_and_datastreams(
                 thing.uuid, obs, mutable=False
             )
         except HTTPError as e:
-            journal.error(
+            await journal.error(
                 f"Insert/upsert into timeioDB for thing '{thing.name}' failed",
                 thing.uuid,
             )
             raise e
         except Exception as e:
-            journal.error(
+            await journal.error(
                 f"Error in processing data for thing '{thing.name}'", thing.uuid
             )
             raise e
@@ -96,7 +114,7 @@ class SyncExtApiManager(AbstractHandler):
                 }
             ),
         )
-        journal.info(
+        await journal.info(
             f"Successfully inserted {len(obs)} "
             f"observations from API '{ext_api_name}' "
             f"for thing '{thing.name}' into timeIO DB",
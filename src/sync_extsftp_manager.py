@@ -8,14 +8,16 @@ from paramiko import WarningPolicy
 from timeio.mqtt import AbstractHandler, MQTTMessage
 from timeio.common import get_envvar, setup_logging
 from timeio.crypto import decrypt, get_crypt_key
-from timeio.remote_fs import MinioFS, FtpFS, sync
-from timeio.feta import Thing
+from timeio.remote_fs import MinioFS, FtpFS, sync_incremental
+from timeio.feta import Thing, get_pool
 from timeio.typehints import MqttPayload
 from timeio.journaling import Journal
 
 logger = logging.getLogger("sync-ext-sftp")
 journal = Journal("sync_ext_sftp")
 
+SECONDS_PER_DAY = 24 * 60 * 60
+
 USAGE = """
 Usage: sftp_sync.py THING_UUID
 Sync external SFTP files to minio storage.
@@ -33,6 +35,11 @@ Additional set the following environment variables:
                     (source of sync) and also the (existing) bucket-name for the
                     target S3 storage. See also DSN format below.
 
+  SFTP_SYNC_WORKERS Number of concurrent transfers, defaults to 4.
+  SFTP_SYNC_SETTLE_DAYS  Directories without changes for that many days
+                    are only listed on a full scan, defaults to 30.
+  SFTP_SYNC_FULL_SCAN_DAYS  Interval of full scans, defaults to 7.
+
   LOG_LEVEL         Set the verbosity, defaults to INFO.
                     [DEBUG, INFO, WARNING, ERROR, CRITICAL]
   FERNET_ENCRYPTION_SECRET  Secret used to decrypt sensitive information from
@@ -57,8 +64,11 @@ class SyncExtSftpManager(AbstractHandler):
         )
         self.dsmdb_dsn = get_envvar("DSMDB_DSN")
 
+    def ordering_key(self, content: MqttPayload.SyncExtSftpT, message: MQTTMessage):
+        return content.get("thing")
+
     def act(self, content: MqttPayload.SyncExtSftpT, message: MQTTMessage):
-        thing = Thing.from_uuid(content["thing"], dsn=self.dsmdb_dsn)
+        thing = Thing.from_uuid(content["thing"], dsn=get_pool(self.dsmdb_dsn))
         minio_secure = get_envvar("MINIO_SECURE").lower() not in ["false", "0"]
         target = MinioFS.from_credentials(
             endpoint=get_envvar("MINIO_URL"),
@@ -77,14 +87,26 @@ class SyncExtSftpManager(AbstractHandler):
                 path=thing.ext_sftp.path,
                 keyfile_path=io.StringIO(priv_key),
                 missing_host_key_policy=WarningPolicy(),
+                list_files=False,
             )
         except Exception as e:
             msg = f"Failed to create SFTP client. Reason: {e}"
             journal.error(msg, thing.uuid)
             logger.error(msg)
             return
-        sync(source, target, thing.uuid)
-        source.close()
+        settle_days = get_envvar("SFTP_SYNC_SETTLE_DAYS", 30, cast_to=float)
+        full_scan_days = get_envvar("SFTP_SYNC_FULL_SCAN_DAYS", 7, cast_to=float)
+        try:
+            sync_incremental(
+                source,
+                target,
+                thing.uuid,
+                workers=get_envvar("SFTP_SYNC_WORKERS", 4, cast_to=int),
+                settle_time=settle_days * SECONDS_PER_DAY,
+                full_scan_interval=full_scan_days * SECONDS_PER_DAY,
+            )
+        finally:
+            source.close()
 
 
 if __name__ == "__main__":
@@ -25,14 +25,21 @@ class SyncSmsManager(AbstractHandler):
         )
         self.cv_api_url = get_envvar("CV_API_URL")
         self.db_conn_str = get_envvar("DATABASE_DSN")
+        self.view_refresh_workers = get_envvar(
+            "SMS_VIEW_REFRESH_WORKERS", 4, cast_to=int
+        )
 
     def act(self, content: MqttPayload.SyncSmsT, message: MQTTMessage):
         origin = content["origin"]
 
         if origin == "sms_backend":
-            syncer = SmsMaterializedViewsSyncer(self.db_conn_str)
+            syncer = SmsMaterializedViewsSyncer(
+                self.db_conn_str, workers=self.view_refresh_workers
+            )
             syncer.collect_materialized_views()
-            syncer.update_materialized_views()
+            syncer.collect_dependencies()
+            if syncer.refresh_changed_views():
+                syncer.refresh_sta_observation_links()
 
         elif origin == "sms_cv":
             syncer = SmsCVSyncer(self.cv_api_url, self.db_conn_str)
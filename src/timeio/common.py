@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import contextlib
+import contextvars
 import enum
 import logging
 import logging.config
 import os
-from typing import Any, Literal
+import threading
+import warnings
+from typing import Any, Iterator, Literal
 
 no_default = type("no_default", (), {})
 
@@ -124,3 +128,45 @@ def setup_logging(log_level="INFO"):
         format=format,
         datefmt="%Y-%m-%d %H:%M:%S",
     )
+
+
+_collector: contextvars.ContextVar[tuple[type[Warning], list] | None] = (
+    contextvars.ContextVar("warning_collector", default=None)
+)
+_collected_categories: set[type[Warning]] = set()
+_collector_lock = threading.Lock()
+_showwarning = warnings.showwarning
+
+
+def _collecting_showwarning(message, category, filename, lineno, file=None, line=None):
+    collector = _collector.get()
+    if collector is not None and issubclass(category, collector[0]):
+        collector[1].append(
+            warnings.WarningMessage(message, category, filename, lineno, file, line)
+        )
+    else:
+        _showwarning(message, category, filename, lineno, file, line)
+
+
+@contextlib.contextmanager
+def collect_warnings(category: type[Warning] = Warning) -> Iterator[list]:
+    """
+    Collect the warnings of `category` emitted by the current thread.
+
+    Unlike `warnings.catch_warnings(record=True)`, the global warning
+    filters and `warnings.showwarning` are not swapped on every call, so
+    concurrent collections in different threads don't interfere. The
+    filter for `category` is set to "always" once and stays in place.
+    """
+    with _collector_lock:
+        if category not in _collected_categories:
+            warnings.simplefilter("always", category)
+            _collected_categories.add(category)
+        if warnings.showwarning is not _collecting_showwarning:
+            warnings.showwarning = _collecting_showwarning
+    collected = []
+    token = _collector.set((category, collected))
+    try:
+        yield collected
+    finally:
+        _collector.reset(token)
@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import asyncio
+import gzip
 import json
 import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from functools import partial
-from typing import Any, Callable, Literal
+from typing import Any, Callable, Iterator, Literal
 from datetime import datetime, timezone
 
 import psycopg
 import requests
 from psycopg import Connection, conninfo
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from timeio.common import get_envvar
+from timeio.observations import ObservationBatch
 from timeio.typehints import TimestampT
 
 
@@ -39,90 +46,195 @@ class Database:
 
 
 class DBapi:
+    """
+    Client of the timeio database API.
 
-    def __init__(self, base_url, auth_token):
+    All requests use pooled `requests.Session`s (keep-alive), are bounded
+    by `timeout` seconds and idempotent requests are retried up to
+    `retries` times with exponential backoff on connection errors and on
+    the HTTP status codes in `DBapi.RETRY_STATUS`. Besides the idempotent
+    HTTP methods these are the upserts, which are sent via POST, other
+    POST requests (e.g. `insert_mqtt_message`) are never retried.
+
+    Observation upserts are split into batches of at most `batch_size`
+    observations, which are sent with up to `max_workers` concurrent
+    requests and optionally gzip compressed (`compress=True`, needs a
+    DB API that accepts `Content-Encoding: gzip`).
+
+    Defaults for all options are read from the environment variables
+    DB_API_TIMEOUT, DB_API_RETRIES, DB_API_BATCH_SIZE, DB_API_MAX_WORKERS
+    and DB_API_COMPRESS. The session keeps up to `pool_size` (at least
+    `max_workers`) connections alive, for use from multiple threads.
+    """
+
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        base_url,
+        auth_token,
+        timeout: float | None = None,
+        retries: int | None = None,
+        batch_size: int | None = None,
+        max_workers: int | None = None,
+        compress: bool | None = None,
+        pool_size: int | None = None,
+    ):
         self.base_url = base_url
         self.auth_token = auth_token
+        self.timeout = _or_envvar(timeout, "DB_API_TIMEOUT", 60.0, float)
+        self.retries = _or_envvar(retries, "DB_API_RETRIES", 3, int)
+        self.batch_size = _or_envvar(batch_size, "DB_API_BATCH_SIZE", 50_000, int)
+        self.max_workers = _or_envvar(max_workers, "DB_API_MAX_WORKERS", 1, int)
+        self.compress = _or_envvar(compress, "DB_API_COMPRESS", False, bool)
+        self.pool_size = max(pool_size or 1, self.max_workers)
+        self.session = self._create_session()
+        # retries POST requests as well, only use it for idempotent ones
+        self.idempotent_session = self._create_session(allowed_methods=None)
         self.ping_dbapi()
 
+    def _create_session(
+        self, allowed_methods=Retry.DEFAULT_ALLOWED_METHODS
+    ) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.5,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=allowed_methods,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Authorization"] = f"Bearer {self.auth_token}"
+        return session
+
+    def _request(
+        self, method: str, url: str, idempotent: bool = False, **kwargs
+    ) -> requests.Response:
+        """
+        Send a request, pass `idempotent=True` to retry a POST request,
+        that can safely be sent more than once.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.idempotent_session if idempotent else self.session
+        resp = session.request(method, url, **kwargs)
+        resp.raise_for_status()
+        return resp
+
     def ping_dbapi(self) -> None:
         """
         Test the health endpoint of the given url.
 
         Added in version 0.4.0
         """
-        with urllib.request.urlopen(f"{self.base_url}/health") as resp:
+        with urllib.request.urlopen(
+            f"{self.base_url}/health", timeout=self.timeout
+        ) as resp:
             if not resp.status == 200:
                 raise ConnectionError(
                     f"Failed to ping. HTTP status code: {resp.status}"
                 )
 
+    def close(self) -> None:
+        self.session.close()
+        self.idempotent_session.close()
+
     def delete_observations(
         self, thing_uuid: str, pos: str, start_date=TimestampT, end_date=TimestampT
     ):
         url = f"{self.base_url}/things/{thing_uuid}/datastreams/{pos}/observations"
-
-        resp = requests.delete(
+        self._request(
+            "DELETE",
             url,
             params={"datetime_from": start_date, "datetime_to": end_date},
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
         )
-        resp.raise_for_status()
 
-    def upsert_observations(self, thing_uuid: str, observations: list[dict[str, Any]]):
-        url = f"{self.base_url}/things/{thing_uuid}/datastreams/observations/upsert"
+    def _split(
+        self, observations: list[dict[str, Any]] | ObservationBatch
+    ) -> Iterator[list[dict[str, Any]] | ObservationBatch]:
+        if isinstance(observations, ObservationBatch):
+            yield from observations.split(self.batch_size)
+            return
+        for i in range(0, len(observations), self.batch_size):
+            yield observations[i : i + self.batch_size]
 
-        resp = requests.post(
-            url,
-            json={"observations": observations},
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
+    def _post_json(
+        self, url: str, body: str, idempotent: bool = False
+    ) -> requests.Response:
+        headers = {"Content-Type": "application/json"}
+        data = body.encode("utf-8")
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+            data = gzip.compress(data, compresslevel=1)
+        return self._request(
+            "POST", url, idempotent=idempotent, data=data, headers=headers
         )
-        resp.raise_for_status()
+
+    def _upsert_batch(
+        self, url: str, observations: list[dict[str, Any]] | ObservationBatch
+    ) -> None:
+        if isinstance(observations, ObservationBatch):
+            # render the wire format directly from the columnar batch
+            body = f'{{"observations": {observations.to_json()}}}'
+        else:
+            body = json.dumps({"observations": observations}, allow_nan=False)
+        self._post_json(url, body, idempotent=True)
+
+    def upsert_observations(
+        self,
+        thing_uuid: str,
+        observations: list[dict[str, Any]] | ObservationBatch,
+    ):
+        url = f"{self.base_url}/things/{thing_uuid}/datastreams/observations/upsert"
+
+        batches = self._split(observations)
+        if self.max_workers <= 1:
+            for batch in batches:
+                self._upsert_batch(url, batch)
+            return
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            # Only keep a bounded number of rendered batches in flight
+            pending = set()
+            for batch in batches:
+                if len(pending) >= self.max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(self._upsert_batch, url, batch))
+            for future in pending:
+                future.result()
 
     def upsert_qc_labels(self, thing_uuid: str, qc_labels: list[dict[str, Any]]):
         url = f"{self.base_url}/things/{thing_uuid}/observations/qaqc"
-
-        resp = requests.post(
-            url,
-            json={"qaqc_labels": qc_labels},
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
-        )
-        resp.raise_for_status()
+        self._post_json(url, json.dumps({"qaqc_labels": qc_labels}), idempotent=True)
 
     def insert_datastreams(
-        self, thing_uuid: str, datastreams: list[dict[str, Any]], mutable: bool
+        self,
+        thing_uuid: str,
+        datastreams: list[dict[str, Any]] | ObservationBatch,
+        mutable: bool,
     ) -> list[dict[Literal["position", "id", "status"], str]]:
-        unique_pos = list(set([obs["datastream_pos"] for obs in datastreams]))
+        if isinstance(datastreams, ObservationBatch):
+            unique_pos = datastreams.datastream_positions
+        else:
+            unique_pos = list(set([obs["datastream_pos"] for obs in datastreams]))
         datastreams = [{"position": pos, "mutable": mutable} for pos in unique_pos]
         url = f"{self.base_url}/things/{thing_uuid}/datastreams"
-        resp = requests.post(
-            url,
-            json={"datastreams": datastreams},
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.auth_token}",
-            },
+        # datastreams are unique per position, sending them again is harmless
+        resp = self._post_json(
+            url, json.dumps({"datastreams": datastreams}), idempotent=True
         )
-        resp.raise_for_status()
         return [s | {"thing_uuid": thing_uuid} for s in resp.json()]
 
     def get_datastream(self, thing_uuid: str, pos: str):
 
         url = f"{self.base_url}/things/{thing_uuid}/datastreams/{pos}"
-        resp = requests.get(
-            url,
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return self._request("GET", url).json()
 
     def get_datastream_observations(
         self,
@@ -139,25 +251,21 @@ class DBapi:
         if end_date is not None:
             params["datetime_to"] = end_date
 
-        resp = requests.get(
-            url,
-            params=params,
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return self._request("GET", url, params=params).json()
 
     def upsert_observations_and_datastreams(
-        self, thing_uuid: str, observations: list[dict[str, Any]], mutable: bool
+        self,
+        thing_uuid: str,
+        observations: list[dict[str, Any]] | ObservationBatch,
+        mutable: bool,
     ):
         self.insert_datastreams(thing_uuid, observations, mutable)
         self.upsert_observations(thing_uuid, observations)
 
     def insert_mqtt_message(self, thing_uuid: str, message: Any) -> None:
         url = f"{self.base_url}/things/{thing_uuid}/mqtt_message/insert"
-        resp = requests.post(
+        self._request(
+            "POST",
             url,
             json={
                 "message": (
@@ -165,8 +273,55 @@ class DBapi:
                 ),
                 "timestamp": datetime.now(tz=timezone.utc).isoformat(),
             },
-            headers={
-                "Authorization": f"Bearer {self.auth_token}",
-            },
         )
-        resp.raise_for_status()
+
+    def insert_mqtt_messages(self, thing_uuid: str, messages: list[Any]) -> None:
+        # The DB API has no bulk endpoint for raw messages (yet), this is
+        # the single place to switch over, once it has one.
+        for message in messages:
+            self.insert_mqtt_message(thing_uuid, message)
+
+
+def _to_thread(name: str):
+    method = getattr(DBapi, name)
+
+    async def wrapper(self: AsyncDBapi, *args, **kwargs):
+        return await asyncio.to_thread(method, self.sync, *args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class AsyncDBapi:
+    """
+    Asyncio facade of `DBapi`, for use with `timeio.mqtt.AsyncAbstractHandler`.
+
+    There is no async HTTP client among our dependencies, so the requests
+    run in the default executor of the event loop and share the pooled
+    session of the wrapped `DBapi`, which is available as `self.sync`.
+    `pool_size` should match the number of concurrent requests.
+    """
+
+    def __init__(self, base_url, auth_token, pool_size: int = 10, **kwargs):
+        self.sync = DBapi(base_url, auth_token, pool_size=pool_size, **kwargs)
+        self.base_url = base_url
+
+    ping_dbapi = _to_thread("ping_dbapi")
+    delete_observations = _to_thread("delete_observations")
+    upsert_observations = _to_thread("upsert_observations")
+    upsert_qc_labels = _to_thread("upsert_qc_labels")
+    insert_datastreams = _to_thread("insert_datastreams")
+    get_datastream = _to_thread("get_datastream")
+    get_datastream_observations = _to_thread("get_datastream_observations")
+    upsert_observations_and_datastreams = _to_thread(
+        "upsert_observations_and_datastreams"
+    )
+    insert_mqtt_message = _to_thread("insert_mqtt_message")
+    insert_mqtt_messages = _to_thread("insert_mqtt_messages")
+
+
+def _or_envvar(value, name: str, default, cast_to: type):
+    if value is not None:
+        return value
+    return get_envvar(name, default, cast_to=cast_to)
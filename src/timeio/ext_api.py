@@ -2,12 +2,18 @@ import requests
 import json
 import base64
 import re
+import threading
+import time
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 from urllib.parse import urlparse
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 
+from requests.adapters import HTTPAdapter
+
 from timeio.feta import Thing
 from timeio.typehints import MqttPayload
 from timeio.crypto import decrypt, get_crypt_key
@@ -33,9 +39,11 @@ class ExtApiSyncer(ABC):
         raise NotImplementedError
 
 
-def request_with_handling(method, url, timeout=(10, 60), **kwargs):
+def request_with_handling(
+    method, url, timeout=(10, 60), session: requests.Session | None = None, **kwargs
+):
     try:
-        response = requests.request(method, url, timeout=timeout, **kwargs)
+        response = (session or requests).request(method, url, timeout=timeout, **kwargs)
         response.raise_for_status()
         return response
     except requests.exceptions.HTTPError as e:
@@ -241,6 +249,21 @@ class UbaApiSyncer(ExtApiSyncer):
         "https://www.umweltbundesamt.de/api/air_data/v3/airquality/json"
     )
 
+    def __init__(self, max_workers: int = 8, catalogue_ttl: float = 3600):
+        """
+        :param max_workers: Maximal number of concurrent requests to the
+            UBA API, shared by all syncs of this instance.
+        :param catalogue_ttl: Seconds to cache the components, scopes
+            and limits catalogues, which are shared by all stations.
+        """
+        self.max_workers = max_workers
+        self.catalogue_ttl = catalogue_ttl
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_workers))
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="uba")
+        self._catalogues: dict[str, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
     def fetch_api_data(self, thing: Thing, content: MqttPayload.SyncExtApiT):
         settings = thing.ext_api.settings
         station_id = settings["station_id"]
@@ -248,12 +271,19 @@ class UbaApiSyncer(ExtApiSyncer):
             content["datetime_from"], content["datetime_to"]
         )
         components, scopes = self.get_components_and_scopes()
+        aqi_future = self._executor.submit(
+            self.get_airquality_data,
+            station_id,
+            date_from,
+            date_to,
+            time_from,
+            time_to,
+            components,
+        )
         measure_data = self.combine_measure_responses(
             station_id, date_from, date_to, time_from, time_to, components, scopes
         )
-        aqi_data = self.get_airquality_data(
-            station_id, date_from, date_to, time_from, time_to, components
-        )
+        aqi_data = aqi_future.result()
         return {
             "measure_data": measure_data,
             "aqi_data": aqi_data,
@@ -289,35 +319,48 @@ class UbaApiSyncer(ExtApiSyncer):
 
         return date_adjusted.strftime("%Y-%m-%d %H:%M:%S")
 
+    def _get_catalogue(self, url: str, transform: Callable[[Any], Any]) -> Any:
+        """Return the transformed JSON response of `url`, cached for `catalogue_ttl`"""
+        with self._lock:
+            entry = self._catalogues.get(url)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            response = request_with_handling("GET", url, session=self.session)
+            value = transform(response.json())
+            self._catalogues[url] = (time.monotonic() + self.catalogue_ttl, value)
+            return value
+
+    @staticmethod
+    def _parse_catalogue(data: dict) -> dict:
+        return {
+            int(v[0]): v[1] for k, v in data.items() if k not in ["count", "indices"]
+        }
+
+    @staticmethod
+    def _index_limits(data: dict) -> dict[str, list]:
+        stations = dict()
+        for k, v in data["data"].items():
+            stations.setdefault(v[2], []).append(
+                {"scope": int(v[0]), "component": int(v[1])}
+            )
+        return stations
+
     def get_components_and_scopes(self):
         """Get components (i.e measured quantites) and scopes
         (aggregation infos) for later mapping
         """
-        response_components = request_with_handling("GET", self.uba_componsents_url)
-        response_scopes = request_with_handling("GET", self.uba_scopes_url)
-        components = {
-            int(v[0]): v[1]
-            for k, v in response_components.json().items()
-            if k not in ["count", "indices"]
-        }
-        scopes = {
-            int(v[0]): v[1]
-            for k, v in response_scopes.json().items()
-            if k not in ["count", "indices"]
-        }
+        components = self._get_catalogue(
+            self.uba_componsents_url, self._parse_catalogue
+        )
+        scopes = self._get_catalogue(self.uba_scopes_url, self._parse_catalogue)
         return components, scopes
 
     def get_station_info(self, station_id: str) -> list:
         """Get all available components and scope combinations of a given
         station
         """
-        station_info = list()
-        response = request_with_handling("GET", self.uba_limits_url)
-        response_json = response.json()["data"]
-        for k, v in response_json.items():
-            if v[2] == station_id:
-                station_info.append({"scope": int(v[0]), "component": int(v[1])})
-        return station_info
+        stations = self._get_catalogue(self.uba_limits_url, self._index_limits)
+        return list(stations.get(station_id, []))
 
     def request_measure_endpoint(
         self,
@@ -345,6 +388,7 @@ class UbaApiSyncer(ExtApiSyncer):
             "GET",
             self.uba_measures_url,
             params=params,
+            session=self.session,
         )
         response_json = response.json()
         if response_json["data"]:
@@ -367,8 +411,8 @@ class UbaApiSyncer(ExtApiSyncer):
         """
         measure_data = list()
         station_info = self.get_station_info(station_id)
-        for entry in station_info:
-            response = self.request_measure_endpoint(
+        responses = self._executor.map(
+            lambda entry: self.request_measure_endpoint(
                 station_id,
                 entry["component"],
                 entry["scope"],
@@ -376,7 +420,10 @@ class UbaApiSyncer(ExtApiSyncer):
                 date_to,
                 time_from,
                 time_to,
-            )
+            ),
+            station_info,
+        )
+        for entry, response in zip(station_info, responses):
             for k, v in response.items():
                 measure_data.append(
                     {
@@ -438,7 +485,9 @@ class UbaApiSyncer(ExtApiSyncer):
             "time_to": time_to,
             "station": station_id,
         }
-        response = request_with_handling("GET", self.uba_airquality_url, params=params)
+        response = request_with_handling(
+            "GET", self.uba_airquality_url, params=params, session=self.session
+        )
         response_json = response.json()
         if not response_json["data"]:
             return []
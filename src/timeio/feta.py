@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import copy
 import logging
 import atexit
+import threading
+import time
 import warnings
-from typing import Any, TypedDict
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TypedDict
 
 try:
     from typing import Self
@@ -13,6 +18,7 @@ except ImportError:
 import psycopg
 from psycopg import Connection, sql
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 import pandas as pd
 
 from timeio.typehints import JsonObjectT, TimestampT
@@ -144,6 +150,62 @@ def _create(cls: type[Base], query: str, id_attr: str, optional: bool = False):
     return property(fetch)
 
 
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    dsn: str, min_size: int = 1, max_size: int = 4, **kwargs
+) -> ConnectionPool:
+    """
+    Return the process-wide connection pool for `dsn`.
+
+    The pool is created on first use and closed on program exit.
+    It can be passed as `dsn` argument to all constructors, e.g.
+    `Thing.from_uuid(uuid, dsn=get_pool(dsn))`, then every query
+    borrows a connection from the pool and returns it afterward.
+    Subsequent calls with the same `dsn` return the same pool, the
+    other arguments only take effect on the first call.
+
+    :param dsn: connection string
+    :param min_size: number of connections the pool keeps open
+    :param max_size: maximal number of connections
+    :param kwargs: kwargs are directly passed to psycopg.connect()
+    """
+    with _pools_lock:
+        if (pool := _pools.get(dsn)) is not None and not pool.closed:
+            return pool
+        kwargs.setdefault("autocommit", True)
+        _pools[dsn] = pool = ConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs=kwargs,
+            check=ConnectionPool.check_connection,
+            name=f"feta-{len(_pools)}",
+            open=True,
+        )
+        logger.debug(f"Opened connection pool {pool.name}")
+        return pool
+
+
+@atexit.register
+def _close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+@contextmanager
+def _borrow(conn: Connection | ConnectionPool) -> Iterator[Connection]:
+    if isinstance(conn, ConnectionPool):
+        with conn.connection() as c:
+            yield c
+    else:
+        yield conn
+
+
 def connect(dsn: str, **kwargs):
     """
     Globally connect feta with a DB.
@@ -165,7 +227,7 @@ class Base:
     _schema: str = "<not set>"
     _protected_values = frozenset()
 
-    def __init__(self, attrs, conn: Connection, caching: bool):
+    def __init__(self, attrs, conn: Connection | ConnectionPool, caching: bool):
         """Constructor for creating a new Base instance from scratch.
 
         See also Base._from_parent(), which create a new instance
@@ -222,11 +284,11 @@ class Base:
 
     @classmethod
     def _get_connection(
-        cls, dsn: str | Connection | None = None, **kwargs
-    ) -> Connection:
-        # The user passed a connection or a dsn
+        cls, dsn: str | Connection | ConnectionPool | None = None, **kwargs
+    ) -> Connection | ConnectionPool:
+        # The user passed a connection, a pool or a dsn
         if dsn is not None:
-            if isinstance(dsn, Connection):
+            if isinstance(dsn, (Connection, ConnectionPool)):
                 return dsn
             conn = psycopg.connect(dsn, **kwargs)
             logger.debug(f"Opened instance connection {conn}")
@@ -245,14 +307,16 @@ class Base:
         )
 
     @staticmethod
-    def _fetchall(conn: Connection, query, *params) -> list[dict[str, Any]]:
-        with conn.cursor(row_factory=dict_row) as cur:
+    def _fetchall(
+        conn: Connection | ConnectionPool, query, *params
+    ) -> list[dict[str, Any]]:
+        with _borrow(conn) as c, c.cursor(row_factory=dict_row) as cur:
             cur.execute(query, params)
             return cur.fetchall()  # type: ignore
 
     @staticmethod
-    def _fetchone(conn: Connection, query, *params):
-        with conn.cursor(row_factory=dict_row) as cur:
+    def _fetchone(conn: Connection | ConnectionPool, query, *params):
+        with _borrow(conn) as c, c.cursor(row_factory=dict_row) as cur:
             cur.execute(query, params)
             return cur.fetchone()
 
@@ -269,6 +333,21 @@ class Base:
         if self._cache:
             self._cache.clear()
 
+    def _cached(self, name: str, func: Callable[[], Any]) -> Any:
+        """
+        Return the cached result of `func` or call and cache it.
+
+        The cache is shared with all related objects, so
+        the key is made unique by class, `name` and id.
+        """
+        key = (self.__class__, name, self.id)
+        # None is a valid result here, so we can't use self._cache_get
+        if self._cache is not None and key in self._cache:
+            return self._cache[key]
+        value = func()
+        self._cache_set(key, value)
+        return value
+
     def to_dict(self) -> dict[str, Any]:
         return self._attrs.copy()
 
@@ -278,7 +357,7 @@ class Base:
     def from_id(
         cls: type[Self],
         id_: int,
-        dsn: str | Connection | None = None,
+        dsn: str | Connection | ConnectionPool | None = None,
         caching: bool = True,
         **kwargs,
     ) -> Self:
@@ -313,7 +392,7 @@ class FromNameMixin:
     def from_name(
         cls: type[Self],
         name: str,
-        dsn: str | Connection | None = None,
+        dsn: str | Connection | ConnectionPool | None = None,
         caching: bool = True,
         **kwargs,
     ) -> Self:
@@ -348,7 +427,7 @@ class FromUUIDMixin:
     def from_uuid(
         cls: type[Self],
         uuid: str,
-        dsn: str | Connection | None = None,
+        dsn: str | Connection | ConnectionPool | None = None,
         caching: bool = True,
         **kwargs,
     ) -> Self:
@@ -547,11 +626,12 @@ class FileParser(Base, FromUUIDMixin):
 
     @property
     def name(self) -> str:
-        return self._get_name()
+        return self._cached("name", self._get_name)
 
     @property
     def params(self) -> JsonT | None:
-        return self._get_params()
+        # callers are free to modify the params, so never hand out the cached ones
+        return copy.deepcopy(self._cached("params", self._get_params))
 
     def _get_name(self):
         query = f"""
@@ -609,7 +689,7 @@ class MQTT(Base):
 
     @property
     def mqtt_device_type(self) -> MQTTDeviceType | None:
-        return self._get_mqtt_device_type()
+        return self._cached("mqtt_device_type", self._get_mqtt_device_type)
 
     def _get_mqtt_device_type(self):
         query = f"""
@@ -804,7 +884,7 @@ class S3Store(Base):
         return self._get_s3_value("filename_pattern")
 
     def _get_s3_value(self, key):
-        row = self._get_s3_row()
+        row = self._cached("s3_row", self._get_s3_row)
         return row.get(key) if row else None
 
     def _get_s3_row(self):
@@ -881,7 +961,7 @@ class Thing(Base, FromNameMixin, FromUUIDMixin):
     def from_s3_bucket_name(
         cls: type[Self],
         bucket_name: str,
-        dsn: str | Connection | None = None,
+        dsn: str | Connection | ConnectionPool | None = None,
         caching: bool = True,
         **kwargs,
     ) -> Self:
@@ -917,7 +997,7 @@ class Thing(Base, FromNameMixin, FromUUIDMixin):
     def from_mqtt_user_name(
         cls: type[Self],
         mqtt_user_name: str,
-        dsn: str | Connection | None = None,
+        dsn: str | Connection | ConnectionPool | None = None,
         caching: bool = True,
         **kwargs,
     ) -> Self:
@@ -948,3 +1028,100 @@ class Thing(Base, FromNameMixin, FromUUIDMixin):
                 f"from the first result."
             )
         return cls(res[0], conn, caching)
+
+
+class ThingCache:
+    """
+    Process-wide, size bounded and TTL evicting cache of resolved Things.
+
+    Things are looked up by S3 bucket name, MQTT username or UUID. On a
+    cache miss the Thing is fetched and its related objects (project,
+    database, S3 store, file parser, MQTT settings) are resolved once,
+    so steady-state lookups need no database round trip at all. If
+    `dsn` is a connection string, lookups borrow their connections
+    from the shared pool returned by `get_pool`.
+
+    Entries expire after `ttl` seconds and the least recently used
+    entries are evicted beyond `maxsize` entries. Use `invalidate`
+    to drop a Thing on configuration changes (see `on_thing_update`).
+    """
+
+    def __init__(
+        self,
+        dsn: str | Connection | ConnectionPool,
+        maxsize: int = 1024,
+        ttl: float = 300,
+    ):
+        self.dsn = dsn
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Thing]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _connection(self) -> Connection | ConnectionPool:
+        if isinstance(self.dsn, str):
+            return get_pool(self.dsn)
+        return self.dsn
+
+    def _get(self, kind: str, key: str, factory: Callable[..., Thing]) -> Thing:
+        with self._lock:
+            if (entry := self._entries.get((kind, key))) is not None:
+                expires, thing = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end((kind, key))
+                    return thing
+                del self._entries[(kind, key)]
+
+            try:
+                thing = factory(key, dsn=self._connection())
+            except psycopg.OperationalError:
+                # the connection might got lost, retry once, the
+                # pool replaces broken connections on checkout
+                thing = factory(key, dsn=self._connection())
+            self._resolve(thing)
+            if self.ttl > 0 and self.maxsize > 0:
+                self._entries[(kind, key)] = (time.monotonic() + self.ttl, thing)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return thing
+
+    @staticmethod
+    def _resolve(thing: Thing) -> None:
+        """Fetch all lazily loaded attributes the ingest workers use."""
+        _ = thing.project.database
+        if (s3 := thing.s3_store) is not None:
+            _ = s3.filename_pattern
+            if s3.file_parser_id is not None:
+                _ = s3.file_parser.params
+        if (mqtt := thing.mqtt) is not None:
+            _ = mqtt.mqtt_device_type
+
+    def from_uuid(self, uuid: str) -> Thing:
+        return self._get("uuid", str(uuid), Thing.from_uuid)
+
+    def from_s3_bucket_name(self, bucket_name: str) -> Thing:
+        return self._get("bucket", bucket_name, Thing.from_s3_bucket_name)
+
+    def from_mqtt_user_name(self, mqtt_user_name: str) -> Thing:
+        return self._get("mqtt_user", mqtt_user_name, Thing.from_mqtt_user_name)
+
+    def invalidate(self, uuid: str | None = None) -> None:
+        """Drop the Thing with the given UUID or all Things if `uuid` is None."""
+        with self._lock:
+            if uuid is None:
+                self._entries.clear()
+                return
+            for key in [k for k, (_, t) in self._entries.items() if t.uuid == uuid]:
+                del self._entries[key]
+
+    def on_thing_update(self, content: Any, message=None) -> None:
+        """
+        Invalidate a Thing from a `configdb_update` message.
+
+        Messages without a Thing UUID invalidate the whole cache.
+        """
+        uuid = None
+        if isinstance(content, dict):
+            uuid = content.get("thing") or content.get("uuid")
+        logger.debug(f"invalidating cached Thing {uuid or '(all)'}")
+        self.invalidate(None if uuid is None else str(uuid))
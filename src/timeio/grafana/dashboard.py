@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+
 from timeio.grafana.typehints import DatasourceT, FolderT
 from typing import TYPE_CHECKING
 
@@ -10,6 +12,8 @@ from timeio.grafana.utils import logger
 if TYPE_CHECKING:
     from timeio.grafana.api import TimeioGrafanaApi
 
+SQL_DIR = os.path.join(os.path.dirname(__file__), "sql")
+
 
 class GrafanaDashboard:
     def __init__(self, api: TimeioGrafanaApi) -> None:
@@ -104,7 +108,10 @@ class GrafanaDashboard:
             "repeat": "datastream_pos",
             "repeatDirection": "h",
             "fieldConfig": {
-                "overrides": [self._show_qaqc_overrides()],
+                "overrides": [
+                    self._show_qaqc_overrides(),
+                    *self._min_max_overrides(),
+                ],
             },
             "targets": [
                 self._observation_query_target(thing, datasource),
@@ -151,6 +158,34 @@ class GrafanaDashboard:
             ],
         }
 
+    @staticmethod
+    def _min_max_overrides() -> list[dict]:
+        # draw the extremes of the aggregated buckets as band around the mean
+        return [
+            {
+                "matcher": {"id": "byName", "options": "max"},
+                "properties": [
+                    {"id": "custom.lineWidth", "value": 0},
+                    {"id": "custom.fillBelowTo", "value": "min"},
+                    {"id": "custom.fillOpacity", "value": 20},
+                    {
+                        "id": "custom.hideFrom",
+                        "value": {"legend": True, "tooltip": False, "viz": False},
+                    },
+                ],
+            },
+            {
+                "matcher": {"id": "byName", "options": "min"},
+                "properties": [
+                    {"id": "custom.lineWidth", "value": 0},
+                    {
+                        "id": "custom.hideFrom",
+                        "value": {"legend": True, "tooltip": False, "viz": False},
+                    },
+                ],
+            },
+        ]
+
     @staticmethod
     def _observations_row_panel() -> dict:
         return {
@@ -225,24 +260,24 @@ class GrafanaDashboard:
     # SQL Queries
     @staticmethod
     def _datastream_sql(uuid: str) -> str:
-        with open("timeio/grafana/sql/datastream.sql", "r") as f:
+        with open(os.path.join(SQL_DIR, "datastream.sql"), "r") as f:
             sql = f.read().format(uuid=uuid)
         return sql
 
     @staticmethod
     def _journal_sql(uuid: str) -> str:
-        with open("timeio/grafana/sql/journal.sql", "r") as f:
+        with open(os.path.join(SQL_DIR, "journal.sql"), "r") as f:
             sql = f.read().format(uuid=uuid)
         return sql
 
     @staticmethod
     def _observation_sql(uuid: str) -> str:
-        with open("timeio/grafana/sql/observation.sql", "r") as f:
+        with open(os.path.join(SQL_DIR, "observation.sql"), "r") as f:
             sql = f.read().format(uuid=uuid)
         return sql
 
     @staticmethod
     def _qaqc_sql(uuid: str) -> str:
-        with open("timeio/grafana/sql/qaqc.sql", "r") as f:
+        with open(os.path.join(SQL_DIR, "qaqc.sql"), "r") as f:
             sql = f.read().format(uuid=uuid)
         return sql
@@ -1,28 +1,74 @@
-WITH date_filtered AS (
--- This query returns the data chosen by the datepicker, or
--- returns null if no data is in the selected date range.
+WITH ds AS (
+  SELECT dp.ds_id FROM datastream_properties dp
+  WHERE ${{datastream_pos:singlequote}} in (dp.property, dp.position)
+  AND dp.t_uuid :: text = '{uuid}'
+),
+raw AS (
+-- The observations are aggregated to buckets of the panel
+-- resolution ($__interval), so no more rows than the panel
+-- can show are returned, no matter how long the time range
+-- is. Each bucket yields the mean and the extremes of its
+-- observations, so peaks stay visible at any zoom level.
+-- Buckets with a single observation keep its exact time.
   SELECT
-    o.result_time AS "time",
-    o.result_number AS "value"
+    CASE
+      WHEN count(*) = 1 THEN min(o.result_time)
+      ELSE date_bin($__interval_ms * interval '1 millisecond', o.result_time, timestamptz 'epoch')
+    END AS "time",
+    avg(o.result_number) AS "value",
+    min(o.result_number) AS "min",
+    max(o.result_number) AS "max"
   FROM observation o
-  WHERE $__timeFilter(o.result_time)
-  AND o.datastream_id = (
-      SELECT dp.ds_id FROM datastream_properties dp
-      WHERE ${{datastream_pos:singlequote}} in (dp.property, dp.position)
-      AND dp.t_uuid :: text = '{uuid}')
-  ORDER BY o.result_time DESC
-  LIMIT 1000000  -- 1M
+  WHERE $__interval_ms < 3600000
+  AND $__timeFilter(o.result_time)
+  AND o.datastream_id = (SELECT ds_id FROM ds)
+  GROUP BY date_bin($__interval_ms * interval '1 millisecond', o.result_time, timestamptz 'epoch')
+),
+hourly AS (
+-- Buckets of an hour and more are aggregated from the
+-- pre-aggregated hourly or daily rollups instead, their
+-- means are weighted by the number of numerical values.
+  SELECT
+    date_bin($__interval_ms * interval '1 millisecond', r.bucket, timestamptz 'epoch') AS "time",
+    sum(r.mean * r.count_number) / nullif(sum(r.count_number), 0) AS "value",
+    min(r.min) AS "min",
+    max(r.max) AS "max"
+  FROM observation_hourly r
+  WHERE $__interval_ms >= 3600000 AND $__interval_ms < 86400000
+  AND $__timeFilter(r.bucket)
+  AND r.datastream_id = (SELECT ds_id FROM ds)
+  GROUP BY 1
+),
+daily AS (
+  SELECT
+    date_bin($__interval_ms * interval '1 millisecond', r.bucket, timestamptz 'epoch') AS "time",
+    sum(r.mean * r.count_number) / nullif(sum(r.count_number), 0) AS "value",
+    min(r.min) AS "min",
+    max(r.max) AS "max"
+  FROM observation_daily r
+  WHERE $__interval_ms >= 86400000
+  AND $__timeFilter(r.bucket)
+  AND r.datastream_id = (SELECT ds_id FROM ds)
+  GROUP BY 1
+),
+date_filtered AS (
+-- This query returns the data chosen by the datepicker, or
+-- returns null if no data is in the selected date range.
+  SELECT * FROM raw
+  UNION ALL
+  SELECT * FROM hourly
+  UNION ALL
+  SELECT * FROM daily
 ),
 fallback AS (
 -- This query returns the most recent 10k datapoints
   SELECT
     o.result_time AS "time",
-    o.result_number AS "value"
+    o.result_number AS "value",
+    o.result_number AS "min",
+    o.result_number AS "max"
   FROM observation o
-  WHERE o.datastream_id = (
-    SELECT dp.ds_id FROM datastream_properties dp
-    WHERE ${{datastream_pos:singlequote}} in (dp.property, dp.position)
-    AND dp.t_uuid :: text = '{uuid}')
+  WHERE o.datastream_id = (SELECT ds_id FROM ds)
   ORDER BY o.result_time DESC  -- most recent
   LIMIT 10000  -- 10k
 )
@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
 import json
 import logging
+import queue
+import threading
 import warnings
 import base64
 from datetime import datetime, timezone
@@ -14,15 +18,19 @@ from urllib.error import HTTPError
 
 from timeio.common import get_envvar, get_envvar_as_bool
 
-__all__ = ["Journal"]
+__all__ = ["Journal", "AsyncJournal"]
 logger = logging.getLogger("journaling")
 
 
 class Journal:
+    # maximal number of queued entries written at once in background mode
+    batch_size = 100
+
     def __init__(
         self,
         name: str,
         errors: Literal["raise", "warn", "ignore"] = "raise",
+        background: bool = False,
     ):
         """
         Class to send messages to the user journal.
@@ -42,6 +50,17 @@ class Journal:
         If journaling is even less important one could use `errors='ignore'`,
         which will cause the Journal to be silent in case of errors.
 
+        With `background=True` messages are only queued and written by a
+        background thread, which is started with the first message. Identical
+        messages to the same thing, which are queued one after another, are
+        written as one message. If the queue (`JOURNAL_QUEUE_SIZE` entries) is
+        full, messages are dropped. Pending messages are written on exit, or
+        by calling `flush`. As errors cannot be raised to the caller anymore,
+        `errors='raise'` logs them instead.
+
+        Requests to the DB API time out after `JOURNAL_TIMEOUT` seconds
+        (default 10), the timeout is handled like any other error.
+
         Added in version 0.4.0
         """
 
@@ -52,6 +71,8 @@ class Journal:
         self.enabled = get_envvar_as_bool("JOURNALING")
         self.base_url = get_envvar("DB_API_BASE_URL", None)
         self.api_token = get_envvar("DB_API_AUTH_TOKEN", None)
+        self.timeout = get_envvar("JOURNAL_TIMEOUT", 10, cast_to=float)
+        self.background = background
 
         if not self.enabled:
             warnings.warn(
@@ -68,8 +89,21 @@ class Journal:
                 "If JOURNALING is enabled, environment "
                 "variable DB_API_BASE_URL must be set."
             )
+        if background:
+            self._queue = queue.Queue(
+                maxsize=get_envvar("JOURNAL_QUEUE_SIZE", 10_000, cast_to=int)
+            )
+            self._writer: threading.Thread | None = None
+            self._writer_lock = threading.Lock()
+            self._dropped = 0
+            self._dropped_lock = threading.Lock()
+            atexit.register(self.flush)
+        else:
+            self._ping()
+
+    def _ping(self):
         # check if up
-        with request.urlopen(f"{self.base_url}/health") as resp:
+        with request.urlopen(f"{self.base_url}/health", timeout=self.timeout) as resp:
             if resp.status != 200:
                 raise ConnectionError(
                     f"Failed to ping DB API '{self.base_url}/health'. "
@@ -96,6 +130,18 @@ class Journal:
         }
         logger.info("Message to journal:\n>> %s[%s]: %s", self.name, level, message)
 
+        if not self.background:
+            self._post(thing_uuid, data)
+            return
+
+        self._start_writer()
+        try:
+            self._queue.put_nowait((thing_uuid, data))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+
+    def _post(self, thing_uuid, data: dict):
         req = request.Request(
             url=f"{self.base_url}/things/{thing_uuid}/journal",
             data=json.dumps(data).encode("utf-8"),
@@ -108,19 +154,126 @@ class Journal:
         logger.debug("%s %s, data: %s", req.method, req.full_url, req.data)
 
         try:
-            resp: HTTPResponse = request.urlopen(req)
+            resp: HTTPResponse = request.urlopen(req, timeout=self.timeout)
             logger.debug("==> %s, %s", resp.status, resp.reason)
 
         except Exception as e:
             if isinstance(e, HTTPError):
                 # HttpError is also an HTTPResponse object
                 logger.debug("==> %s, %s, %s", e.status, e.reason, e.read().decode())
-            if self.error_strategy == "raise":
+            self._handle_error(e)
+
+    def _handle_error(self, e: Exception):
+        if self.error_strategy == "raise":
+            if not self.background:
                 raise RuntimeError("Storing message to journal failed") from e
-            if self.error_strategy == "warn":
-                warnings.warn(
-                    f"Storing message to journal failed, "
-                    f"because of {type(e).__name__}: {e}",
-                    RuntimeWarning,
-                    stacklevel=3,
+            logger.error(
+                "Storing message to journal failed, because of %s: %s",
+                type(e).__name__,
+                e,
+            )
+        if self.error_strategy == "warn":
+            warnings.warn(
+                f"Storing message to journal failed, "
+                f"because of {type(e).__name__}: {e}",
+                RuntimeWarning,
+                stacklevel=5,
+            )
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name=f"journal-{self.name}", daemon=True
                 )
+                self._writer.start()
+
+    def _write_loop(self):
+        try:
+            self._ping()
+        except Exception as e:
+            self._handle_error(e)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._dropped_lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logger.warning("Journal queue was full, dropped %s messages", dropped)
+            for thing_uuid, data in self._collapse(batch):
+                self._post(thing_uuid, data)
+            for _ in batch:
+                self._queue.task_done()
+
+    @staticmethod
+    def _collapse(batch: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+        """
+        Merge consecutive identical messages to the same thing, keep the
+        first timestamp. Messages in between are not skipped, to keep the
+        order of the journal.
+        """
+        runs = []
+        for thing_uuid, data in batch:
+            key = (str(thing_uuid), data["level"], data["message"])
+            if runs and runs[-1][0] == key:
+                runs[-1][3] += 1
+            else:
+                runs.append([key, thing_uuid, data, 1])
+        out = []
+        for _, thing_uuid, data, n in runs:
+            if n > 1:
+                data = {**data, "message": f"{data['message']} (repeated {n} times)"}
+            out.append((thing_uuid, data))
+        return out
+
+    def flush(self, timeout: float | None = 10.0) -> bool:
+        """
+        Wait until all queued messages are written, at most `timeout` seconds.
+
+        Returns False, if messages are still pending. Only relevant in
+        background mode.
+        """
+        if not self.enabled or not self.background or self._writer is None:
+            return True
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout
+            )
+
+
+class AsyncJournal:
+    """
+    Asyncio facade of `Journal`, for use with `timeio.mqtt.AsyncAbstractHandler`.
+
+    Messages are sent from the default executor of the event loop, or
+    only queued in background mode.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        errors: Literal["raise", "warn", "ignore"] = "raise",
+        background: bool = False,
+    ):
+        self.sync = Journal(name, errors, background)
+
+    async def _call(self, func, message, thing_uuid):
+        if self.sync.background:
+            func(message, thing_uuid)
+        else:
+            await asyncio.to_thread(func, message, thing_uuid)
+
+    async def info(self, message, thing_uuid):
+        await self._call(self.sync.info, message, thing_uuid)
+
+    async def warning(self, message, thing_uuid):
+        await self._call(self.sync.warning, message, thing_uuid)
+
+    async def error(self, message, thing_uuid):
+        await self._call(self.sync.error, message, thing_uuid)
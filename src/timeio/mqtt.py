@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import queue
+import signal
 import sys
 import os
 import threading
@@ -9,6 +12,7 @@ import time
 import traceback
 import typing
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 import paho.mqtt.publish
 import paho.mqtt.client as mqtt
@@ -25,6 +29,53 @@ from timeio.errors import (
 logger = logging.getLogger("mqtt-handler")
 
 
+class _OrderedWorkerPool:
+    """
+    Fixed number of worker threads, each with a bounded task queue.
+
+    Tasks with the same key are always executed by the same worker, thus
+    in the order they were submitted. Tasks without a key are given to
+    the worker with the shortest queue. `submit` blocks while the chosen
+    queue is full.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int):
+        self._queues = [queue.Queue(queue_size) for _ in range(max_workers)]
+        self._threads = [
+            threading.Thread(target=self._work, args=(q,), daemon=True)
+            for q in self._queues
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, key: typing.Hashable | None, func: typing.Callable, *args):
+        if key is None:
+            q = min(self._queues, key=lambda q: q.qsize())
+        else:
+            q = self._queues[hash(key) % len(self._queues)]
+        q.put((func, args))
+
+    def shutdown(self) -> None:
+        """Wait until all submitted tasks are done and stop the workers."""
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+
+    @staticmethod
+    def _work(q: queue.Queue) -> None:
+        while (task := q.get()) is not None:
+            func, args = task
+            try:
+                func(*args)
+            except SystemExit as e:
+                # sys.exit() would only end this thread
+                logging.shutdown()
+                os._exit(e.code if isinstance(e.code, int) else 1)
+            except Exception:
+                logger.exception("Unhandled error in worker thread")
+
+
 class AbstractHandler(ABC):
     def __init__(
         self,
@@ -68,13 +119,87 @@ class AbstractHandler(ABC):
         self._st = threading.Thread(target=self._healthcheck_sender, daemon=True)
         self._wt = threading.Thread(target=self._healthcheck_watcher, daemon=True)
         self._mid_to_topic = {}
+        self._subscriptions: dict[
+            str, typing.Callable[[typing.Any, MQTTMessage], None]
+        ] = {}
+        self._manual_ack = False
+        self._deferred_acks: set[int] = set()
+        # worker pool settings, by default `act` runs in the network loop
+        self._workers = int(os.getenv("MQTT_WORKERS", 1))
+        self._worker_queue_size = int(os.getenv("MQTT_WORKER_QUEUE_SIZE", 10))
+        self._pool: _OrderedWorkerPool | None = None
+        if self._workers > 1:
+            self.enable_manual_ack()
+
+    def subscribe(
+        self,
+        topic: str,
+        callback: typing.Callable[[typing.Any, MQTTMessage], None],
+    ) -> None:
+        """
+        Subscribe to an additional topic.
+
+        The decoded content of messages on `topic` is passed to `callback`
+        instead of `act`. Must be called before `run_loop`.
+        """
+        self._subscriptions[topic] = callback
+
+    def enable_manual_ack(self) -> None:
+        """
+        Acknowledge QoS>0 messages only after they were handled.
+
+        By default, paho acknowledges a message as soon as it was
+        received. With manual acknowledgement the message is acknowledged
+        after `act` returned, or, if `act` called `defer_ack`, not before
+        `ack` is called. Must be called before `run_loop`.
+        """
+        self._manual_ack = True
+        self.mqtt_client.manual_ack_set(True)
+
+    def defer_ack(self, message: MQTTMessage) -> None:
+        """Take over the acknowledgement of `message` (see `enable_manual_ack`)."""
+        self._deferred_acks.add(id(message))
+
+    def ack(self, message: MQTTMessage) -> None:
+        if self._manual_ack:
+            self.mqtt_client.ack(message.mid, message.qos)
+
+    def ordering_key(self, content: typing.Any, message: MQTTMessage) -> typing.Any:
+        """
+        Return the key, messages must be processed in order for.
+
+        Only relevant if `act` runs in multiple workers (MQTT_WORKERS > 1).
+        Messages with the same key are processed one after another and in
+        the order they were received, messages with different keys might
+        be processed concurrently. `None` means no ordering is required.
+        The default orders all messages of a topic.
+        """
+        return message.topic
 
     def run_loop(self) -> typing.NoReturn:
         logger.info("Setup ok, starting listening loop, healtcheck sender and watcher")
+        if self._workers > 1:
+            logger.info(f"Processing messages with {self._workers} workers")
+            self._pool = _OrderedWorkerPool(self._workers, self._worker_queue_size)
+            signal.signal(signal.SIGTERM, self._on_sigterm)
         self._st.start()
         self._wt.start()
         self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
         self.mqtt_client.loop_forever()
+        # only reached after a disconnect, see _on_sigterm
+        sys.exit(0)
+
+    def _on_sigterm(self, signum, frame):
+        """
+        Drain the worker pool and disconnect.
+
+        This runs in the network loop thread, so no new messages are
+        received meanwhile. The acknowledgements of the drained messages
+        are sent, before the loop finally handles the disconnect.
+        """
+        logger.info("Received SIGTERM, waiting for workers to finish")
+        self._pool.shutdown()
+        self.mqtt_client.disconnect()
 
     def on_log(self, client: mqtt.Client, userdata, level, buf):
         logger.debug(f"%s: %s", level, buf)
@@ -92,6 +217,9 @@ class AbstractHandler(ABC):
             self._mid_to_topic[mid] = self.topic
             res, mid = self.mqtt_client.subscribe(self._healthcheck_topic, 0)
             self._mid_to_topic[mid] = self._healthcheck_topic
+            for topic in self._subscriptions:
+                res, mid = self.mqtt_client.subscribe(topic, self.mqtt_qos)
+                self._mid_to_topic[mid] = topic
             return
         logger.error(f"Failed to connect to %r, return code: %s", self.mqtt_broker, rc)
 
@@ -127,10 +255,55 @@ class AbstractHandler(ABC):
             # the exception again (with unnecessary clutter)
             sys.exit(1)
 
+        if self._pool is None:
+            self._process(content, message)
+            return
+        try:
+            key = self.ordering_key(content, message)
+        except Exception:
+            key = message.topic
+        self._pool.submit(key, self._process, content, message)
+
+    def _process(self, content: typing.Any, message: MQTTMessage):
+        self._handle(content, message)
+        if id(message) in self._deferred_acks:
+            self._deferred_acks.discard(id(message))
+        else:
+            self.ack(message)
+
+    def _handle(self, content: typing.Any, message: MQTTMessage):
+        for topic, callback in self._subscriptions.items():
+            if mqtt.topic_matches_sub(topic, message.topic):
+                logger.debug(f"calling %s for topic %r", callback, topic)
+                try:
+                    callback(content, message)
+                except Exception:
+                    self._log_act_error(content)
+                return
+
         try:
             logger.debug(f"calling %s.act()", self.__class__.__qualname__)
             self.act(content, message)
+        except Exception:
+            self._log_act_error(content)
+            return
+        self._log_done()
+
+    def _log_done(self):
+        logger.info(
+            f"\n===================== PROCESSING DONE ======================\n"
+            f"Status: Success  (Message was processed successfully)\n"
+            f"===================== PROCESSING DONE ======================\n",
+        )
 
+    def _log_act_error(self, content: typing.Any):
+        """
+        Log the exception that is currently handled.
+
+        Must be called from an `except` block. Exits on unexpected errors.
+        """
+        try:
+            raise
         except (UserInputError, ParsingError):
             logger.error(
                 f"\n======================== USER ERROR ========================\n"
@@ -172,12 +345,6 @@ class AbstractHandler(ABC):
             # the exception again (with unnecessary clutter)
             sys.exit(1)
 
-        logger.info(
-            f"\n===================== PROCESSING DONE ======================\n"
-            f"Status: Success  (Message was processed successfully)\n"
-            f"===================== PROCESSING DONE ======================\n",
-        )
-
     def _healthcheck_sender(self):
         while True:
             payload = json.dumps({"ping": time.asctime()})
@@ -245,6 +412,187 @@ class AbstractHandler(ABC):
         raise NotImplementedError
 
 
+class AsyncAbstractHandler(AbstractHandler):
+    """
+    Variant of `AbstractHandler` with a coroutine `act` for I/O bound workers.
+
+    The paho client is driven by an asyncio event loop. Every message
+    is handled in its own task and up to MQTT_CONCURRENCY (default: 10)
+    messages are processed at once, messages with the same `ordering_key`
+    one after another. While MQTT_CONCURRENCY tasks are pending, no further
+    messages are read from the socket, so the broker (or TCP) holds them
+    back. Hence, the tasks should not block all slots for longer than the
+    keepalive interval (60s), else the client is disconnected. QoS>0
+    messages are acknowledged once their task finished.
+
+    Blocking code must not be called from `act` directly, but with
+    `asyncio.to_thread` or `loop.run_in_executor(None, ...)`. The
+    default executor has MQTT_CONCURRENCY threads. See also
+    `timeio.databases.AsyncDBapi` and `timeio.journaling.AsyncJournal`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = int(os.getenv("MQTT_CONCURRENCY", 10))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._tails: dict[typing.Any, asyncio.Task] = {}
+        self._sock = None
+        self._reading = False
+        self._misc: asyncio.Task | None = None
+        self._disconnected: asyncio.Future | None = None
+        self._stopping = False
+        self.enable_manual_ack()
+        self.mqtt_client.on_disconnect = self.on_disconnect
+        self.mqtt_client.on_socket_open = self._on_socket_open
+        self.mqtt_client.on_socket_close = self._on_socket_close
+        self.mqtt_client.on_socket_register_write = self._on_socket_register_write
+        self.mqtt_client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def run_loop(self) -> typing.NoReturn:
+        logger.info("Setup ok, starting asyncio loop, healtcheck sender and watcher")
+        asyncio.run(self._main())
+        sys.exit(0)
+
+    def _init_loop(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(self.concurrency))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _main(self) -> None:
+        self._init_loop()
+        self._loop.add_signal_handler(signal.SIGTERM, self._on_sigterm)
+        self._st.start()
+        self._wt.start()
+        self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
+        while not self._stopping:
+            self._disconnected = self._loop.create_future()
+            await self._disconnected
+            while not self._stopping:
+                logger.warning("Disconnected from broker, reconnecting")
+                await asyncio.sleep(1)
+                try:
+                    self.mqtt_client.reconnect()
+                    break
+                except OSError as e:
+                    logger.warning(f"Reconnect failed: {e}")
+
+    def on_disconnect(self, client: mqtt.Client, userdata, rc):
+        if self._disconnected is not None and not self._disconnected.done():
+            self._disconnected.set_result(rc)
+
+    def _on_sigterm(self):
+        logger.info("Received SIGTERM, waiting for running tasks to finish")
+        self._stopping = True
+        # stop receiving new messages
+        self._pause_reading()
+        self._loop.create_task(self._drain())
+
+    async def _drain(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.mqtt_client.disconnect()
+
+    # The following callbacks integrate the paho client into
+    # the asyncio loop, see paho's examples/loop_asyncio.py.
+
+    def _on_socket_open(self, client: mqtt.Client, userdata, sock):
+        self._sock = sock
+        self._resume_reading()
+        self._misc = self._loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client: mqtt.Client, userdata, sock):
+        self._pause_reading()
+        self._sock = None
+        if self._misc is not None:
+            self._misc.cancel()
+
+    def _on_socket_register_write(self, client: mqtt.Client, userdata, sock):
+        # publish() and ack() might be called from other threads
+        self._loop.call_soon_threadsafe(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client: mqtt.Client, userdata, sock):
+        self._loop.call_soon_threadsafe(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        while self.mqtt_client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _pause_reading(self):
+        if self._reading:
+            self._loop.remove_reader(self._sock)
+            self._reading = False
+
+    def _resume_reading(self):
+        if not self._reading and self._sock is not None and not self._stopping:
+            self._loop.add_reader(self._sock, self.mqtt_client.loop_read)
+            self._reading = True
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if len(self._tasks) < self.concurrency:
+            self._resume_reading()
+
+    def _process(self, content: typing.Any, message: MQTTMessage):
+        try:
+            key = self.ordering_key(content, message)
+        except Exception:
+            key = message.topic
+        previous = self._tails.get(key) if key is not None else None
+        task = self._loop.create_task(self._aprocess(previous, content, message))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        if key is not None:
+            self._tails[key] = task
+            task.add_done_callback(
+                lambda t: self._tails.pop(key) if self._tails.get(key) is t else None
+            )
+        if len(self._tasks) >= self.concurrency:
+            # backpressure: read the next message, once a task finished
+            self._pause_reading()
+
+    async def _aprocess(
+        self, previous: asyncio.Task | None, content: typing.Any, message: MQTTMessage
+    ):
+        if previous is not None:
+            # keep the order per key, regardless how the previous task ended
+            await asyncio.wait([previous])
+        async with self._semaphore:
+            await self._ahandle(content, message)
+        if id(message) in self._deferred_acks:
+            self._deferred_acks.discard(id(message))
+        else:
+            self.ack(message)
+
+    async def _ahandle(self, content: typing.Any, message: MQTTMessage):
+        for topic, callback in self._subscriptions.items():
+            if mqtt.topic_matches_sub(topic, message.topic):
+                logger.debug(f"calling %s for topic %r", callback, topic)
+                try:
+                    if asyncio.iscoroutine(result := callback(content, message)):
+                        await result
+                except Exception:
+                    self._log_act_error(content)
+                return
+
+        try:
+            logger.debug(f"calling %s.act()", self.__class__.__qualname__)
+            await self.act(content, message)
+        except Exception:
+            self._log_act_error(content)
+            return
+        self._log_done()
+
+    @abstractmethod
+    async def act(self, content: typing.Any, message: MQTTMessage):
+        """
+        Subclasses must overwrite this coroutine.
+
+        See AbstractHandler.act for the handling of exceptions.
+        """
+        raise NotImplementedError
+
+
 def _get_settings_from_env():
     try:
         _broker = os.environ["MQTT_BROKER"]
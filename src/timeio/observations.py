@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, overload
+
+import numpy as np
+import pandas as pd
+
+from timeio.common import ObservationResultType
+
+if TYPE_CHECKING:
+    from timeio.parser.typehints import ObservationPayloadT
+
+
+def isoformat(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Vectorized version of `[ts.isoformat() for ts in index]`.
+
+    Sub-second fractions and UTC offsets are only rendered
+    if present, exactly like `pandas.Timestamp.isoformat` does.
+    """
+    local = index.tz_localize(None) if index.tz is not None else index
+    values = local.to_numpy(dtype="datetime64[ns]")
+    result = np.datetime_as_string(values, unit="s").astype(object)
+
+    nanos = values.view("int64") % 1_000_000_000
+    with_us = nanos != 0
+    if with_us.any():
+        result[with_us] = np.datetime_as_string(values[with_us], unit="us")
+    with_ns = nanos % 1000 != 0
+    if with_ns.any():
+        result[with_ns] = np.datetime_as_string(values[with_ns], unit="ns")
+
+    if index.tz is not None:
+        offsets = (local - index.tz_convert("UTC").tz_localize(None)).to_numpy()
+        offsets = offsets.astype("timedelta64[s]").astype("int64")
+        formatted = {o: _format_utcoffset(o) for o in np.unique(offsets)}
+        result = result + np.array([formatted[o] for o in offsets], dtype=object)
+
+    return result
+
+
+def _format_utcoffset(seconds: int) -> str:
+    sign = "-" if seconds < 0 else "+"
+    hours, rest = divmod(abs(int(seconds)), 3600)
+    minutes, seconds = divmod(rest, 60)
+    offset = f"{sign}{hours:02d}:{minutes:02d}"
+    return f"{offset}:{seconds:02d}" if seconds else offset
+
+
+@dataclass
+class ObservationBlock:
+    """All observations of a single datastream and result type."""
+
+    datastream_pos: str
+    result_type: ObservationResultType
+    result_field: str
+    rows: np.ndarray  # positions into ObservationBatch.index
+    values: np.ndarray
+    parameters: str  # JSON encoded, shared by all rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class ObservationBatch(Sequence):
+    """
+    Columnar (struct-of-arrays) container of observations.
+
+    All blocks share a single timestamp index, which is ISO formatted
+    once and only on demand. Row wise `ObservationPayloadT` dictionaries
+    are only created if the batch is iterated or indexed, `to_json`
+    renders the wire format without creating them at all.
+    """
+
+    def __init__(self, index: pd.DatetimeIndex):
+        self.index = index
+        self.blocks: list[ObservationBlock] = []
+        self._result_times: np.ndarray | None = None
+        # start of each block, converted to an array on lookup only
+        self._offsets: list[int] = [0]
+        self._offsets_array: np.ndarray | None = None
+
+    def append(
+        self,
+        datastream_pos: str,
+        result_type: ObservationResultType,
+        result_field: str,
+        rows: np.ndarray,
+        values: np.ndarray,
+        parameters: str,
+    ) -> None:
+        self.blocks.append(
+            ObservationBlock(
+                datastream_pos, result_type, result_field, rows, values, parameters
+            )
+        )
+        self._offsets.append(self._offsets[-1] + len(rows))
+        self._offsets_array = None
+
+    @classmethod
+    def concat(cls, batches: Sequence[ObservationBatch]) -> ObservationBatch:
+        """
+        Combine several batches into one, without creating row wise payloads.
+
+        All batches must have the same time zone.
+        """
+        if len({str(b.index.tz) for b in batches}) > 1:
+            raise ValueError("cannot concatenate batches of different time zones")
+        out = cls(batches[0].index.append([b.index for b in batches[1:]]))
+        offset = 0
+        for batch in batches:
+            for block in batch.blocks:
+                out.append(
+                    block.datastream_pos,
+                    block.result_type,
+                    block.result_field,
+                    block.rows + offset,
+                    block.values,
+                    block.parameters,
+                )
+            offset += len(batch.index)
+        return out
+
+    @property
+    def result_times(self) -> np.ndarray:
+        if self._result_times is None:
+            self._result_times = isoformat(self.index)
+        return self._result_times
+
+    @property
+    def datastream_positions(self) -> list[str]:
+        return list(dict.fromkeys(b.datastream_pos for b in self.blocks))
+
+    def __len__(self) -> int:
+        return self._offsets[-1]
+
+    @overload
+    def __getitem__(self, i: int) -> ObservationPayloadT: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[ObservationPayloadT]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("ObservationBatch index out of range")
+        if self._offsets_array is None:
+            self._offsets_array = np.array(self._offsets)
+        block_no = int(np.searchsorted(self._offsets_array, i, side="right")) - 1
+        block = self.blocks[block_no]
+        row = i - self._offsets[block_no]
+        return self._to_payload(
+            block,
+            self.result_times[block.rows[row]],
+            block.values[row : row + 1].tolist()[0],
+        )
+
+    def __iter__(self) -> Iterator[ObservationPayloadT]:
+        times = self.result_times
+        for block in self.blocks:
+            for t, v in zip(times[block.rows], block.values.tolist()):
+                yield self._to_payload(block, t, v)
+
+    @staticmethod
+    def _to_payload(block: ObservationBlock, result_time, value) -> ObservationPayloadT:
+        return {
+            "result_time": result_time,
+            block.result_field: value,
+            "result_type": int(block.result_type),
+            "datastream_pos": block.datastream_pos,
+            "parameters": block.parameters,
+        }
+
+    def split(self, size: int) -> Iterator[ObservationBatch]:
+        """Yield consecutive batches of at most `size` observations."""
+        times = self.result_times
+
+        def new_batch() -> ObservationBatch:
+            batch = ObservationBatch(self.index)
+            batch._result_times = times
+            return batch
+
+        current = new_batch()
+        for block in self.blocks:
+            start = 0
+            while start < len(block):
+                stop = start + size - len(current)
+                current.append(
+                    block.datastream_pos,
+                    block.result_type,
+                    block.result_field,
+                    block.rows[start:stop],
+                    block.values[start:stop],
+                    block.parameters,
+                )
+                start = stop
+                if len(current) >= size:
+                    yield current
+                    current = new_batch()
+        if len(current):
+            yield current
+
+    def to_payload(self) -> list[ObservationPayloadT]:
+        return list(self)
+
+    def to_json(self) -> str:
+        """
+        Render the batch as JSON array of `ObservationPayloadT` objects.
+
+        Equivalent to `json.dumps(batch.to_payload(), allow_nan=False)`,
+        but without creating a dictionary per observation. Like there,
+        infinite values raise a ValueError, as JSON has no representation
+        for them.
+        """
+        times = self.result_times
+        parts = []
+        for block in self.blocks:
+            if len(block) == 0:
+                continue
+            head = '{"result_time": "'
+            mid = f'", {json.dumps(block.result_field)}: '
+            tail = (
+                f', "result_type": {int(block.result_type)}'
+                f', "datastream_pos": {json.dumps(block.datastream_pos)}'
+                f', "parameters": {json.dumps(block.parameters)}}}'
+            )
+            if block.values.dtype == object:
+                values = [json.dumps(v, allow_nan=False) for v in block.values.tolist()]
+            else:
+                # numbers and booleans never contain the separator
+                values = json.dumps(block.values.tolist(), allow_nan=False)
+                values = values[1:-1].split(", ")
+            parts.append(
+                ", ".join(
+                    head + t + mid + v + tail for t, v in zip(times[block.rows], values)
+                )
+            )
+        return "[" + ", ".join(parts) + "]"
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from minio import Minio
+from minio.commonconfig import Tags
+from psycopg import Connection
+from psycopg.rows import class_row
+from psycopg_pool import ConnectionPool
+
+from timeio.feta import _borrow
+
+logger = logging.getLogger("parse-status")
+
+# version id of objects in unversioned buckets
+NO_VERSION = ""
+
+
+def _version_id(version_id: str | None) -> str:
+    return NO_VERSION if version_id in (None, "null") else version_id
+
+
+@dataclass
+class ParseStatus:
+    version_id: str
+    last_modified: datetime | None
+    parser_id: str | None = None
+    parsing_status: str | None = None
+    parsed_at: datetime | None = None
+
+    def to_tags(self) -> Tags:
+        tags = Tags.new_object_tags()
+        tags["parsed_at"] = self.parsed_at.isoformat()
+        tags["parser_id"] = self.parser_id
+        tags["parsing_status"] = self.parsing_status
+        return tags
+
+
+def _latest(versions: list[ParseStatus]) -> ParseStatus | None:
+    """The latest successfully parsed version, like `ParseStatusIndex.lookup`."""
+    return max(
+        versions,
+        key=lambda v: (
+            v.parsing_status == "successful",
+            v.last_modified is not None,
+            v.last_modified or datetime.min,
+        ),
+        default=None,
+    )
+
+
+def read_parse_status(minio: Minio, bucket: str, object_name: str) -> list[ParseStatus]:
+    """Read the parsing status of all object versions from their tags."""
+    out = []
+    for obj in minio.list_objects(bucket, prefix=object_name, include_version=True):
+        if obj.object_name != object_name or obj.is_delete_marker:
+            continue
+        tags = minio.get_object_tags(bucket, object_name, version_id=obj.version_id)
+        status = ParseStatus(obj.version_id, obj.last_modified)
+        if tags:
+            status.parser_id = tags.get("parser_id")
+            status.parsing_status = tags.get("parsing_status")
+            if parsed_at := tags.get("parsed_at"):
+                status.parsed_at = datetime.fromisoformat(parsed_at)
+        out.append(status)
+    return out
+
+
+def tag_parse_status(
+    minio: Minio,
+    index: ParseStatusIndex | None,
+    bucket: str,
+    object_name: str,
+    status: ParseStatus,
+) -> None:
+    """
+    Tag the object version `status` refers to and record it in `index`.
+
+    The tags are written without reading them first, they only hold the
+    parsing status. Objects unknown to the index are backfilled from their
+    tags before, to keep all versions of an object indexed or none.
+    """
+    version_id = _version_id(status.version_id) or None
+    minio.set_object_tags(bucket, object_name, status.to_tags(), version_id=version_id)
+    if index is not None:
+        index.lookup_or_backfill(minio, bucket, object_name)
+        index.record(bucket, object_name, [status])
+
+
+class ParseStatusIndex:
+    """
+    Parsing status of S3 object versions, kept in the table
+    `file_ingest.parse_status` instead of the object tags.
+
+    An object is either indexed with all of its versions or not at all,
+    so `lookup` needs a single query to find the latest successfully
+    parsed version. Objects that are not indexed yet can be backfilled
+    from their tags with `record`.
+    """
+
+    table = "file_ingest.parse_status"
+
+    def __init__(self, conn: Connection | ConnectionPool):
+        self.conn = conn
+
+    def lookup(self, bucket: str, object_name: str) -> ParseStatus | None:
+        """
+        Return the latest successfully parsed version of the object, or
+        the latest version, if none was parsed successfully. Return None,
+        if the object is not indexed.
+        """
+        query = (
+            f"SELECT version_id, last_modified, parser_id, parsing_status, parsed_at "
+            f"FROM {self.table} WHERE bucket = %s AND object_name = %s "
+            f"ORDER BY parsing_status = 'successful' DESC NULLS LAST, "
+            f"last_modified DESC NULLS LAST LIMIT 1"
+        )
+        with _borrow(self.conn) as c:
+            with c.cursor(row_factory=class_row(ParseStatus)) as cur:
+                return cur.execute(query, (bucket, object_name)).fetchone()
+
+    def lookup_or_backfill(
+        self, minio: Minio, bucket: str, object_name: str
+    ) -> ParseStatus | None:
+        """
+        Like `lookup`, but objects that are not indexed yet are backfilled
+        with all their versions from the object tags first.
+        """
+        status = self.lookup(bucket, object_name)
+        if status is None:
+            versions = read_parse_status(minio, bucket, object_name)
+            self.record(bucket, object_name, versions)
+            status = _latest(versions)
+        return status
+
+    def record(self, bucket: str, object_name: str, versions: list[ParseStatus]):
+        """Insert or update the status of the given object versions."""
+        query = (
+            f"INSERT INTO {self.table} (bucket, object_name, version_id, "
+            f"last_modified, parser_id, parsing_status, parsed_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (bucket, object_name, version_id) DO UPDATE SET "
+            f"last_modified = coalesce(EXCLUDED.last_modified, "
+            f"{self.table}.last_modified), "
+            f"parser_id = EXCLUDED.parser_id, "
+            f"parsing_status = EXCLUDED.parsing_status, "
+            f"parsed_at = EXCLUDED.parsed_at"
+        )
+        params = [
+            (
+                bucket,
+                object_name,
+                _version_id(v.version_id),
+                v.last_modified,
+                v.parser_id,
+                v.parsing_status,
+                v.parsed_at,
+            )
+            for v in versions
+        ]
+        with _borrow(self.conn) as c, c.cursor() as cur:
+            cur.executemany(query, params)
@@ -14,6 +14,9 @@ class AbcParser(ABC):
     # whether or not the Parser excpects a binary file
     is_binary: ClassVar[bool] = False
 
+    # whether or not the Parser can parse a byte stream chunk-wise (see `iter_parse`)
+    is_streamable: ClassVar[bool] = False
+
     def __init__(self):
         self._start_date: TimestampT | None = None
         self._end_date: TimestampT | None = None
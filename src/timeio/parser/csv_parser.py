@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import codecs
 import re
 import warnings
 import yaml
 import os
 import pytz
-from typing import TypeVar, Any
+from typing import TypeVar, Any, Iterable, Iterator
 import pandas as pd
 import numpy as np
+from collections import deque
 from io import StringIO
 from functools import reduce
 
@@ -16,7 +18,7 @@ from timeio.errors import ParsingError, ParsingWarning, EmptyDataError
 from timeio.journaling import Journal
 
 parsedT = TypeVar("parsedT")
-journal = Journal("CsvParser", errors="warn")
+journal = Journal("CsvParser", errors="warn", background=True)
 
 DEFAULT_SETTINGS = {
     "comment": "#",
@@ -30,6 +32,8 @@ DEFAULT_SETTINGS = {
 
 
 class CsvParser(PandasParser):
+    is_streamable = True
+
     def __init__(self, settings: dict[str, Any] | None = None):
         settings = dict(settings or {})
         pandas_read_csv = settings.pop("pandas_read_csv", None) or {}
@@ -111,7 +115,7 @@ class CsvParser(PandasParser):
         return "|".join(comments)
 
     @staticmethod
-    def _apply_skipping(lines, skiprows, skipfooter):
+    def _skiprows_set(skiprows) -> set[int]:
         if skiprows is None:
             skiprows = []
         # in Config-DB or pandas_read_csv JSON, skiprows is stored as an integer
@@ -122,7 +126,11 @@ class CsvParser(PandasParser):
             skiprows = [int(i) for i in skiprows.split(",")]
             if len(skiprows) == 1:
                 skiprows = range(skiprows[0])
-        skiprows = set(skiprows)
+        return set(skiprows)
+
+    @classmethod
+    def _apply_skipping(cls, lines, skiprows, skipfooter):
+        skiprows = cls._skiprows_set(skiprows)
 
         if skipfooter is None:
             skipfooter = 0
@@ -136,16 +144,22 @@ class CsvParser(PandasParser):
         if header_line is None:
             return lines, None
 
-        raw_header = lines[header_line]
+        header_names = CsvParser._parse_header(
+            lines[header_line], settings, comment_regex
+        )
+        lines = lines[header_line + 1 :]
+
+        return lines, header_names
+
+    @staticmethod
+    def _parse_header(raw_header: str, settings, comment_regex) -> list[str]:
         header_raw_clean = re.sub(comment_regex, "", raw_header).strip()
         delimiter = settings.get("delimiter", ",")
         header_names = pandafy_headerline(header_raw_clean, delimiter)
 
         settings["names"] = header_names
         settings["header"] = None
-        lines = lines[header_line + 1 :]
-
-        return lines, header_names
+        return header_names
 
     @staticmethod
     def _filter_comments(lines: list[str], comment_regex: str) -> list[str]:
@@ -155,24 +169,40 @@ class CsvParser(PandasParser):
         regex = rf"({comment_regex}).*"
         return [re.sub(regex, "", line.strip()) for line in lines]
 
-    def do_parse(
-        self, rawdata: str, project_name: str, thing_uuid: str
-    ) -> pd.DataFrame:
+    @staticmethod
+    def _cast_like(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
         """
-        Parse rawdata string to pandas.DataFrame
-        rawdata: the unparsed content
-        NOTE:
-            we need to preserve the original column numbering
+        Cast the columns of a chunk to the dtypes of the previous chunks
+        and widen `dtypes` in place, where the chunk disagrees. Integer
+        and float columns share a float dtype, any other mix is cast to
+        object, like `read_csv` infers it for mixed values in a column.
         """
-        if len(rawdata) == 0:
-            raise EmptyDataError("No data given")
+        casts = {}
+        for col, dtype in df.dtypes.items():
+            pinned = dtypes.setdefault(col, dtype)
+            if pinned == dtype:
+                continue
+            if all(
+                pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d)
+                for d in (pinned, dtype)
+            ):
+                pinned = np.result_type(pinned, dtype)
+            else:
+                pinned = np.dtype(object)
+            dtypes[col] = pinned
+            if pinned != dtype:
+                casts[col] = pinned
+        return df.astype(casts) if casts else df
 
+    def _pop_parse_options(self) -> tuple[dict[str, Any], dict[str, Any]]:
+        """
+        Split the parser settings into the keywords passed to
+        `pandas.read_csv` and the options we handle ourselves.
+        """
         settings = self._validate_settings(self.settings.copy())
         self.logger.info(settings)
 
         timestamp_columns = settings.pop("timestamp_columns")
-        ts_indices = [i["column"] for i in timestamp_columns]
-        header_line = settings.get("header", None)
 
         # handle deprecated settings keywords for skipping rows and footers
         skiprows = settings.pop("skiprows", None)
@@ -182,23 +212,31 @@ class CsvParser(PandasParser):
         footlines_to_exclude = settings.pop("footlines_to_exclude", None)
         skipfooter = skipfooter if skipfooter is not None else footlines_to_exclude or 0
 
-        custom_names = settings.pop("names", None)
-        duplicate = settings.pop("duplicate", False)
-        tz_info = settings.pop("timezone", None)
-
-        comment_regex = self._define_comment_regex(settings)
-
-        lines = rawdata.splitlines()
-        lines = self._apply_skipping(lines, skiprows, skipfooter)
-        lines, header_names = self._handle_header(
-            lines, settings, header_line, comment_regex
-        )
-        lines = self._filter_comments(lines, comment_regex)
-
-        rawdata = "\n".join(lines)
+        options = {
+            "timestamp_columns": timestamp_columns,
+            "ts_indices": [i["column"] for i in timestamp_columns],
+            "header_line": settings.get("header", None),
+            "skiprows": skiprows,
+            "skipfooter": skipfooter,
+            "custom_names": settings.pop("names", None),
+            "duplicate": settings.pop("duplicate", False),
+            "tz_info": settings.pop("timezone", None),
+            "comment_regex": self._define_comment_regex(settings),
+        }
+        return settings, options
 
+    def _read_lines(
+        self,
+        lines: list[str],
+        settings: dict[str, Any],
+        header_names: list[str] | None,
+        options: dict[str, Any],
+        project_name: str,
+        thing_uuid: str,
+    ) -> pd.DataFrame:
+        """Parse already skipped and comment filtered lines to a pandas.DataFrame"""
         try:
-            df = pd.read_csv(StringIO(rawdata), **settings)
+            df = pd.read_csv(StringIO("\n".join(lines)), **settings)
         except (pd.errors.EmptyDataError, IndexError):  # both indicate no data
             df = pd.DataFrame()
         except Exception as e:
@@ -207,8 +245,12 @@ class CsvParser(PandasParser):
         if df.empty:
             return pd.DataFrame(index=pd.DatetimeIndex([]))
 
-        if header_line is not None:
-            if duplicate:
+        ts_indices = options["ts_indices"]
+        custom_names = options["custom_names"]
+        tz_info = options["tz_info"]
+
+        if options["header_line"] is not None:
+            if options["duplicate"]:
                 df_default_names = df.copy()
                 df_default_names.columns = range(len(df.columns))
                 df.columns = header_names
@@ -245,7 +287,7 @@ class CsvParser(PandasParser):
                 df.columns = range(len(df.columns))
         df, timestamp_columns = self.normalize_unix_timestamps(
             df,
-            timestamp_columns,
+            options["timestamp_columns"],
             "csv",
         )
         df = self._set_index(df, timestamp_columns)
@@ -265,7 +307,35 @@ class CsvParser(PandasParser):
                 )
 
         # remove rows with broken dates
-        df = df.loc[df.index.notna()]
+        return df.loc[df.index.notna()]
+
+    def do_parse(
+        self, rawdata: str, project_name: str, thing_uuid: str
+    ) -> pd.DataFrame:
+        """
+        Parse rawdata string to pandas.DataFrame
+        rawdata: the unparsed content
+        NOTE:
+            we need to preserve the original column numbering
+        """
+        if len(rawdata) == 0:
+            raise EmptyDataError("No data given")
+
+        settings, options = self._pop_parse_options()
+        comment_regex = options["comment_regex"]
+
+        lines = rawdata.splitlines()
+        lines = self._apply_skipping(lines, options["skiprows"], options["skipfooter"])
+        lines, header_names = self._handle_header(
+            lines, settings, options["header_line"], comment_regex
+        )
+        lines = self._filter_comments(lines, comment_regex)
+
+        df = self._read_lines(
+            lines, settings, header_names, options, project_name, thing_uuid
+        )
+        if df.empty and len(df.columns) == 0:
+            return df
 
         if df.shape[0] == 0:
             warnings.warn(
@@ -279,6 +349,127 @@ class CsvParser(PandasParser):
         self._end_date = df.index.max()
         return df
 
+    def iter_parse(
+        self,
+        stream: Iterable[bytes],
+        project_name: str,
+        thing_uuid: str,
+        encoding: str = "utf-8",
+        chunksize: int = 100_000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Parse a stream of raw bytes to pandas.DataFrames of at most
+        `chunksize` lines each.
+
+        Skipping of rows and footer lines, header and comment handling
+        are applied incrementally, so only a single chunk (plus `skipfooter`
+        lines of lookahead) is held in memory at a time. `start_date` and
+        `end_date` cover all chunks seen so far.
+
+        The dtypes of the columns are inferred by `read_csv` for each chunk
+        and cast to those of the previous chunks (see `_cast_like`), so a
+        column of integers with missing values in a later chunk continues
+        as float and a column with text in a later chunk continues as
+        object. Unlike with `do_parse`, earlier chunks are not cast
+        retroactively, but as `to_observations` splits object columns into
+        numbers and strings value by value, numeric and text columns result
+        in the same observations.
+        """
+        settings, options = self._pop_parse_options()
+        comment_regex = options["comment_regex"]
+        comment_re = re.compile(rf"({comment_regex}).*") if comment_regex else None
+        skiprows = self._skiprows_set(options["skiprows"])
+        skipfooter = options["skipfooter"] or 0
+        header_line = options["header_line"]
+
+        header_names = None
+        lookahead = deque()
+        buffer = []
+        dtypes = {}
+        kept = 0
+        n_lines = n_rows = 0
+
+        def parse_buffer() -> pd.DataFrame:
+            df = self._read_lines(
+                buffer, settings, header_names, options, project_name, thing_uuid
+            )
+            buffer.clear()
+            if not df.empty:
+                df = self._cast_like(df, dtypes)
+                start, end = df.index.min(), df.index.max()
+                if self._start_date is None or start < self._start_date:
+                    self._start_date = start
+                if self._end_date is None or end > self._end_date:
+                    self._end_date = end
+            self.logger.debug(f"chunk.shape={df.shape}")
+            return df
+
+        self._start_date = self._end_date = None
+        for i, line in enumerate(iter_lines(stream, encoding)):
+            n_lines += 1
+            if i in skiprows:
+                continue
+            # delay every line by `skipfooter` lines, whatever is
+            # left in the lookahead at the end of the stream is the footer
+            lookahead.append(line)
+            if len(lookahead) <= skipfooter:
+                continue
+            line = lookahead.popleft()
+
+            if header_line is not None and header_names is None:
+                if kept < header_line:
+                    kept += 1
+                    continue
+                header_names = self._parse_header(line, settings, comment_regex)
+                continue
+
+            if comment_re is not None:
+                line = comment_re.sub("", line.strip())
+            buffer.append(line)
+
+            if len(buffer) >= chunksize:
+                df = parse_buffer()
+                n_rows += df.shape[0]
+                if not df.empty:
+                    yield df
+
+        if n_lines == 0:
+            raise EmptyDataError("No data given")
+        if header_line is not None and header_names is None:
+            raise ParsingError(f"header line {header_line} not found")
+
+        if buffer:
+            df = parse_buffer()
+            n_rows += df.shape[0]
+            if not df.empty:
+                yield df
+
+        if n_rows == 0:
+            warnings.warn(
+                "Parsing resulted in empty dataset.",
+                ParsingWarning,
+            )
+
+
+def iter_lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+    """
+    Incrementally decode chunks of bytes and yield single lines
+    without line terminators, like `str.splitlines` would do for
+    the decoded content as a whole.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + decoder.decode(chunk)).splitlines(keepends=True)
+        # the last line might be incomplete (or a '\r' of a '\r\n'
+        # pair), so we carry it over to the next chunk
+        rest = lines.pop() if lines else ""
+        for line in lines:
+            yield line.splitlines()[0]
+    rest += decoder.decode(b"", final=True)
+    # strip a trailing end-of-text character like ParserJobHandler.read_file
+    yield from rest.rstrip("\x03").splitlines()
+
 
 def filter_lines(rawdata: str, comment_regex: str) -> str:
     lines = []
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Decoder for the binary `.DBD` data files of the Soilcan lysimeter loggers.
+
+A file is a sequence of tagged blocks (4 byte tag, 4 byte big-endian size,
+content). Each `DTDT` block holds one table:
+
+- `HDR1`: job, schedule and serial number of the logger
+- `DHDR`: bytes per record, the indices of the oldest and newest record
+  in the ring buffer, and a map of the recorded channels
+- `DATA`: the ring buffer of fixed size records
+
+A record consists of 10 byte items, first the timestamp (microseconds
+since 1989-01-01) followed by one item per channel. A channel item holds
+a 2 byte type prefix, 4 bytes we don't need and the 4 byte value.
+
+The records are decoded with a structured numpy dtype straight from the
+raw bytes, `read_dbd_file` memory maps the file instead of reading it.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from timeio.errors import ParsingError
+
+EPOCH = np.datetime64("1989-01-01T00:00:00", "us")
+EMPTY = 0xFFFFFFFF
+
+TIMESTAMP_PREFIX = 0x0861
+# prefix of a channel in the channel map -> dtype of its values
+VALUE_TYPES = {
+    0x0810: ">f4",
+    0x0820: ">i4",
+}
+
+_BLOCK = struct.Struct(">4sI")
+_DHDR = struct.Struct(">IIII")
+_CHANNEL_SIZE = 0x50
+
+
+@dataclass
+class DbdChannel:
+    name: str
+    kind: str
+    units: str
+    fmt: str
+    prefix: int
+
+    @property
+    def decimals(self) -> int | None:
+        """Number of decimals of the `Fn` display format."""
+        if self.fmt.startswith("F") and self.fmt[1:].isdigit():
+            return int(self.fmt[1:])
+        return None
+
+    @property
+    def header(self) -> str:
+        return f"{self.name} ({self.units})"
+
+
+@dataclass
+class DbdTable:
+    schedule: str
+    channels: list[DbdChannel]
+    records: np.ndarray = field(repr=False)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        The records as a DataFrame with a (naive) DatetimeIndex and one
+        column per channel, values are rounded to their display format.
+        """
+        index = pd.DatetimeIndex(self.timestamps(), name=None)
+        columns = {}
+        for i, ch in enumerate(self.channels):
+            values = self.records[f"v{i}"]
+            if values.dtype.kind == "f":
+                values = values.astype(np.float64)
+                if ch.decimals is not None:
+                    values = values.round(ch.decimals)
+            else:
+                values = values.astype(np.int64)
+            columns[i] = values
+        return pd.DataFrame(columns, index=index)
+
+    def timestamps(self) -> np.ndarray:
+        # The logger reports timestamps with a resolution of 100µs
+        us = self.records["ts"].astype(np.int64)
+        us = (us + 50) // 100 * 100
+        return EPOCH + us.astype("timedelta64[us]")
+
+
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("latin-1")
+
+
+def _blocks(buf, start: int, end: int):
+    offset = start
+    while offset + _BLOCK.size <= end:
+        tag, size = _BLOCK.unpack_from(buf, offset)
+        content = offset + _BLOCK.size
+        if content + size > end:
+            raise ParsingError(f"DBD block {tag!r} exceeds the file")
+        yield tag, content, size
+        offset = content + size
+
+
+def _channels(buf, offset: int, count: int) -> list[DbdChannel]:
+    channels = []
+    for i in range(count):
+        entry = bytes(
+            buf[offset + i * _CHANNEL_SIZE : offset + (i + 1) * _CHANNEL_SIZE]
+        )
+        (prefix,) = struct.unpack_from(">H", entry, 0x42)
+        channels.append(
+            DbdChannel(
+                name=_cstr(entry[0x00:0x10]),
+                kind=_cstr(entry[0x10:0x20]),
+                units=_cstr(entry[0x20:0x31]),
+                fmt=_cstr(entry[0x31:0x42]),
+                prefix=prefix,
+            )
+        )
+    return channels
+
+
+def _record_dtype(channels: list[DbdChannel]) -> np.dtype:
+    fields = [("tp", ">u2"), ("ts", ">u8")]
+    for i, ch in enumerate(channels):
+        try:
+            value_type = VALUE_TYPES[ch.prefix]
+        except KeyError:
+            raise ParsingError(
+                f"DBD channel {ch.name!r} has an unknown type prefix {ch.prefix:#06x}"
+            ) from None
+        fields += [(f"p{i}", ">u2"), (f"x{i}", ">u4"), (f"v{i}", value_type)]
+    return np.dtype(fields)
+
+
+def _table(buf, start: int, end: int) -> DbdTable:
+    schedule = ""
+    header = channels = data = None
+    for tag, content, size in _blocks(buf, start, end):
+        if tag == b"HDR1":
+            schedule = _cstr(bytes(buf[content + 0x2C : content + 0x3C]))
+        elif tag == b"DHDR":
+            header = _DHDR.unpack_from(buf, content)
+            channels = _channels(buf, content + _DHDR.size, header[3])
+        elif tag == b"DATA":
+            data = (content, size)
+    if header is None or data is None:
+        raise ParsingError("DBD table without data header or data")
+
+    record_size, oldest, newest, _ = header
+    dtype = _record_dtype(channels)
+    if dtype.itemsize != record_size:
+        raise ParsingError(
+            f"DBD record size {record_size} does not match "
+            f"{len(channels)} channels ({dtype.itemsize})"
+        )
+    slots = np.frombuffer(buf, dtype, count=data[1] // record_size, offset=data[0])
+    if oldest == EMPTY or newest == EMPTY:
+        records = slots[:0]
+    elif oldest <= newest:
+        records = slots[oldest : newest + 1]
+    else:
+        # the ring buffer wrapped around
+        records = np.concatenate([slots[oldest:], slots[: newest + 1]])
+
+    if records.size:
+        expected = np.array([ch.prefix | 1 for ch in channels])
+        prefixes = np.column_stack([records[f"p{i}"] for i in range(len(channels))])
+        if (records["tp"] != TIMESTAMP_PREFIX).any() or (prefixes != expected).any():
+            raise ParsingError("DBD records with unexpected item prefixes")
+    return DbdTable(schedule=schedule, channels=channels, records=records)
+
+
+def read_dbd(buf: bytes | memoryview | mmap.mmap) -> list[DbdTable]:
+    """Decode all tables of a DBD file, without copying the record data."""
+    tables = []
+    for tag, content, size in _blocks(buf, 0, len(buf)):
+        if tag == b"DTDT":
+            tables.append(_table(buf, content, content + size))
+        elif tag == b"EOF!":
+            break
+    if not tables:
+        raise ParsingError("No tables found in DBD file")
+    return tables
+
+
+def read_dbd_file(path: str | Path) -> list[DbdTable]:
+    """Decode a DBD file from disk, the file is memory mapped."""
+    with open(path, "rb") as fh:
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_dbd(buf)
@@ -13,7 +13,7 @@ from timeio.parser.pandas_parser import PandasParser
 from timeio.errors import ParsingError, ParsingWarning
 from timeio.journaling import Journal
 
-journal = Journal("JsonParser", errors="warn")
+journal = Journal("JsonParser", errors="warn", background=True)
 
 DEFAULT_SETTINGS = {
     "timestamp_keys": [{"key": "Datetime", "format": "%Y-%m-%dT%H:%M:%S"}],
@@ -15,7 +15,7 @@ from datetime import datetime
 import pandas as pd
 
 from timeio.parser.abc_parser import AbcParser
-from timeio.parser.typehints import ObservationPayloadT
+from timeio.observations import ObservationBatch
 from timeio.common import ObservationResultType
 from timeio.errors import ParsingError
 
@@ -72,24 +72,24 @@ class PandasParser(AbcParser):
 
     def to_observations(
         self, data: pd.DataFrame, origin: str, parser_uuid: str | None = None
-    ) -> list[ObservationPayloadT]:
-        observations = []
+    ) -> ObservationBatch:
+        batch = ObservationBatch(data.index)
+        parsed_at = datetime.now().isoformat()
 
-        data = data.copy()
-
-        data.index.name = "result_time"
-        data.index = data.index.map(lambda ts: ts.isoformat())
-
-        to_process = [val for _, val in data.items()]
+        # we address rows by position, so all columns can share the index of `batch`
+        positions = pd.RangeIndex(len(data))
+        to_process = [
+            (str(col), pd.Series(val.array, index=positions))
+            for col, val in data.items()
+        ]
 
         while to_process:
-            chunk = to_process.pop()
-            col = str(chunk.name)
+            col, chunk = to_process.pop()
             if pd.api.types.is_numeric_dtype(chunk):
-                chunk.name = "result_number"
+                result_field = "result_number"
                 result_type = ObservationResultType.Number
             elif pd.api.types.is_bool_dtype(chunk):
-                chunk.name = "result_bool"
+                result_field = "result_bool"
                 result_type = ObservationResultType.Bool
             elif pd.api.types.is_object_dtype(chunk):
                 # we need to handle object columns with special care
@@ -98,7 +98,7 @@ class PandasParser(AbcParser):
                 numeric_chunk = cast(pd.Series, pd.to_numeric(chunk, errors="coerce"))
                 if numeric_chunk.isna().all():
                     # no numerical values found, we have a string only column
-                    chunk.name = "result_string"
+                    result_field = "result_string"
                     result_type = ObservationResultType.String
                 else:
                     # numerical values found -> the column consists of mixed data types, currently
@@ -107,7 +107,7 @@ class PandasParser(AbcParser):
                     str_chunk = cast(
                         pd.Series, chunk.loc[numeric_chunk.isna()].str.strip()
                     )
-                    to_process.extend((numeric_chunk, str_chunk))
+                    to_process.extend(((col, numeric_chunk), (col, str_chunk)))
                     continue
             else:
                 raise ParsingError(
@@ -117,18 +117,19 @@ class PandasParser(AbcParser):
 
             # we don't want to write NaN
             chunk = chunk.dropna()
-            # add metadata
-            chunk = chunk.reset_index()
-            chunk["result_type"] = result_type
-            chunk["datastream_pos"] = str(col)
-            chunk["parameters"] = json.dumps(
-                {
-                    "origin": origin,
-                    "column_header": col,
-                    "parsed_at": datetime.now().isoformat(),
-                    "parser_id": parser_uuid,
-                }
+            batch.append(
+                datastream_pos=col,
+                result_type=result_type,
+                result_field=result_field,
+                rows=chunk.index.to_numpy(),
+                values=chunk.to_numpy(),
+                parameters=json.dumps(
+                    {
+                        "origin": origin,
+                        "column_header": col,
+                        "parsed_at": parsed_at,
+                        "parser_id": parser_uuid,
+                    }
+                ),
             )
-
-            observations.extend(chunk.to_dict(orient="records"))
-        return observations
+        return batch
@@ -1,15 +1,19 @@
+import csv
+import io
 import re
 import subprocess
 import tempfile
+import warnings
 
 from pathlib import Path
 from typing import Any, TypedDict, Literal
 
 import pandas as pd
 
-from timeio.errors import ParsingError
+from timeio.errors import ParsingError, ParsingWarning
+from timeio.parser.dbd import read_dbd
 from timeio.parser.pandas_parser import PandasParser
-from timeio.parser.csv_parser import CsvParser
+from timeio.parser.csv_parser import CsvParser, pandafy_headerline
 
 EXE = Path(__file__).parent / "bin" / "dump_dbd"
 
@@ -39,6 +43,7 @@ class SoilcanParser(PandasParser):
 
         self.table_no = TABLE_MAP[settings.pop("type")]
         include_header = settings.pop("header")
+        self.include_header = include_header
 
         csv_settings = (
             DEFAULT_SETTINGS
@@ -74,20 +79,59 @@ class SoilcanParser(PandasParser):
 
         return result.stdout
 
-    def do_parse(
-        self, rawdata: Any, project_name: str, thing_uuid: str
-    ) -> pd.DataFrame:
+    def _decode_data(self, rawdata: bytes) -> pd.DataFrame:
+        """
+        Decode the table directly from the binary data, the result equals
+        parsing the output of `dump_dbd` with the csv parser.
+        """
+        table = read_dbd(rawdata)[self.table_no]
+        df = table.to_frame()
+        df.index = df.index.astype("datetime64[ns]")
+        if self.include_header:
+            line = io.StringIO()
+            csv.writer(line, quoting=csv.QUOTE_ALL).writerow(
+                ["Timestamp"] + [ch.header for ch in table.channels]
+            )
+            names = pandafy_headerline(line.getvalue().strip(), ",")
+        else:
+            names = list(range(len(df.columns) + 1))
+        # the first column is the timestamp, like in the dumped data
+        df.index.name = names[0]
+        df.columns = names[1:]
+        if (tz_info := self.settings.get("timezone")) is not None:
+            df.index = df.index.tz_localize(tz_info)
+        return df
 
+    def _parse_dumped_data(
+        self, rawdata: bytes, project_name: str, thing_uuid: str
+    ) -> pd.DataFrame:
         dumped_data = self._dump_data(rawdata)
         blocks = [
             b for b in re.split(r"(?m)(?=^[^\d])", dumped_data.strip()) if b.strip()
         ]
 
         parser = CsvParser(self.settings)
-        df = parser.do_parse(
+        return parser.do_parse(
             blocks[self.table_no], project_name=project_name, thing_uuid=thing_uuid
         )
-        self._start_date = parser._start_date
-        self._end_date = parser._end_date
 
+    def do_parse(
+        self, rawdata: Any, project_name: str, thing_uuid: str
+    ) -> pd.DataFrame:
+        try:
+            df = self._decode_data(rawdata)
+        except (ParsingError, IndexError, ValueError) as e:
+            # unknown variants of the format are left to `dump_dbd`
+            warnings.warn(
+                f"Native DBD decoding failed ({e}), falling back to dump_dbd",
+                ParsingWarning,
+            )
+            df = self._parse_dumped_data(rawdata, project_name, thing_uuid)
+        else:
+            if df.empty:
+                warnings.warn("Parsing resulted in empty dataset.", ParsingWarning)
+
+        if not df.empty:
+            self._start_date = df.index.min()
+            self._end_date = df.index.max()
         return df
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Monthly range partitioning of the observation table of a thing schema.
+
+The layout is optional, `convert_observation` turns the plain observation
+table of a schema into a table partitioned by `result_time`, existing
+data is kept in a single legacy partition. `create_partitions` creates
+the partitions of the upcoming months and moves rows, which ended up in
+the default partition, into partitions of their own.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from datetime import datetime, timezone
+
+import pandas as pd
+from psycopg import Connection, Cursor, sql
+
+logger = logging.getLogger("partitioning")
+
+LEGACY = "observation_legacy"
+DEFAULT = "observation_default"
+
+_BOUNDS = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)")
+
+
+def _month_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(ts: datetime) -> datetime:
+    if ts.month == 12:
+        return ts.replace(year=ts.year + 1, month=1)
+    return ts.replace(month=ts.month + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"observation_p{month:%Y_%m}"
+
+
+def _legacy_name(name: str) -> str:
+    # postgres truncates identifiers to 63 bytes
+    return f"{name[:55]}_legacy"
+
+
+def is_partitioned(conn: Connection | Cursor, schema: str) -> bool:
+    row = conn.execute(
+        "SELECT c.relkind FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relname = 'observation'",
+        [schema],
+    ).fetchone()
+    return row is not None and row[0] == "p"
+
+
+def partitions(
+    conn: Connection | Cursor, schema: str
+) -> dict[str, tuple[datetime | None, datetime | None] | None]:
+    """
+    Map the partitions of the observation table to their bounds.
+
+    Open bounds (MINVALUE/MAXVALUE) are None, the bounds of the default
+    partition are None.
+    """
+    rows = conn.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "JOIN pg_namespace n ON n.oid = p.relnamespace "
+        "WHERE n.nspname = %s AND p.relname = 'observation'",
+        [schema],
+    ).fetchall()
+
+    def parse(bound: str) -> datetime | None:
+        if bound in ("MINVALUE", "MAXVALUE"):
+            return None
+        return pd.Timestamp(bound.strip("'")).to_pydatetime()
+
+    result = {}
+    for name, expr in rows:
+        m = _BOUNDS.match(expr)
+        result[name] = (parse(m[1]), parse(m[2])) if m else None
+    return result
+
+
+def create_partitions(
+    conn: Connection, schema: str, months_ahead: int = 3
+) -> list[str]:
+    """
+    Create the partitions from the current month up to `months_ahead`
+    months in the future and the partitions of all months with rows in
+    the default partition. Returns the names of the created partitions.
+
+    Each partition is created in its own short transaction, rows of its
+    month are moved from the default partition into it.
+    """
+    s = sql.Identifier(schema)
+    existing = partitions(conn, schema)
+    taken = [b for b in existing.values() if b is not None]
+    # the partitions belong to the owner of the table, not to us
+    owner = conn.execute(
+        "SELECT pg_get_userbyid(c.relowner) FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relname = 'observation'",
+        [schema],
+    ).fetchone()[0]
+
+    months = set()
+    month = _month_start(datetime.now(timezone.utc))
+    for _ in range(months_ahead + 1):
+        months.add(month)
+        month = _next_month(month)
+    if DEFAULT in existing:
+        for (ts,) in conn.execute(
+            sql.SQL(
+                "SELECT DISTINCT date_trunc('month', result_time, 'UTC') "
+                "FROM {schema}.{default}"
+            ).format(schema=s, default=sql.Identifier(DEFAULT))
+        ):
+            months.add(_month_start(ts))
+
+    def overlaps(start: datetime, end: datetime) -> bool:
+        return any(
+            (lo is None or lo < end) and (hi is None or start < hi) for lo, hi in taken
+        )
+
+    created = []
+    for start in sorted(months):
+        end = _next_month(start)
+        if overlaps(start, end):
+            continue
+        name = sql.Identifier(partition_name(start))
+        fmt = dict(
+            schema=s,
+            name=name,
+            default=sql.Identifier(DEFAULT),
+            start=sql.Literal(start),
+            end=sql.Literal(end),
+            owner=sql.Identifier(owner),
+        )
+        with conn.transaction():
+            conn.execute(
+                sql.SQL(
+                    "CREATE TABLE {schema}.{name} "
+                    "(LIKE {schema}.observation INCLUDING DEFAULTS)"
+                ).format(**fmt)
+            )
+            conn.execute(
+                sql.SQL("ALTER TABLE {schema}.{name} OWNER TO {owner}").format(**fmt)
+            )
+            if DEFAULT in existing:
+                # attaching fails, as long as the default partition
+                # holds rows of the new partition
+                conn.execute(
+                    sql.SQL(
+                        "WITH moved AS ("
+                        "DELETE FROM {schema}.{default} "
+                        "WHERE result_time >= {start} AND result_time < {end} "
+                        "RETURNING *) "
+                        "INSERT INTO {schema}.{name} SELECT * FROM moved"
+                    ).format(**fmt)
+                )
+            conn.execute(
+                sql.SQL(
+                    "ALTER TABLE {schema}.observation ATTACH PARTITION "
+                    "{schema}.{name} FOR VALUES FROM ({start}) TO ({end})"
+                ).format(**fmt)
+            )
+        taken.append((start, end))
+        created.append(partition_name(start))
+        logger.info(f"created partition {schema}.{partition_name(start)}")
+    return created
+
+
+def convert_observation(conn: Connection, schema: str, months_ahead: int = 3) -> bool:
+    """
+    Convert the observation table of `schema` into a partitioned table.
+
+    Existing rows are not copied, the old table becomes the partition of
+    everything before the first monthly partition, an empty old table is
+    dropped. Indices, constraints, triggers, grants and the views on top
+    of the table are moved over to the partitioned table.
+
+    Needs an autocommit connection. The expensive steps (building an
+    index on `id` and validating the range of the old table) run without
+    blocking writes, only the final switch locks the table, for a short
+    time. Inserts of observations after the start of the next month
+    fail between both steps. Returns False if the table already was
+    partitioned.
+    """
+    if is_partitioned(conn, schema):
+        logger.info(f"{schema}.observation is partitioned already")
+        return False
+
+    s = sql.Identifier(schema)
+    # the partitioned table cannot have a primary key on `id` alone,
+    # a plain index is build upfront to be attached later
+    conn.execute(
+        sql.SQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS observation_id_idx "
+            "ON {schema}.observation (id)"
+        ).format(schema=s)
+    )
+    (latest,) = conn.execute(
+        sql.SQL("SELECT max(result_time) FROM {schema}.observation").format(schema=s)
+    ).fetchone()
+    now = datetime.now(timezone.utc)
+    cutoff = _next_month(_month_start(max(latest or now, now)))
+    # a valid check constraint spares the scan of the table on attaching
+    conn.execute(
+        sql.SQL(
+            "ALTER TABLE {schema}.observation "
+            "DROP CONSTRAINT IF EXISTS observation_legacy_bound, "
+            "ADD CONSTRAINT observation_legacy_bound "
+            "CHECK (result_time < {cutoff}) NOT VALID"
+        ).format(schema=s, cutoff=sql.Literal(cutoff))
+    )
+    conn.execute(
+        sql.SQL(
+            "ALTER TABLE {schema}.observation "
+            "VALIDATE CONSTRAINT observation_legacy_bound"
+        ).format(schema=s)
+    )
+
+    with conn.transaction():
+        _switch(conn, schema, cutoff)
+    create_partitions(conn, schema, months_ahead)
+    return True
+
+
+def _switch(conn: Connection, schema: str, cutoff: datetime) -> None:
+    s = sql.Identifier(schema)
+    conn.execute(sql.SQL("SET LOCAL search_path TO {schema}, public").format(schema=s))
+    conn.execute("LOCK TABLE observation IN ACCESS EXCLUSIVE MODE")
+
+    # Collect everything, which is bound to the old table. The definitions
+    # refer to the table by name, so replaying them after the rename
+    # binds them to the new table.
+    oid = "'observation'::regclass"
+    owner, sequence, empty = conn.execute(
+        "SELECT pg_get_userbyid(c.relowner), "
+        "pg_get_serial_sequence('observation', 'id'), "
+        "NOT EXISTS (SELECT 1 FROM observation) "
+        f"FROM pg_class c WHERE c.oid = {oid}"
+    ).fetchone()
+    constraints = conn.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        f"WHERE conrelid = {oid} AND contype IN ('u', 'f')"
+    ).fetchall()
+    indexes = conn.execute(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        f"WHERE i.indrelid = {oid} "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)"
+    ).fetchall()
+    triggers = conn.execute(
+        "SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger "
+        f"WHERE tgrelid = {oid} AND NOT tgisinternal"
+    ).fetchall()
+    grants = conn.execute(
+        "SELECT grantee, privilege_type FROM information_schema.role_table_grants "
+        "WHERE table_schema = %s AND table_name = 'observation'",
+        [schema],
+    ).fetchall()
+    views = conn.execute(
+        "SELECT DISTINCT n.nspname, v.relname, v.relkind, pg_get_viewdef(v.oid) "
+        "FROM pg_depend d "
+        "JOIN pg_rewrite r ON r.oid = d.objid "
+        "JOIN pg_class v ON v.oid = r.ev_class "
+        "JOIN pg_namespace n ON n.oid = v.relnamespace "
+        f"WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = {oid} "
+        f"AND v.oid <> {oid}"
+    ).fetchall()
+
+    legacy = sql.Identifier(LEGACY)
+    conn.execute(
+        sql.SQL("ALTER TABLE observation RENAME TO {legacy}").format(legacy=legacy)
+    )
+    for name, kind, _ in constraints:
+        if kind == "u":
+            # the name of the constraint is the name of its index
+            conn.execute(
+                sql.SQL("ALTER TABLE {legacy} RENAME CONSTRAINT {old} TO {new}").format(
+                    legacy=legacy,
+                    old=sql.Identifier(name),
+                    new=sql.Identifier(_legacy_name(name)),
+                )
+            )
+    for name, _ in indexes:
+        conn.execute(
+            sql.SQL("ALTER INDEX {old} RENAME TO {new}").format(
+                old=sql.Identifier(name), new=sql.Identifier(_legacy_name(name))
+            )
+        )
+    for name, _ in triggers:
+        conn.execute(
+            sql.SQL("DROP TRIGGER {name} ON {legacy}").format(
+                name=sql.Identifier(name), legacy=legacy
+            )
+        )
+
+    conn.execute(
+        sql.SQL(
+            "CREATE TABLE observation "
+            "(LIKE {legacy} INCLUDING DEFAULTS INCLUDING COMMENTS) "
+            "PARTITION BY RANGE (result_time)"
+        ).format(legacy=legacy)
+    )
+    conn.execute(
+        sql.SQL("ALTER TABLE observation OWNER TO {owner}").format(
+            owner=sql.Identifier(owner)
+        )
+    )
+    if sequence is not None:
+        conn.execute(
+            sql.SQL("ALTER SEQUENCE {seq} OWNED BY observation.id").format(
+                seq=sql.SQL(sequence)
+            )
+        )
+    for name, _, definition in constraints:
+        conn.execute(
+            sql.SQL(
+                "ALTER TABLE observation ADD CONSTRAINT {name} {definition}"
+            ).format(name=sql.Identifier(name), definition=sql.SQL(definition))
+        )
+    for _, definition in [*indexes, *triggers]:
+        conn.execute(sql.SQL(definition))
+    for grantee, privilege in grants:
+        conn.execute(
+            sql.SQL("GRANT {privilege} ON observation TO {grantee}").format(
+                privilege=sql.SQL(privilege),
+                grantee=(
+                    sql.SQL("PUBLIC")
+                    if grantee == "PUBLIC"
+                    else sql.Identifier(grantee)
+                ),
+            )
+        )
+    for nsp, name, kind, definition in views:
+        if kind != "v":
+            logger.warning(
+                f"materialized view {nsp}.{name} still reads {schema}.{LEGACY}, "
+                f"it has to be recreated"
+            )
+            continue
+        conn.execute(
+            sql.SQL("CREATE OR REPLACE VIEW {view} AS {definition}").format(
+                view=sql.Identifier(nsp, name), definition=sql.SQL(definition)
+            )
+        )
+
+    if empty:
+        conn.execute(sql.SQL("DROP TABLE {legacy}").format(legacy=legacy))
+    else:
+        conn.execute(
+            sql.SQL(
+                "ALTER TABLE observation ATTACH PARTITION {legacy} "
+                "FOR VALUES FROM (MINVALUE) TO ({cutoff})"
+            ).format(legacy=legacy, cutoff=sql.Literal(cutoff))
+        )
+    conn.execute(
+        sql.SQL("CREATE TABLE {default} PARTITION OF observation DEFAULT").format(
+            default=sql.Identifier(DEFAULT)
+        )
+    )
+    conn.execute(
+        sql.SQL("ALTER TABLE {default} OWNER TO {owner}").format(
+            default=sql.Identifier(DEFAULT), owner=sql.Identifier(owner)
+        )
+    )
+    logger.info(f"converted {schema}.observation to a partitioned table")
@@ -3,18 +3,23 @@
 
 from __future__ import annotations
 
+import io
 import logging
 import typing
 import json
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
+from psycopg import Connection, sql
+from psycopg_pool import ConnectionPool
 
 from timeio.common import ObservationResultType, get_result_field_name
 from timeio.databases import DBapi
+from timeio.feta import _borrow
 
 if typing.TYPE_CHECKING:
-    from timeio.qc.saqc import SaQCWrapper
+    from timeio.qc.saqc import SaQCResult, SaQCWrapper
     from timeio.qc.qcfunction import QcFunctionStream
 
     StreamsT = dict[QcFunctionStream, pd.DataFrame]
@@ -44,7 +49,16 @@ def get_result_type(data: pd.Series):
         raise ValueError(f"Data of type {data.dtype} is not supported.")
 
 
-def write_qc_data(dbapi: DBapi, qc: SaQCWrapper):
+def write_qc_data(
+    dbapi: DBapi, qc: SaQCWrapper | SaQCResult, label_batch_size: int = 10_000
+):
+    """
+    Write the results of a QC run back.
+
+    Data is only uploaded for new and modified streams. Of the other streams
+    only the quality labels which differ from the labels read before the
+    run are uploaded, in chunks of at most `label_batch_size` labels.
+    """
 
     def prepare_dataframes(streams: StreamsT) -> StreamsT:
         out = {}
@@ -53,7 +67,7 @@ def write_qc_data(dbapi: DBapi, qc: SaQCWrapper):
                 continue
 
             # trim context window away
-            df = df.loc[df.index[0] + stream.context_window :]
+            df = df.loc[df.index[0] + stream.context_window :].copy()
 
             df["result_time"] = df.index.strftime("%Y-%m-%dT%H:%M:%S")
             df["result_type"] = rt = get_result_type(df["data"])
@@ -64,7 +78,6 @@ def write_qc_data(dbapi: DBapi, qc: SaQCWrapper):
                 "data": get_result_field_name(rt, errors="raise"),
             }
             df = df.rename(columns=columns_map)
-            df["result_quality"] = df["result_quality"].map(json.dumps)
 
             out[stream] = df
         return out
@@ -112,31 +125,55 @@ def write_qc_data(dbapi: DBapi, qc: SaQCWrapper):
             observations = df.drop(columns="result_quality").to_dict(orient="records")
             dbapi.upsert_observations(thing_uuid=thing_uuid, observations=observations)
 
+    def changed_labels(streams: StreamsT) -> StreamsT:
+        """
+        reduce the streams to the rows with a quality label that differs
+        from the label the stream was read with
+        """
+        out = {}
+        for stream, df in streams.items():
+            old = qc._input_data.get(stream, {}).get("quality")
+            if old is not None:
+                old = old[~old.index.duplicated(keep="last")].reindex(df.index)
+                changed = [
+                    new != prev
+                    for new, prev in zip(df["result_quality"].array, old.array)
+                ]
+                df = df[np.array(changed, dtype=bool)]
+            if not df.empty:
+                out[stream] = df
+        return out
+
     def upload_quality(streams: dict[str, pd.DataFrame]):
         for thing_uuid, df in streams.items():
             labels = df[["result_time", "result_quality", "datastream_id"]]
-            # labels["result_quality"] = labels["result_quality"]
-            dbapi.upsert_qc_labels(
-                thing_uuid=thing_uuid, qc_labels=labels.to_dict(orient="records")
-            )
+            for start in range(0, len(labels), label_batch_size):
+                chunk = labels.iloc[start : start + label_batch_size].copy()
+                chunk["result_quality"] = chunk["result_quality"].map(json.dumps)
+                dbapi.upsert_qc_labels(
+                    thing_uuid=thing_uuid, qc_labels=chunk.to_dict(orient="records")
+                )
 
     def prepare_upload(streams: StreamsT) -> dict[str, pd.DataFrame]:
         tmp = defaultdict(list)
         for stream, df in streams.items():
-            df["datastream_id"] = stream.db_stream_id
-            tmp[stream.thing_uuid].append(df)
+            # the frames are shared between the data and the label upload
+            # and might be slices of the changed labels
+            tmp[stream.thing_uuid].append(df.assign(datastream_id=stream.db_stream_id))
         return {uuid: pd.concat(dfs) for uuid, dfs in tmp.items()}
 
     streams = prepare_dataframes(qc.data)
     new_streams = setup_new_streams(streams)
     modified_streams = clear_modified_streams(streams)
+    rewritten = new_streams + modified_streams
 
-    upload_data(
+    upload_data(prepare_upload({s: df for s, df in streams.items() if s in rewritten}))
+    upload_quality(
         prepare_upload(
-            {s: df for s, df in streams.items() if s in new_streams + modified_streams}
+            {s: df for s, df in streams.items() if s in rewritten}
+            | changed_labels({s: df for s, df in streams.items() if s not in rewritten})
         )
     )
-    upload_quality(prepare_upload(streams))
 
 
 def read_stream_data(
@@ -144,7 +181,17 @@ def read_stream_data(
     streams: list[QcFunctionStream],
     start_date: pd.Timestamp = pd.Timestamp("1717-01-01", tz="UTC"),
     end_date: pd.Timestamp = pd.Timestamp("2222-12-11", tz="UTC"),
+    conn: Connection | ConnectionPool | None = None,
 ) -> dict[QcFunctionStream, pd.DataFrame]:
+    """
+    Read the numerical observations of `streams` within the given period,
+    each extended by the stream's context window.
+
+    If a database connection (or pool) is given, the observations are read
+    directly from the observation tables of the project schemas, in bulk and
+    restricted to the required columns. Otherwise, every stream is requested
+    separately from the DB API.
+    """
 
     # NOTE:
     # `start_date` and `end_date` are delivered by the parser via the
@@ -162,29 +209,103 @@ def read_stream_data(
     if end_date.tz is None:
         end_date = pd.Timestamp(end_date).tz_localize("Europe/Berlin")
 
-    out = {}
+    ranges = {}
     for stream in streams:
         if stream.db_stream_id:
             start = max(filter(None, [start_date, stream.start_date]))
             end = min(filter(None, [end_date, stream.end_date]))
-            data = db_api.get_datastream_observations(
-                stream.thing_uuid,
-                stream.position,
-                start_date=start - stream.context_window,
-                end_date=end,
-            )
+            ranges[stream] = (start - stream.context_window, end)
 
-            df = pd.DataFrame(data["observations"])
-            if not df.empty:
-                df = df[df.result_type == 0]
-                data = pd.DataFrame(
-                    data={
-                        "data": df.result_number.to_numpy(),
-                        "quality": df.result_quality.to_numpy().astype(object),
-                    },
-                    index=pd.to_datetime(df["result_time"], utc=True),
-                ).sort_index()
-            else:
-                data = pd.DataFrame(columns=["data", "quality"])
-            out[stream] = data
+    if conn is not None:
+        return _copy_stream_data(conn, ranges)
+
+    out = {}
+    for stream, (start, end) in ranges.items():
+        data = db_api.get_datastream_observations(
+            stream.thing_uuid,
+            stream.position,
+            start_date=start,
+            end_date=end,
+        )
+
+        df = pd.DataFrame(data["observations"])
+        if not df.empty:
+            df = df[df.result_type == 0]
+            data = pd.DataFrame(
+                data={
+                    "data": df.result_number.to_numpy(),
+                    "quality": df.result_quality.to_numpy().astype(object),
+                },
+                index=pd.to_datetime(df["result_time"], utc=True),
+            ).sort_index()
+        else:
+            data = pd.DataFrame(columns=["data", "quality"])
+        out[stream] = data
+    return out
+
+
+def _copy_stream_data(
+    conn: Connection | ConnectionPool,
+    ranges: dict[QcFunctionStream, tuple[pd.Timestamp, pd.Timestamp]],
+) -> dict[QcFunctionStream, pd.DataFrame]:
+    """
+    Read the numerical observations of all `ranges` with one COPY per schema.
+
+    The selection (datastream, time range, result type) and the projection
+    are done by the database, the result is parsed by the C engine of
+    `pandas.read_csv` and split into one frame per stream along the
+    (stream, result_time) ordering of the query.
+    """
+    by_schema = defaultdict(list)
+    for stream in ranges:
+        by_schema[stream.db_schema].append(stream)
+
+    out = {}
+    for schema, streams in by_schema.items():
+        query = sql.SQL(
+            "COPY ("
+            "SELECT r.n, (extract(epoch FROM o.result_time) * 1000000)::bigint,"
+            " o.result_number, o.result_quality"
+            " FROM unnest({ids}::bigint[], {starts}::timestamptz[],"
+            " {ends}::timestamptz[]) WITH ORDINALITY AS r(id, s, e, n)"
+            " JOIN {schema}.observation o ON o.datastream_id = r.id"
+            " AND o.result_time BETWEEN r.s AND r.e"
+            " WHERE o.result_type = 0"
+            " ORDER BY r.n, o.result_time"
+            ") TO STDOUT WITH (FORMAT csv)"
+        ).format(
+            schema=sql.Identifier(schema),
+            ids=sql.Literal([s.db_stream_id for s in streams]),
+            starts=sql.Literal([ranges[s][0].to_pydatetime() for s in streams]),
+            ends=sql.Literal([ranges[s][1].to_pydatetime() for s in streams]),
+        )
+        buffer = io.BytesIO()
+        with _borrow(conn) as c, c.cursor() as cur:
+            with cur.copy(query) as copy:
+                for chunk in copy:
+                    buffer.write(chunk)
+        buffer.seek(0)
+
+        df = pd.read_csv(
+            buffer,
+            header=None,
+            names=["n", "time", "data", "quality"],
+            dtype={"n": "int64", "time": "int64", "data": "float64", "quality": object},
+        )
+        index = pd.to_datetime(df["time"].to_numpy(), unit="us", utc=True)
+        raw = df["quality"].to_numpy()
+        quality = np.full(len(raw), None, dtype=object)
+        for i in np.flatnonzero(pd.notna(raw)):
+            quality[i] = json.loads(raw[i])
+
+        # query positions are 1-based
+        bounds = np.searchsorted(df["n"].to_numpy(), np.arange(1, len(streams) + 2))
+        for stream, lo, hi in zip(streams, bounds[:-1], bounds[1:]):
+            if lo == hi:
+                out[stream] = pd.DataFrame(columns=["data", "quality"])
+                continue
+            out[stream] = pd.DataFrame(
+                data={"data": df["data"].to_numpy()[lo:hi], "quality": quality[lo:hi]},
+                index=index[lo:hi],
+            )
     return out
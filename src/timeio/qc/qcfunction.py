@@ -181,3 +181,35 @@ def filter_qc_functions(funcs: list[QcFunction], sta_thing_id: int) -> list[QcFu
     thing_funcs = filter_thing_functions(funcs, sta_thing_id)
     funcs_to_process = filter_functions_to_execute(funcs, thing_funcs)
     return funcs_to_process
+
+
+def split_independent_functions(funcs: list[QcFunction]) -> list[list[QcFunction]]:
+    """
+    Split the functions into chains, which share no stream with each other.
+
+    Two functions belong to the same chain, if they are (transitively)
+    connected by any of their fields or targets. Within a chain the
+    definition order is kept, so cyclic dependencies are still resolved
+    as in `filter_functions_to_execute`. The chains are ordered by their
+    first function.
+    """
+    parents = {}
+
+    def find(alias: str) -> str:
+        parents.setdefault(alias, alias)
+        while parents[alias] != alias:
+            parents[alias] = parents[parents[alias]]
+            alias = parents[alias]
+        return alias
+
+    for func in funcs:
+        aliases = [s.alias for s in func.fields + func.targets]
+        for alias in aliases[1:]:
+            parents[find(alias)] = find(aliases[0])
+
+    chains = {}
+    for func in funcs:
+        streams = func.fields + func.targets
+        key = find(streams[0].alias) if streams else id(func)
+        chains.setdefault(key, []).append(func)
+    return list(chains.values())
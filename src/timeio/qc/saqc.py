@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+from __future__ import annotations
 
 import warnings
 
@@ -25,7 +26,7 @@ PROCESSING_FUNCTIONS = {"processGeneric", "rolling"}
 class STAMPLATEScheme(saqc.FloatScheme):
 
     @staticmethod
-    def toSTAannotations(row: pd.Series) -> dict[str, str | dict[str, str]]:
+    def toSTAannotations(row: pd.Series | dict) -> dict[str, str | dict[str, str]]:
         """Create a dict that can be translated to a structured json according to
         the STAMPLATE specs."""
         return {
@@ -50,23 +51,53 @@ class STAMPLATEScheme(saqc.FloatScheme):
         df.columns = df.columns.str.removeprefix("properties.")
         return df[QUALITY_COLUMNS]
 
+    @staticmethod
+    def _annotationKeys(s: pd.Series) -> tuple[np.ndarray, list[tuple]]:
+        """Factorize a pandas.Series of STA quality labels by their
+        (annotation, measure, userLabel) triple.
+
+        Returns the integer code of every row, where -1 marks rows without
+        a (complete) label, and the unique triples."""
+
+        def key(label) -> tuple | None:
+            if not isinstance(label, dict):
+                return None
+            try:
+                props = label["properties"]
+                k = (label["annotation"], props["measure"], props["userLabel"])
+            except (TypeError, KeyError):
+                return None
+            # incomplete labels are skipped, like by a pandas groupby
+            return None if any(v is None or v != v for v in k) else k
+
+        keys = np.empty(len(s), dtype=object)
+        keys[:] = [key(label) for label in s.array]
+        codes, uniques = pd.factorize(keys)
+        return codes, list(uniques)
+
     def toInternal(self, flags: saqc.DictOfSeries) -> saqc.Flags:
-        """Translate a dict of pandas.Series of json quality annotations
+        """
+        Translate a dict of pandas.Series of json quality annotations
         to a Flags object with a History (with metadata) for each series.
+
+        Every distinct (annotation, measure, userLabel) triple becomes a
+        column of the History, all columns are filled at once.
         """
 
         data = {}
         for key, series in flags.items():  # type: str, pd.Series
-            df: pd.DataFrame = self.fromSTAannotations(series)
-            history = saqc.core.History(index=df.index)
-            for (anno, measure, user_label), values in df.groupby(
-                ["annotation", "measure", "userLabel"]
-            ):
-                column = pd.Series(np.nan, index=df.index)
-                column.loc[values.index] = self(anno)
-                kwargs = {"label": user_label}
-                history.append(column, meta={"func": measure, "kwargs": kwargs})
-            data[key] = history
+            codes, groups = self._annotationKeys(series)
+            hist = np.full((len(series), len(groups)), np.nan)
+            rows = np.flatnonzero(codes >= 0)
+            values = np.array([self(anno) for anno, _, _ in groups], dtype=float)
+            hist[rows, codes[rows]] = values[codes[rows]]
+            meta = [
+                {"func": measure, "kwargs": {"label": user_label}}
+                for _, measure, user_label in groups
+            ]
+            data[key] = saqc.core.History.createFromData(
+                pd.DataFrame(hist, index=series.index), meta
+            )
         return saqc.Flags(data)
 
     def toExternal(
@@ -74,7 +105,11 @@ class STAMPLATEScheme(saqc.FloatScheme):
     ) -> saqc.DictOfSeries:
         """
         Translate from internal Flags object with multiple Histories (with metadata)
-        to a dict of pandas.Dataframes, each with QUALITY_COLUMNS.
+        to a dict of pandas.Series with json quality annotations.
+
+        The measure and label of a row are taken from the last History column
+        that flagged it. One annotation is built per distinct combination of
+        flag and column and shared by all rows of that combination.
         """
         UNFLAGGED = saqc.UNFLAGGED  # noqa
         out = saqc.DictOfSeries()
@@ -82,30 +117,42 @@ class STAMPLATEScheme(saqc.FloatScheme):
         tflags = super().toExternal(flags, attrs=attrs)
         for field in tflags.columns:
             series: pd.Series = tflags[field]
-            # The df has the index from series.
-            df = pd.DataFrame(
-                {
-                    "annotationType": "SaQC",
-                    "annotation": series,
-                    "version": saqc.__version__,
-                    "measure": "",  # filled below
-                    "userLabel": "",  # filled below
-                }
-            )
+            history = flags.history[field]
+            ncols = len(history.columns)
+            if not ncols:
+                continue
 
-            assert set(df.columns) == set(QUALITY_COLUMNS)
+            hist = history.hist.to_numpy(dtype=float)
+            valid = (hist != UNFLAGGED) & ~np.isnan(hist)
+            # position of the last column that flagged a row, -1 for none
+            last = ncols - 1 - np.argmax(valid[:, ::-1], axis=1)
+            last[~valid.any(axis=1)] = -1
 
-            history = flags.history[field]
-            for col in history.columns:
-                # We map the meta entries (func and label) to the respective rows
-                valid = (history.hist[col] != UNFLAGGED) & history.hist[col].notna()
-                meta = history.meta[col]
-                df.loc[valid, "measure"] = meta["func"]
-                df.loc[valid, "userLabel"] = meta["kwargs"].get("label", None)
-                series = pd.Series(index=df.index, dtype=object)
-                if not df.empty:
-                    series = df.apply(self.toSTAannotations, axis=1)
-                out[field] = series
+            flag_codes, flag_values = pd.factorize(series, use_na_sentinel=False)
+            combined = flag_codes * (ncols + 1) + (last + 1)
+            uniques, inverse = np.unique(combined, return_inverse=True)
+
+            templates = np.empty(len(uniques), dtype=object)
+            for i, code in enumerate(uniques):
+                flag, col = divmod(int(code), ncols + 1)
+                measure, user_label = "", ""
+                if col > 0:
+                    meta = history.meta[col - 1]
+                    measure = meta["func"]
+                    user_label = meta["kwargs"].get("label", None)
+                templates[i] = self.toSTAannotations(
+                    {
+                        "annotationType": "SaQC",
+                        "annotation": flag_values[flag],
+                        "version": saqc.__version__,
+                        "measure": measure,
+                        "userLabel": user_label,
+                    }
+                )
+
+            out[field] = pd.Series(
+                templates[inverse.reshape(-1)], index=series.index, dtype=object
+            )
 
         return out
 
@@ -163,3 +210,77 @@ class SaQCWrapper:
         return not self._qc._data[stream.alias].index.equals(
             self._input_data[stream]["data"].index
         )
+
+    def result(self) -> SaQCResult:
+        modified = [s for s in self._input_data if self.data_is_modified(s)]
+        return SaQCResult(
+            data=self.data,
+            input_data=self._input_data,
+            modified=modified,
+            index_modified=[s for s in modified if self.index_is_modified(s)],
+        )
+
+
+class SaQCResult:
+    """
+    Picklable snapshot of a finished QC run, with everything `write_qc_data`
+    needs to know. Results of runs over disjoint streams can be merged.
+    """
+
+    def __init__(
+        self,
+        data: dict[QcFunctionStream, pd.DataFrame],
+        input_data: dict[QcFunctionStream, pd.DataFrame],
+        modified: list[QcFunctionStream],
+        index_modified: list[QcFunctionStream],
+    ):
+        self.data = data
+        self._input_data = input_data
+        self._modified = set(modified)
+        self._index_modified = set(index_modified)
+
+    @classmethod
+    def merge(cls, results: list[SaQCResult]) -> SaQCResult:
+        out = cls({}, {}, [], [])
+        for result in results:
+            out.data.update(result.data)
+            out._input_data.update(result._input_data)
+            out._modified |= result._modified
+            out._index_modified |= result._index_modified
+        return out
+
+    def data_is_modified(self, stream: QcFunctionStream) -> bool:
+        return stream in self._modified
+
+    def index_is_modified(self, stream: QcFunctionStream) -> bool:
+        return stream in self._index_modified
+
+
+class QcExecutionError(Exception):
+    """Executing a QC function failed, `func` is its representation."""
+
+    def __init__(self, func: str, reason: str):
+        super().__init__(func, reason)
+        self.func = func
+        self.reason = reason
+
+    def __str__(self):
+        return f"Executing SaQC function '{self.func}' failed, because of {self.reason}"
+
+
+def execute_functions(
+    data: dict[QcFunctionStream, pd.DataFrame], funcs: list[QcFunction]
+) -> SaQCResult:
+    """
+    Run a chain of QC functions on a separate SaQC instance.
+
+    This is the unit of work of the parallel QC execution, thus arguments
+    and return value must be picklable.
+    """
+    qc = SaQCWrapper(data)
+    for func in funcs:
+        try:
+            qc.execute(func)
+        except Exception as e:
+            raise QcExecutionError(repr(func), str(e)) from e
+    return qc.result()
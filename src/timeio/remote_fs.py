@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 import abc
+import io
+import json
 import logging
 import os
+import queue
 import stat
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
 from typing import IO, Any
 from contextlib import contextmanager
@@ -24,6 +29,9 @@ from timeio.journaling import Journal
 journal = Journal("CronJob")
 logger = logging.getLogger("sftp_sync")
 
+# Object in the target bucket, that stores the state of `sync_incremental`
+MANIFEST_PATH = ".sftp-sync/manifest.json"
+
 
 class RemoteFS(abc.ABC):
 
@@ -97,10 +105,17 @@ class MinioFS(RemoteFS):
     ) -> None:
         self.cl = client
         self.bucket_name = bucket_name
-        self._get_files()
+        self._files: dict[str, MinioObject] | None = None
+
+    @property
+    def files(self) -> dict[str, MinioObject]:
+        # Listing a large bucket is expensive, so we only do it on demand
+        if self._files is None:
+            self._get_files()
+        return self._files
 
     def _get_files(self):
-        self.files = {
+        self._files = {
             file.object_name: file
             for file in self.cl.list_objects(self.bucket_name, recursive=True)
         }
@@ -123,9 +138,44 @@ class MinioFS(RemoteFS):
             raise FileNotFoundError(path)
         return time.mktime(self.files[path].last_modified.timetuple())
 
-    def put(self, path: str, fo: IO[bytes], size: int):
+    def put(self, path: str, fo: IO[bytes], size: int, part_size: int = 0) -> str:
+        """
+        Upload `size` bytes from `fo` and return the ETag of the object.
+
+        Objects larger than `part_size` are uploaded in parts, see
+        `minio.Minio.put_object`.
+        """
+        result = self.cl.put_object(
+            bucket_name=self.bucket_name,
+            object_name=path,
+            data=fo,
+            length=size,
+            part_size=part_size,
+        )
+        return result.etag
+
+    def get_json(self, path: str) -> Any:
+        """Return the decoded JSON object at `path` or None if it does not exist."""
+        try:
+            resp = self.cl.get_object(bucket_name=self.bucket_name, object_name=path)
+        except minio.S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return json.loads(resp.data)
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def put_json(self, path: str, obj: Any) -> None:
+        data = json.dumps(obj).encode()
         self.cl.put_object(
-            bucket_name=self.bucket_name, object_name=path, data=fo, length=size
+            bucket_name=self.bucket_name,
+            object_name=path,
+            data=io.BytesIO(data),
+            length=len(data),
+            content_type="application/json",
         )
 
     @contextmanager
@@ -164,6 +214,7 @@ class FtpFS(RemoteFS):
         path,
         keyfile_path=None,
         missing_host_key_policy: MissingHostKeyPolicy | None = None,
+        list_files: bool = True,
     ) -> FtpFS:
         # with urlparse(uri, scheme="sftp") the uri
         # is interpreted as relative path
@@ -193,17 +244,81 @@ class FtpFS(RemoteFS):
             timeout=10,
         )
         cl = ssh.open_sftp()
-        return cls(connection=ssh, client=cl, path=path)
+        return cls(connection=ssh, client=cl, path=path, list_files=list_files)
 
     def __init__(
-        self, connection: SSHClient, client: SFTPClient, path: str = "."
+        self,
+        connection: SSHClient,
+        client: SFTPClient,
+        path: str = ".",
+        list_files: bool = True,
     ) -> None:
         self.connection = connection
         self.client = client
         self.path = path
         self.files = {}
         self.client.chdir(self.path)
-        self._get_files()
+        if list_files:
+            self._get_files()
+
+    def open_channel(self) -> SFTPClient:
+        """Open an additional SFTP session on the same SSH connection."""
+        client = self.connection.open_sftp()
+        client.chdir(self.client.getcwd())
+        return client
+
+    def scan(
+        self,
+        known_dirs: dict[str, list[float]],
+        settled_before: float,
+        path: str = "",
+    ) -> tuple[dict[str, SFTPAttributes], dict[str, list[float]]]:
+        """
+        List all files recursively, but skip subtrees known to be unchanged.
+
+        A directory is not listed again, if its mtime equals the one in
+        `known_dirs` and the latest mtime found in its subtree during the
+        last scan is older than `settled_before`. Note that the mtime of a
+        directory only changes if direct entries are added or removed.
+
+        Returns the found files and all directories with their mtime and
+        the latest mtime of their subtree, for use as `known_dirs` later on.
+        """
+        files, dirs, skipped = {}, {}, set()
+        self._scan(path, known_dirs, settled_before, files, dirs, skipped)
+        # keep the directories within skipped subtrees
+        for dir_, known in known_dirs.items():
+            parent = os.path.dirname(dir_)
+            while parent and parent not in skipped:
+                parent = os.path.dirname(parent)
+            if parent:
+                dirs[dir_] = known
+        return files, dirs
+
+    def _scan(self, path, known_dirs, settled_before, files, dirs, skipped) -> float:
+        latest = 0.0
+        for attrs in self.client.listdir_attr(path or "."):
+            file_path = os.path.join(path, attrs.filename)
+            mtime = attrs.st_mtime or 0
+            if not stat.S_ISDIR(attrs.st_mode):
+                files[file_path] = attrs
+                latest = max(latest, mtime)
+                continue
+            known = known_dirs.get(file_path)
+            if known is not None and known[0] == mtime and known[1] < settled_before:
+                logger.debug(f"SKIPPING unchanged directory {file_path}")
+                skipped.add(file_path)
+                subtree_latest = known[1]
+            else:
+                subtree_latest = max(
+                    mtime,
+                    self._scan(
+                        file_path, known_dirs, settled_before, files, dirs, skipped
+                    ),
+                )
+            dirs[file_path] = [mtime, subtree_latest]
+            latest = max(latest, subtree_latest)
+        return latest
 
     def _get_files(self, path=""):
         # Note that directories always appear
@@ -294,3 +409,142 @@ def sync(src: RemoteFS, trg: RemoteFS, thing_id: str):
             f"thing {thing_id}",
             thing_id,
         )
+
+
+@dataclass
+class Manifest:
+    """
+    State of the previous runs of `sync_incremental`.
+
+    files: path -> [size, mtime] of the source file and ETag of the object
+    dirs: path -> [mtime, latest mtime in the subtree], see `FtpFS.scan`
+    full_scan: time of the last complete scan of the source
+    """
+
+    files: dict[str, list] = field(default_factory=dict)
+    dirs: dict[str, list[float]] = field(default_factory=dict)
+    full_scan: float = 0.0
+
+    @classmethod
+    def load(cls, trg: MinioFS) -> Manifest:
+        if (obj := trg.get_json(MANIFEST_PATH)) is None:
+            return cls()
+        return cls(obj["files"], obj["dirs"], obj["full_scan"])
+
+    def save(self, trg: MinioFS) -> None:
+        trg.put_json(
+            MANIFEST_PATH,
+            {"files": self.files, "dirs": self.dirs, "full_scan": self.full_scan},
+        )
+
+
+def sync_incremental(
+    src: FtpFS,
+    trg: MinioFS,
+    thing_id: str,
+    workers: int = 4,
+    settle_time: float = 30 * 86400,
+    full_scan_interval: float = 7 * 86400,
+    part_size: int = 16 * 1024 * 1024,
+    checkpoint_interval: float = 60,
+):
+    """
+    Sync an SFTP server to a bucket, based on a manifest of the previous runs.
+
+    Files with the same size and mtime as recorded in the manifest are not
+    compared with the bucket at all. Directory subtrees that did not change
+    for `settle_time` seconds are not even listed again (see `FtpFS.scan`),
+    except on a full scan, which runs every `full_scan_interval` seconds.
+    Files unknown to the manifest (e.g. on the first run) are compared by
+    size and modification time with the objects in the bucket.
+
+    Changed files are transferred concurrently over `workers` SFTP sessions.
+    Files larger than `part_size` are uploaded in parts. The manifest is
+    saved every `checkpoint_interval` seconds and when the sync ends, so an
+    interrupted sync resumes with the files it did not transfer yet.
+    """
+    manifest = Manifest.load(trg)
+    started = time.time()
+    full_scan = started - manifest.full_scan > full_scan_interval
+    path = None
+    try:
+        files, dirs = src.scan(
+            known_dirs={} if full_scan else manifest.dirs,
+            settled_before=started - settle_time,
+        )
+        logger.info(
+            f"{len(files)} files found in source directory "
+            f"({'full' if full_scan else 'incremental'} scan)"
+        )
+
+        todo = []
+        for path, attrs in files.items():
+            size, mtime = attrs.st_size or 0, attrs.st_mtime or 0
+            if (known := manifest.files.get(path)) is not None:
+                if known[:2] == [size, mtime]:
+                    continue
+            elif trg.exist(path) and trg.size(path) == size:
+                if trg.last_modified(path) >= mtime:
+                    manifest.files[path] = [size, mtime, trg.files[path].etag]
+                    continue
+            todo.append((path, size, mtime))
+        logger.info(f"{len(todo)} files to sync")
+
+        channels = queue.Queue()
+
+        def transfer(path: str, size: int) -> str:
+            if channels.empty():
+                channels.put(src.open_channel())
+            client = channels.get()
+            try:
+                logger.debug(f"SYNCING: {path}")
+                with client.open(path, mode="r") as fo:
+                    fo.prefetch(size)
+                    return trg.put(path, fo, size, part_size=part_size)
+            finally:
+                channels.put(client)
+
+        synced = 0
+        pending = {}
+
+        def record(done):
+            nonlocal synced, path
+            for future in done:
+                path, size, mtime = pending.pop(future)
+                manifest.files[path] = [size, mtime, future.result()]
+                synced += 1
+
+        last_checkpoint = time.monotonic()
+        try:
+            with ThreadPoolExecutor(workers) as executor:
+                for item in todo:
+                    if len(pending) >= workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        record(done)
+                    if time.monotonic() - last_checkpoint > checkpoint_interval:
+                        manifest.save(trg)
+                        last_checkpoint = time.monotonic()
+                    pending[executor.submit(transfer, *item[:2])] = item
+                record(list(pending))
+        finally:
+            while not channels.empty():
+                channels.get().close()
+
+        # Only now we know that all files in the scanned
+        # subtrees are synced and these may be skipped later.
+        manifest.dirs = dirs
+        if full_scan:
+            manifest.full_scan = started
+    except Exception:
+        journal.error(
+            f"SFTP sync job failed for path: {path} and for thing {thing_id}", thing_id
+        )
+        raise
+    finally:
+        manifest.save(trg)
+
+    journal.info(
+        f"SFTP sync job ran successfully. {synced} files synced for "
+        f"thing {thing_id}",
+        thing_id,
+    )
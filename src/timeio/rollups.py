@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import logging
+
+from psycopg import Connection, sql
+
+logger = logging.getLogger("rollups")
+
+# Same definition of a flagged observation as in the grafana qaqc.sql,
+# result_quality is either a list of quality objects or a single one.
+_ANNOTATION = """
+    CASE
+        WHEN jsonb_typeof(o.result_quality) = 'array'
+        THEN o.result_quality -> -1 ->> 'annotation'
+        ELSE o.result_quality ->> 'annotation'
+    END
+"""
+
+_COLUMNS = sql.SQL(
+    '"datastream_id", "bucket", "count", "count_number", "min", "max", "mean", '
+    '"last", "last_time", "flagged"'
+)
+
+
+def _hourly_query(schema: sql.Identifier) -> sql.Composed:
+    return sql.SQL("""
+        INSERT INTO {schema}.observation_hourly ({columns})
+        SELECT d.datastream_id, d.bucket, a.*
+        FROM rollup_changes d
+        CROSS JOIN LATERAL (
+            SELECT
+                count(*) AS count,
+                count(o.result_number) AS count_number,
+                min(o.result_number) AS min,
+                max(o.result_number) AS max,
+                avg(o.result_number) AS mean,
+                (array_agg(o.result_number ORDER BY o.result_time DESC))[1] AS last,
+                max(o.result_time) AS last_time,
+                count(*) FILTER (
+                    WHERE {annotation} IS NOT NULL
+                    AND {annotation} NOT IN ('0.0', '-inf')
+                ) AS flagged
+            FROM {schema}.observation o
+            WHERE o.datastream_id = d.datastream_id
+            AND o.result_time >= d.bucket
+            AND o.result_time < d.bucket + interval '1 hour'
+        ) a
+        WHERE a.count > 0
+        """).format(schema=schema, columns=_COLUMNS, annotation=sql.SQL(_ANNOTATION))
+
+
+def _daily_query(schema: sql.Identifier) -> sql.Composed:
+    # The days are aggregated from the hours, the means are weighted
+    # by the number of numerical observations, avg ignores the others.
+    return sql.SQL("""
+        INSERT INTO {schema}.observation_daily ({columns})
+        SELECT
+            h.datastream_id,
+            date_trunc('day', h.bucket, 'UTC'),
+            sum(h.count),
+            sum(h.count_number),
+            min(h.min),
+            max(h.max),
+            sum(h.mean * h.count_number) / nullif(sum(h.count_number), 0),
+            (array_agg(h.last ORDER BY h.bucket DESC))[1],
+            max(h.last_time),
+            sum(h.flagged)
+        FROM {schema}.observation_hourly h
+        JOIN (
+            SELECT DISTINCT datastream_id, date_trunc('day', bucket, 'UTC') AS day
+            FROM rollup_changes
+        ) d ON h.datastream_id = d.datastream_id
+        AND h.bucket >= d.day
+        AND h.bucket < d.day + interval '1 day'
+        GROUP BY h.datastream_id, date_trunc('day', h.bucket, 'UTC')
+        """).format(schema=schema, columns=_COLUMNS)
+
+
+def _delete_query(schema: sql.Identifier, table: str, day: bool) -> sql.Composed:
+    bucket = sql.SQL("date_trunc('day', d.bucket, 'UTC')" if day else "d.bucket")
+    return sql.SQL(
+        "DELETE FROM {schema}.{table} r USING rollup_changes d "
+        "WHERE r.datastream_id = d.datastream_id AND r.bucket = {bucket}"
+    ).format(schema=schema, table=sql.Identifier(table), bucket=bucket)
+
+
+def _backfill(conn: Connection, schema: str, n: int) -> int:
+    """
+    Log all hours of up to `n` datastreams, which are queued in
+    `observation_rollup_backfill` by the migration of existing schemas.
+    Returns the number of dequeued datastreams.
+    """
+    ident = sql.Identifier(schema)
+    with conn.transaction(), conn.cursor() as c:
+        c.execute(
+            "SELECT 1 FROM pg_tables "
+            "WHERE schemaname = %s AND tablename = 'observation_rollup_backfill'",
+            [schema],
+        )
+        if c.fetchone() is None:
+            return 0
+        c.execute(
+            sql.SQL(
+                "DELETE FROM {schema}.observation_rollup_backfill "
+                "WHERE datastream_id IN ("
+                "SELECT datastream_id FROM {schema}.observation_rollup_backfill "
+                "LIMIT %s FOR UPDATE SKIP LOCKED) "
+                "RETURNING datastream_id"
+            ).format(schema=ident),
+            [n],
+        )
+        ids = [i for (i,) in c.fetchall()]
+        if ids:
+            c.execute(
+                sql.SQL(
+                    "INSERT INTO {schema}.observation_rollup_log "
+                    "SELECT DISTINCT datastream_id, "
+                    "date_trunc('hour', result_time, 'UTC') "
+                    "FROM {schema}.observation WHERE datastream_id = ANY(%s) "
+                    "ON CONFLICT DO NOTHING"
+                ).format(schema=ident),
+                [ids],
+            )
+    return len(ids)
+
+
+def _refresh_batch(conn: Connection, schema: sql.Identifier, n: int) -> int:
+    """Recompute the rollups of up to `n` logged hours in one transaction."""
+    with conn.transaction(), conn.cursor() as c:
+        c.execute(
+            "CREATE TEMP TABLE rollup_changes "
+            "(datastream_id bigint, bucket timestamptz) ON COMMIT DROP"
+        )
+        # hours logged concurrently or taken by a concurrent refresh are
+        # left for the next batch
+        c.execute(
+            sql.SQL(
+                "WITH d AS (DELETE FROM {schema}.observation_rollup_log "
+                "WHERE ctid IN (SELECT ctid FROM {schema}.observation_rollup_log "
+                "ORDER BY datastream_id, bucket LIMIT %s FOR UPDATE SKIP LOCKED) "
+                "RETURNING datastream_id, bucket) "
+                "INSERT INTO rollup_changes SELECT * FROM d"
+            ).format(schema=schema),
+            [n],
+        )
+        n_hours = c.rowcount
+        if n_hours:
+            c.execute(_delete_query(schema, "observation_hourly", day=False))
+            c.execute(_hourly_query(schema))
+            c.execute(_delete_query(schema, "observation_daily", day=True))
+            c.execute(_daily_query(schema))
+    return n_hours
+
+
+def refresh_rollups(
+    conn: Connection, schema: str, batch_size: int = 10_000, backfill: int = 1
+) -> int:
+    """
+    Recompute the hourly and daily rollups of all hours in `schema`,
+    which were logged as changed since the last refresh.
+
+    The log is drained in batches of `batch_size` hours with a transaction
+    each, so `conn` must not be inside a transaction already. Before that,
+    the hours of up to `backfill` datastreams of the backfill queue are
+    logged. Returns the number of processed hours.
+    """
+    ident = sql.Identifier(schema)
+    if backfill > 0:
+        _backfill(conn, schema, backfill)
+    n_hours = 0
+    while (n := _refresh_batch(conn, ident, batch_size)) > 0:
+        n_hours += n
+        if n < batch_size:
+            break
+    logger.debug(f"refreshed {n_hours} hours of rollups in schema {schema}")
+    return n_hours
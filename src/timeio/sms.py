@@ -1,3 +1,4 @@
+import hashlib
 import os
 import warnings
 
@@ -6,8 +7,10 @@ import logging
 import json
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from psycopg import sql, Connection, Cursor
-from typing import Union, Dict, Optional, Any
+from typing import Union, Dict, Optional, Any, Iterable, Iterator
+from urllib.error import HTTPError
 from urllib.request import urlopen, Request
 from urllib.parse import urljoin
 from datetime import datetime, timezone
@@ -18,6 +21,9 @@ from timeio.databases import Database
 
 
 class SmsCVSyncer:
+    # bookkeeping of the last sync, to skip unchanged vocabularies
+    state_table = "sms_cv_sync_state"
+
     def __init__(self, cv_api_url, db_conn_str):
         self.file_names = [
             "sms_cv_measured_quantity.json",
@@ -39,6 +45,7 @@ class SmsCVSyncer:
 
         with self.db as conn:
             with conn.cursor() as c:
+                self.create_state_table(c=c)
                 for file_path in file_path_list:
                     with open(file_path, "r") as f:
                         table_dict = json.load(f)
@@ -69,16 +76,19 @@ class SmsCVSyncer:
         headers = {}
         if token:
             headers["X-APIKEY"] = token
-        while True:
-            request = Request(target, headers=headers)
-            response = urlopen(request)
-            data = json.loads(response.read())
+        for _, data in self._iter_pages(target, headers):
             all_data.extend(data["data"])
-            target = data.get("links", {}).get("next", None)
-            if target is None:
-                break
         return all_data
 
+    @staticmethod
+    def _iter_pages(target: str, headers: dict) -> Iterator[tuple[Any, dict]]:
+        """Yield the response and the decoded body of all pages of a listing."""
+        while target is not None:
+            response = urlopen(Request(target, headers=headers))
+            data = json.loads(response.read())
+            yield response, data
+            target = data.get("links", {}).get("next", None)
+
     @staticmethod
     def _remove_id_duplicates(data: list[dict]) -> list[dict]:
         seen = set()
@@ -188,8 +198,8 @@ class SmsCVSyncer:
         create_query = self._table_create_query(table_dict)
         c.execute(create_query)
 
-    def _table_upsert_query(self, table_dict: dict, data: list[dict]) -> sql.Composed:
-
+    @staticmethod
+    def _check_table_dict(table_dict: dict) -> None:
         if "keys" not in table_dict.keys():
             raise KeyError("Missing mandatory top-level field 'keys'")
         if "name" not in table_dict.keys():
@@ -197,6 +207,13 @@ class SmsCVSyncer:
         if "id" not in table_dict["keys"].keys():
             raise KeyError("Missing mandatory field 'id' in 'keys'")
 
+    def _table_upsert_query(self, table_dict: dict, data: list[dict]) -> sql.Composed:
+        warnings.warn(
+            "Deprecated method use SmsCVSyncer._table_merge_query instead",
+            DeprecationWarning,
+        )
+        self._check_table_dict(table_dict)
+
         template = sql.SQL(
             "INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT (id) DO UPDATE SET {excludeds}",
         )
@@ -225,6 +242,108 @@ class SmsCVSyncer:
             ),
         )
 
+    @classmethod
+    def _table_merge_query(cls, table_dict: dict, source: str) -> sql.Composed:
+        """
+        Upsert all rows of the table `source` into the table of `table_dict`.
+
+        Rows are only rewritten, if at least one of their values changed.
+        """
+        cls._check_table_dict(table_dict)
+        table = sql.Identifier(table_dict["name"])
+        columns = list(table_dict["keys"])
+        others = [sql.Identifier(c) for c in columns if c != "id"]
+
+        if others:
+            on_conflict = sql.SQL(
+                "DO UPDATE SET {excludeds} "
+                "WHERE ({current}) IS DISTINCT FROM ({new})"
+            ).format(
+                excludeds=sql.SQL(", ").join(
+                    sql.SQL("{c} = EXCLUDED.{c}").format(c=c) for c in others
+                ),
+                current=sql.SQL(", ").join(
+                    sql.SQL("{t}.{c}").format(t=table, c=c) for c in others
+                ),
+                new=sql.SQL(", ").join(
+                    sql.SQL("EXCLUDED.{c}").format(c=c) for c in others
+                ),
+            )
+        else:
+            on_conflict = sql.SQL("DO NOTHING")
+
+        return sql.SQL(
+            "INSERT INTO {table} ({columns}) SELECT {columns} FROM {source} "
+            "ON CONFLICT (id) {on_conflict}"
+        ).format(
+            table=table,
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+            source=sql.Identifier(source),
+            on_conflict=on_conflict,
+        )
+
+    def _iter_rows(self, pages: Iterator[tuple[Any, dict]], table_dict: dict):
+        """Yield the column values of all items, skipping duplicated ids."""
+        seen = set()
+        for _, data in pages:
+            for item in data["data"]:
+                if item["id"] in seen:
+                    continue
+                seen.add(item["id"])
+                yield tuple(
+                    self.convert_special(self._value_from_dict(item, val["path"]))
+                    for val in table_dict["keys"].values()
+                )
+
+    def create_state_table(self, c: Cursor) -> None:
+        c.execute(
+            sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {table} ("
+                "table_name text PRIMARY KEY, "
+                "etag text, "
+                "last_modified text, "
+                "content_hash text, "
+                "synced_at timestamptz)"
+            ).format(table=sql.Identifier(self.state_table))
+        )
+
+    def _load_state(self, c: Cursor, name: str) -> dict:
+        # an empty (e.g. just recreated) table is always synced
+        c.execute(
+            sql.SQL(
+                "SELECT etag, last_modified, content_hash FROM {table} "
+                "WHERE table_name = %s AND EXISTS (SELECT FROM {cv_table})"
+            ).format(
+                table=sql.Identifier(self.state_table),
+                cv_table=sql.Identifier(name),
+            ),
+            (name,),
+        )
+        r = c.fetchone()
+        if r is None:
+            return {}
+        return dict(zip(("etag", "last_modified", "content_hash"), r))
+
+    def _save_state(self, c: Cursor, name: str, state: dict) -> None:
+        c.execute(
+            sql.SQL(
+                "INSERT INTO {table} "
+                "(table_name, etag, last_modified, content_hash, synced_at) "
+                "VALUES (%s, %s, %s, %s, now()) "
+                "ON CONFLICT (table_name) DO UPDATE SET "
+                "etag = EXCLUDED.etag, "
+                "last_modified = EXCLUDED.last_modified, "
+                "content_hash = EXCLUDED.content_hash, "
+                "synced_at = EXCLUDED.synced_at"
+            ).format(table=sql.Identifier(self.state_table)),
+            (
+                name,
+                state.get("etag"),
+                state.get("last_modified"),
+                state["content_hash"],
+            ),
+        )
+
     def upsert_table(
         self, c: Cursor, url: str, table_dict: dict, token: Optional[str] = None
     ) -> None:
@@ -232,38 +351,121 @@ class SmsCVSyncer:
         updates table based on table_dict (loaded from foo-table.json in ./tables)
         with data queried from target
 
-        query is built by _table_upsert_query()
+        The pages are streamed into a temporary table with COPY and merged
+        into the table by a single query, built by _table_merge_query():
 
-        e.g.:
-        INSERT INTO TABLE foo-table
-            (id, column_b, column_c, ...)
-        VALUES
-            (1, 'foo', 'bar', ...),
-            (2, 'foot', 'bard', ...),
-            ...
+        INSERT INTO foo-table (id, column_b, ...)
+        SELECT id, column_b, ... FROM _sync_foo-table
         ON CONFLICT (id) DO UPDATE SET
             column_b = EXCLUDED.column_b,
-            column_c = EXCLUDED.column_c,
             ...
+        WHERE (foo-table.column_b, ...) IS DISTINCT FROM (EXCLUDED.column_b, ...)
+
+        The table is skipped, if the API reports the vocabulary as not
+        modified since the last sync or if its content hash did not change.
         """
+        self._check_table_dict(table_dict)
         name = table_dict["name"]
-        endpoint = table_dict["endpoint"]
-        data = self.get_data_from_url(url=url, endpoint=endpoint, token=token)
-        data = self._remove_id_duplicates(data)
-        query = self._table_upsert_query(table_dict, data)
+        target = urljoin(url, table_dict["endpoint"])
+        self.logger.info(f"{self.get_utc_str()}: Getting data from {target}")
 
+        state = self._load_state(c, name)
+        headers = {}
+        if token:
+            headers["X-APIKEY"] = token
+        # validators are only stored for single page listings, because
+        # they do not tell anything about the following pages
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        # fetch the first page before the COPY is started, a failing
+        # request in the middle of it would abort the whole transaction
+        pages = self._iter_pages(target, headers)
+        try:
+            first = next(pages)
+        except HTTPError as e:
+            if e.code != 304:
+                raise
+            self.logger.info(f"Table {name} is not modified, skipping")
+            return
+
+        response, data = first
+        new_state = {}
+        if data.get("links", {}).get("next", None) is None:
+            new_state["etag"] = response.headers.get("ETag")
+            new_state["last_modified"] = response.headers.get("Last-Modified")
+
+        def all_pages():
+            yield first
+            yield from pages
+
+        tmp = f"_sync_{name}"
+        columns = sql.SQL(", ").join(map(sql.Identifier, table_dict["keys"]))
+        digest = hashlib.sha256()
+        n_rows = 0
         try:
-            c.execute(query)
-            self.logger.info(f"Data successfully synced to table {name}")
+            c.execute(
+                sql.SQL("CREATE TEMP TABLE {tmp} (LIKE {table}) ON COMMIT DROP").format(
+                    tmp=sql.Identifier(tmp), table=sql.Identifier(name)
+                )
+            )
+            copy_query = sql.SQL("COPY {tmp} ({columns}) FROM STDIN").format(
+                tmp=sql.Identifier(tmp), columns=columns
+            )
+            with c.copy(copy_query) as copy:
+                for row in self._iter_rows(all_pages(), table_dict):
+                    digest.update(repr(row).encode())
+                    copy.write_row(row)
+                    n_rows += 1
+
+            new_state["content_hash"] = digest.hexdigest()
+            if new_state["content_hash"] == state.get("content_hash"):
+                self.logger.info(f"Table {name} is unchanged, skipping")
+            else:
+                c.execute(self._table_merge_query(table_dict, tmp))
+                self.logger.info(
+                    f"Data successfully synced to table {name} ({n_rows} rows)"
+                )
+            c.execute(sql.SQL("DROP TABLE {tmp}").format(tmp=sql.Identifier(tmp)))
+            self._save_state(c, name, new_state)
         except psycopg.Error as e:
             self.logger.error(f"Could not sync data to table {name}:\n{e}")
             raise e
 
 
+# (schema, name) of a relation
+RelationT = tuple[str, str]
+
+
 class SmsMaterializedViewsSyncer:
-    def __init__(self, db_conn_str):
+    # bookkeeping of the last refresh, to skip views with unchanged sources
+    state_table = "sms_view_refresh_state"
+
+    # all relations, views and materialized views depend on
+    _dependencies_query = """
+        SELECT DISTINCT vn.nspname, v.relname, sn.nspname, s.relname, s.relkind
+        FROM pg_rewrite r
+        JOIN pg_class v ON v.oid = r.ev_class
+        JOIN pg_namespace vn ON vn.oid = v.relnamespace
+        JOIN pg_depend d ON d.classid = 'pg_rewrite'::regclass
+            AND d.objid = r.oid
+            AND d.refclassid = 'pg_class'::regclass
+            AND d.refobjid <> v.oid
+        JOIN pg_class s ON s.oid = d.refobjid
+        JOIN pg_namespace sn ON sn.oid = s.relnamespace
+        WHERE v.relkind IN ('v', 'm')
+            AND vn.nspname NOT IN ('pg_catalog', 'information_schema')
+    """
+
+    def __init__(self, db_conn_str, workers: int = 4):
         self.db = Database(db_conn_str)
         self.materialized_views = []
+        self.workers = workers
+        # upstream materialized views and base relations of each view
+        self.upstream: dict[str, set[str]] = {}
+        self.sources: dict[str, set[tuple[RelationT, str]]] = {}
         self.logger = logging.getLogger("sync_sms_views")
 
     def collect_materialized_views(self):
@@ -297,3 +499,236 @@ class SmsMaterializedViewsSyncer:
             self.logger.error(
                 f"Error occurred during refreshing materialized view: {e!r}"
             )
+
+    def collect_dependencies(self):
+        """
+        Resolve the upstream materialized views and the base relations
+        (tables, foreign tables and other materialized views) of all
+        collected views from pg_depend. Plain views are looked through.
+        """
+        edges: dict[RelationT, set[tuple[RelationT, str]]] = {}
+        try:
+            with self.db.connection() as conn:
+                for vs, vn, ss, sn, kind in conn.execute(self._dependencies_query):
+                    edges.setdefault((vs, vn), set()).add(((ss, sn), kind))
+        except psycopg.Error as e:
+            # views without known sources are always refreshed
+            self.logger.error(
+                f"Error occurred during fetching view dependencies: {e!r}"
+            )
+            return self
+
+        views = {("public", v) for v in self.materialized_views}
+
+        def resolve(rel: RelationT, seen: set) -> Iterator[tuple[RelationT, str]]:
+            for src, kind in edges.get(rel, ()):
+                if src in seen:
+                    continue
+                seen.add(src)
+                if kind == "v":
+                    yield from resolve(src, seen)
+                else:
+                    yield src, kind
+
+        for view in views:
+            resolved = set(resolve(view, set()))
+            self.upstream[view[1]] = {src[1] for src, _ in resolved if src in views}
+            self.sources[view[1]] = {r for r in resolved if r[0] not in views}
+        return self
+
+    @staticmethod
+    def _refresh_levels(upstream: dict[str, set[str]]) -> list[list[str]]:
+        """
+        Group the views into levels, which only depend on views of
+        previous levels and thus can be refreshed in parallel.
+        """
+        levels = []
+        done = set()
+        todo = set(upstream)
+        while todo:
+            level = sorted(v for v in todo if upstream[v] & todo <= done)
+            if not level:
+                raise ValueError(f"Cyclic dependencies between views: {todo}")
+            levels.append(level)
+            done.update(level)
+            todo.difference_update(level)
+        return levels
+
+    # column of the foreign tables mapped to the remote system column xmin
+    _remote_xmin_column = "remote_xmin"
+
+    @classmethod
+    def _source_signature_query(
+        cls, source: RelationT, kind: str, columns: Iterable[str] = ()
+    ) -> sql.Composed | None:
+        if kind == "f":
+            # The count changes on deletions, the hashed transaction ids on
+            # inserts and updates. postgres_fdw only ships immutable built-in
+            # functions, so there must not be a cast from xid (which would
+            # be an I/O coercion), then both aggregates run remotely and a
+            # single row is transferred. The remote server needs PG >= 13
+            # for hashxidextended, otherwise the source is always refreshed.
+            if cls._remote_xmin_column not in columns:
+                return None
+            return sql.SQL(
+                "SELECT count(*), sum(hashxidextended({xmin}, 0)) FROM {rel}"
+            ).format(
+                xmin=sql.Identifier(cls._remote_xmin_column),
+                rel=sql.Identifier(*source),
+            )
+        if kind in ("r", "p", "m"):
+            # the file node changes on TRUNCATE, which is not counted
+            return sql.SQL(
+                "SELECT n_tup_ins, n_tup_upd, n_tup_del, pg_relation_filenode(relid) "
+                "FROM pg_stat_user_tables WHERE schemaname = {s} AND relname = {n}"
+            ).format(s=sql.Literal(source[0]), n=sql.Literal(source[1]))
+        return None
+
+    def _source_signature(self, source: RelationT, kind: str) -> str | None:
+        """A string, which changes if the content of `source` changed."""
+        try:
+            with self.db.connection() as conn:
+                columns = ()
+                if kind == "f":
+                    columns = [
+                        c
+                        for (c,) in conn.execute(
+                            "SELECT attname FROM pg_attribute "
+                            "WHERE attrelid = %s::regclass "
+                            "AND attnum > 0 AND NOT attisdropped",
+                            [sql.Identifier(*source).as_string(conn)],
+                        )
+                    ]
+                query = self._source_signature_query(source, kind, columns)
+                if query is None:
+                    return None
+                return repr(conn.execute(query).fetchone())
+        except psycopg.Error as e:
+            self.logger.error(f"Could not check source {source} for changes: {e!r}")
+            return None
+
+    def _refresh_view(self, view: str) -> bool:
+        template = sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}")
+        try:
+            with self.db.connection() as conn:
+                conn.execute(template.format(sql.Identifier(view)))
+        except psycopg.Error as e:
+            self.logger.error(f"Error occurred during refreshing {view}: {e!r}")
+            return False
+        self.logger.info(f"Refreshed materialized view: {view}")
+        return True
+
+    def refresh_changed_views(self) -> list[str]:
+        """
+        Refresh all collected views, whose sources changed since their
+        last refresh, or whose upstream views were refreshed.
+
+        Independent views are refreshed in parallel, each on its own
+        connection. Returns the refreshed views.
+        """
+        table = sql.Identifier(self.state_table)
+        try:
+            with self.db.connection() as conn:
+                conn.execute(
+                    sql.SQL(
+                        "CREATE TABLE IF NOT EXISTS {table} ("
+                        "view_name text PRIMARY KEY, "
+                        "signature text, "
+                        "refreshed_at timestamptz)"
+                    ).format(table=table)
+                )
+                last = dict(
+                    conn.execute(
+                        sql.SQL("SELECT view_name, signature FROM {table}").format(
+                            table=table
+                        )
+                    ).fetchall()
+                )
+        except psycopg.Error as e:
+            self.logger.error(f"Error occurred during fetching refresh state: {e!r}")
+            last = {}
+
+        upstream = {v: self.upstream.get(v, set()) for v in self.materialized_views}
+        refreshed = []
+        with ThreadPoolExecutor(self.workers) as pool:
+            sources = sorted(set().union(*self.sources.values()))
+            checked = dict(
+                zip(sources, pool.map(lambda s: self._source_signature(*s), sources))
+            )
+
+            for level in self._refresh_levels(upstream):
+                signatures = {}
+                for view in filter(self.sources.__contains__, level):
+                    parts = [f"{s}={checked[s]}" for s in sorted(self.sources[view])]
+                    if all(checked[s] is not None for s in self.sources[view]):
+                        signatures[view] = hashlib.sha256(
+                            "\n".join(parts).encode()
+                        ).hexdigest()
+
+                outdated = [
+                    v
+                    for v in level
+                    if v not in signatures
+                    or signatures[v] != last.get(v)
+                    or upstream[v] & set(refreshed)
+                ]
+                for view in set(level) - set(outdated):
+                    self.logger.debug(f"Skipped unchanged materialized view: {view}")
+
+                done = [
+                    v
+                    for v, ok in zip(outdated, pool.map(self._refresh_view, outdated))
+                    if ok
+                ]
+                refreshed.extend(done)
+                if not done:
+                    continue
+                try:
+                    with self.db.connection() as conn:
+                        conn.cursor().executemany(
+                            sql.SQL(
+                                "INSERT INTO {table} "
+                                "(view_name, signature, refreshed_at) "
+                                "VALUES (%s, %s, now()) "
+                                "ON CONFLICT (view_name) DO UPDATE SET "
+                                "signature = EXCLUDED.signature, "
+                                "refreshed_at = EXCLUDED.refreshed_at"
+                            ).format(table=table),
+                            [(v, signatures.get(v)) for v in done],
+                        )
+                except psycopg.Error as e:
+                    self.logger.error(
+                        f"Error occurred during storing refresh state: {e!r}"
+                    )
+        return refreshed
+
+    def refresh_sta_observation_links(self) -> None:
+        """
+        Sync the STA observation links of all thing schemas with the
+        (refreshed) SMS views. Each schema is updated in its own transaction.
+        """
+        query = (
+            "SELECT n.nspname FROM pg_proc p "
+            "JOIN pg_namespace n ON n.oid = p.pronamespace "
+            "WHERE p.proname = 'refresh_sta_observation_link'"
+        )
+        try:
+            with self.db.connection() as conn:
+                schemas = [s for (s,) in conn.execute(query).fetchall()]
+        except psycopg.Error as e:
+            self.logger.error(f"Error occurred during fetching schemas: {e!r}")
+            return
+        template = sql.SQL("SELECT {}.refresh_sta_observation_link()")
+        for schema in schemas:
+            try:
+                with self.db.connection() as conn:
+                    (n,) = conn.execute(
+                        template.format(sql.Identifier(schema))
+                    ).fetchone()
+            except psycopg.Error as e:
+                self.logger.error(
+                    f"Error occurred during refreshing STA links of {schema}: {e!r}"
+                )
+                continue
+            if n:
+                self.logger.info(f"Updated {n} STA observation links of {schema}")
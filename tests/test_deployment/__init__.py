@@ -1,4 +1,8 @@
 #!/usr/bin/env python3
+import os
 import socket
+import sys
 
 LOCAL_DEV = socket.gethostname() != "tsm"
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
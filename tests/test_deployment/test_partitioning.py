@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+import os
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+import pytest
+from dotenv import load_dotenv
+from psycopg import sql
+
+from test_deployment import LOCAL_DEV
+from timeio.partitioning import (
+    DEFAULT,
+    LEGACY,
+    convert_observation,
+    is_partitioned,
+    partition_name,
+)
+from timeio.rollups import refresh_rollups
+
+load_dotenv()
+
+DATABASE_DSN = os.environ.get("DATABASE_ADMIN_DSN")
+if LOCAL_DEV:
+    DATABASE_DSN = DATABASE_DSN.replace("database", "localhost")
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "src", "sql")
+SCHEMA = "test_partitioning"
+OWNER = "test_partitioning_owner"
+
+NOW = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+PAST = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# the legacy partition covers the current month, the first monthly
+# partition is the one of the next month
+NEXT_MONTH = (NOW.replace(day=1, hour=0) + timedelta(days=32)).replace(day=1)
+FUTURE = NEXT_MONTH + timedelta(hours=1)
+
+
+def read_sql(*path: str) -> str:
+    with open(os.path.join(SQL_DIR, *path)) as f:
+        return f.read().replace("{tsm_schema}", SCHEMA)
+
+
+@pytest.fixture
+def conn():
+    """
+    A schema like the one of a thing, with observations of the past and
+    the current month, owned by another role than the one converting it.
+    """
+    with psycopg.connect(DATABASE_DSN, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute(f"DROP ROLE IF EXISTS {OWNER}")
+        conn.execute(f"CREATE ROLE {OWNER} NOLOGIN")
+        conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        with conn.transaction():
+            conn.execute(read_sql("postgres-ddl.sql"))
+            conn.execute(f"ALTER TABLE observation OWNER TO {OWNER}")
+            conn.execute(
+                read_sql("sta_views", "helper_views", "sta_observation_link.sql")
+            )
+            conn.execute(read_sql("sta_views", "observation.sql"))
+            conn.execute(
+                "INSERT INTO thing (id, name, uuid) "
+                "VALUES (1, 'thing', gen_random_uuid())"
+            )
+            conn.execute(
+                "INSERT INTO datastream (id, name, position, thing_id) "
+                "VALUES (1, 'a', 'a', 1), (2, 'b', 'b', 1)"
+            )
+            conn.execute(
+                "INSERT INTO observation "
+                "(result_time, result_type, result_number, datastream_id) "
+                "SELECT t, 0, extract(hour FROM t), ds "
+                "FROM generate_series(%s, %s, interval '30 minutes') t, "
+                "(VALUES (1), (2)) d(ds)",
+                [PAST, PAST + timedelta(days=2)],
+            )
+            conn.execute(
+                "INSERT INTO observation "
+                "(result_time, result_type, result_number, datastream_id) "
+                "VALUES (%s, 0, 1.0, 1)",
+                [NOW - timedelta(hours=1)],
+            )
+            # the SMS links are stored directly, the schema has none
+            conn.execute(
+                "INSERT INTO sta_observation_link "
+                "(datastream_id, begin_time, action_id, is_dynamic, "
+                "device_property_id, feature_id) "
+                "VALUES (1, %s, 1, FALSE, 10, 100)",
+                [PAST],
+            )
+        refresh_rollups(conn, SCHEMA)
+        yield conn
+        conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.execute(f"DROP ROLE {OWNER}")
+
+
+def upsert(conn, rows: list[tuple[datetime, float, int]]):
+    conn.execute(
+        "INSERT INTO observation "
+        "(result_time, result_type, result_number, datastream_id) "
+        "SELECT t, 0, v, ds FROM unnest(%s::timestamptz[], %s::float8[], "
+        "%s::bigint[]) r(t, v, ds) "
+        "ON CONFLICT (datastream_id, result_time) "
+        "DO UPDATE SET result_number = EXCLUDED.result_number",
+        [list(c) for c in zip(*rows)],
+    )
+
+
+def test_convert_populated_schema(conn):
+    conn.execute(
+        'CREATE TEMP TABLE observations_before AS SELECT * FROM "OBSERVATIONS"'
+    )
+    (n_before,) = conn.execute("SELECT count(*) FROM observation").fetchone()
+
+    assert convert_observation(conn, SCHEMA, months_ahead=1) is True
+    conn.execute(f"SET search_path TO {SCHEMA}, public")
+    assert is_partitioned(conn, SCHEMA)
+    assert conn.execute("SELECT count(*) FROM observation").fetchone() == (n_before,)
+
+    # all partitions belong to the owner of the table
+    owners = dict(
+        conn.execute(
+            "SELECT c.relname, pg_get_userbyid(c.relowner) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'observation'::regclass"
+        ).fetchall()
+    )
+    assert {LEGACY, DEFAULT, partition_name(NEXT_MONTH)} <= set(owners)
+    assert set(owners.values()) == {OWNER}
+
+    # "OBSERVATIONS" is bound to the partitioned table
+    extra, missing = conn.execute(
+        "SELECT "
+        '(SELECT count(*) FROM (TABLE "OBSERVATIONS" '
+        "EXCEPT ALL TABLE observations_before) d), "
+        "(SELECT count(*) FROM (TABLE observations_before "
+        'EXCEPT ALL TABLE "OBSERVATIONS") d)'
+    ).fetchone()
+    assert (extra, missing) == (0, 0)
+
+    # upserts update rows of the legacy partition and insert new rows
+    # into the monthly partitions
+    upsert(conn, [(PAST, 42.0, 1), (FUTURE, 7.0, 1), (FUTURE, 8.0, 2)])
+    rows = conn.execute(
+        "SELECT tableoid::regclass::text, datastream_id, result_number "
+        "FROM observation WHERE result_time IN (%s, %s) "
+        "ORDER BY result_time, datastream_id",
+        [PAST, FUTURE],
+    ).fetchall()
+    assert rows == [
+        (LEGACY, 1, 42.0),
+        (LEGACY, 2, 0.0),
+        (partition_name(NEXT_MONTH), 1, 7.0),
+        (partition_name(NEXT_MONTH), 2, 8.0),
+    ]
+    upsert(conn, [(FUTURE, 9.0, 1)])
+
+    # the rollup triggers log the changed hours of all partitions
+    logged = conn.execute(
+        "SELECT datastream_id, bucket FROM observation_rollup_log "
+        "ORDER BY bucket, datastream_id"
+    ).fetchall()
+    assert logged == [(1, PAST), (1, FUTURE), (2, FUTURE)]
+    assert refresh_rollups(conn, SCHEMA) == 3
+    hourly = conn.execute(
+        "SELECT datastream_id, bucket, count, mean FROM observation_hourly "
+        "WHERE bucket IN (%s, %s) ORDER BY bucket, datastream_id",
+        [PAST, FUTURE],
+    ).fetchall()
+    assert hourly == [
+        (1, PAST, 2, 21.0),
+        (2, PAST, 2, 0.0),
+        (1, FUTURE, 1, 9.0),
+        (2, FUTURE, 1, 8.0),
+    ]
+
+    # new observations of linked datastreams show up in "OBSERVATIONS"
+    new = conn.execute(
+        'SELECT "RESULT_NUMBER" FROM "OBSERVATIONS" '
+        'WHERE "PHENOMENON_TIME_START" = %s',
+        [FUTURE],
+    ).fetchall()
+    assert new == [(9.0,)]
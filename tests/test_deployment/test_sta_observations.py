@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+import os
+
+import psycopg
+import pytest
+from dotenv import load_dotenv
+from psycopg import sql
+
+from test_deployment import LOCAL_DEV
+
+load_dotenv()
+
+DATABASE_DSN = os.environ.get("DATABASE_ADMIN_DSN")
+if LOCAL_DEV:
+    DATABASE_DSN = DATABASE_DSN.replace("database", "localhost")
+
+# The observations of the SMS datastream links, joined per observation
+# like the former helper view obs_ts_action_type_coord did, before the
+# links were stored in the table sta_observation_link.
+REFERENCE_OBSERVATIONS = """
+WITH xyz AS (
+    SELECT DISTINCT
+        dsl_main.datastream_id AS main_datastream_id,
+        dsl_x.datastream_id AS x_datastream_id,
+        dsl_y.datastream_id AS y_datastream_id,
+        dsl_z.datastream_id AS z_datastream_id
+    FROM public.sms_configuration_dynamic_location_begin_action dla
+        JOIN public.sms_device_mount_action dma
+            ON dma.configuration_id = dla.configuration_id
+        JOIN public.sms_datastream_link dsl_main
+            ON dsl_main.device_mount_action_id = dma.id
+            AND dsl_main.datasource_id = {schema}
+        JOIN public.sms_datastream_link dsl_x
+            ON dsl_x.device_mount_action_id = dma.id
+            AND dsl_x.device_property_id = dla.x_property_id
+        JOIN public.sms_datastream_link dsl_y
+            ON dsl_y.device_mount_action_id = dma.id
+            AND dsl_y.device_property_id = dla.y_property_id
+        LEFT JOIN public.sms_datastream_link dsl_z
+            ON dsl_z.device_mount_action_id = dma.id
+            AND dsl_z.device_property_id = dla.z_property_id
+)
+SELECT
+    o.id,
+    dsl.device_property_id,
+    hashtextextended(
+        CONCAT(ARRAY[sla.x, sla.y, COALESCE(sla.z, 0)]::text, sla.id, FALSE), 0
+    )
+FROM public.sms_configuration_static_location_begin_action sla
+    JOIN public.sms_device_mount_action dma
+        ON dma.configuration_id = sla.configuration_id
+    JOIN public.sms_configuration c ON c.id = dma.configuration_id AND c.is_public
+    JOIN public.sms_device d ON d.id = dma.device_id AND d.is_public
+    JOIN public.sms_datastream_link dsl
+        ON dsl.device_mount_action_id = dma.id AND dsl.datasource_id = {schema}
+    JOIN observation o ON o.datastream_id = dsl.datastream_id
+WHERE o.result_time >= sla.begin_date
+    AND (sla.end_date IS NULL OR o.result_time <= sla.end_date)
+    AND o.result_time >= dsl.begin_date
+    AND (dsl.end_date IS NULL OR o.result_time <= dsl.end_date)
+UNION ALL
+SELECT
+    o.id,
+    dsl.device_property_id,
+    hashtextextended(
+        CONCAT(
+            ARRAY[ox.result_number, oy.result_number, COALESCE(oz.result_number, 0)]::text,
+            dla.id,
+            TRUE
+        ),
+        0
+    )
+FROM public.sms_configuration_dynamic_location_begin_action dla
+    JOIN public.sms_device_mount_action dma
+        ON dma.configuration_id = dla.configuration_id
+    JOIN public.sms_configuration c ON c.id = dma.configuration_id AND c.is_public
+    JOIN public.sms_device d ON d.id = dma.device_id AND d.is_public
+    JOIN public.sms_datastream_link dsl
+        ON dsl.device_mount_action_id = dma.id AND dsl.datasource_id = {schema}
+    JOIN observation o ON o.datastream_id = dsl.datastream_id
+    JOIN xyz ON xyz.main_datastream_id = o.datastream_id
+    JOIN observation ox
+        ON ox.datastream_id = xyz.x_datastream_id AND ox.result_time = o.result_time
+    JOIN observation oy
+        ON oy.datastream_id = xyz.y_datastream_id AND oy.result_time = o.result_time
+    LEFT JOIN observation oz
+        ON oz.datastream_id = xyz.z_datastream_id AND oz.result_time = o.result_time
+WHERE o.result_time >= dsl.begin_date
+    AND (dsl.end_date IS NULL OR o.result_time <= dsl.end_date)
+"""
+
+
+def get_sta_schemas():
+    with psycopg.connect(DATABASE_DSN) as conn:
+        rows = conn.execute(
+            "SELECT table_schema FROM information_schema.tables "
+            "WHERE table_name = 'sta_observation_link'"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize("schema", get_sta_schemas())
+def test_observations_match_reference(schema):
+    reference = sql.SQL(REFERENCE_OBSERVATIONS).format(schema=sql.Literal(schema))
+    observations = sql.SQL(
+        'SELECT "ID", "DATASTREAM_ID", "FEATURE_ID" FROM "OBSERVATIONS"'
+    )
+    query = sql.SQL(
+        "SELECT (SELECT count(*) FROM (({0}) EXCEPT ALL ({1})) d), "
+        "(SELECT count(*) FROM (({1}) EXCEPT ALL ({0})) d)"
+    ).format(observations, reference)
+    with psycopg.connect(DATABASE_DSN) as conn:
+        conn.execute(
+            sql.SQL("SET search_path TO {schema}").format(schema=sql.Identifier(schema))
+        )
+        extra, missing = conn.execute(query).fetchone()
+    assert (extra, missing) == (0, 0)
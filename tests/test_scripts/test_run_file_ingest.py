@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
 import pytest
 
+import run_file_ingest
 from run_file_ingest import ParserJobHandler
+from timeio.errors import ParsingError
+from timeio.parse_status import ParseStatusIndex
 
 
 @pytest.mark.parametrize(
@@ -29,3 +35,138 @@ def test__ParserJobHandler_is_valid_event(content, expected):
 def test__ParserJobHandler_is_valid_event__raises(content, expected):
     with pytest.raises(type(expected), match=str(expected)):
         ParserJobHandler.is_valid_event(content)
+
+
+class FakeParseStatusIndex(ParseStatusIndex):
+    def __init__(self):
+        self.rows = {}
+
+    def lookup(self, bucket, object_name):
+        versions = self.rows.get((bucket, object_name))
+        if not versions:
+            return None
+        return max(
+            versions.values(),
+            key=lambda v: (v.parsing_status == "successful", v.last_modified),
+        )
+
+    def record(self, bucket, object_name, versions):
+        rows = self.rows.setdefault((bucket, object_name), {})
+        for v in versions:
+            rows[v.version_id] = v
+
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def fake_minio(tags: dict):
+    """A Minio client with the versions v1, v2 of f.csv and the given tags."""
+    versions = [
+        MagicMock(object_name=name, version_id=vid, is_delete_marker=False)
+        for name, vid in [("f.csv", "v1"), ("f.csv", "v2"), ("f.csv.bak", "x")]
+    ]
+    for i, v in enumerate(versions):
+        v.last_modified = T0 + timedelta(days=i)
+    minio = MagicMock()
+    minio.list_objects.return_value = versions
+    minio.get_object_tags.side_effect = lambda b, f, version_id: tags.get(version_id)
+    minio.set_object_tags.side_effect = lambda b, f, t, version_id: tags.update(
+        {version_id: t}
+    )
+    return minio
+
+
+def test__ParserJobHandler_get_parser_id__backfills_index():
+    tags = {
+        "v1": {"parser_id": "p1", "parsing_status": "successful"},
+        "v2": {"parser_id": "p2", "parsing_status": "failed"},
+    }
+    handler = ParserJobHandler.__new__(ParserJobHandler)
+    handler.minio = fake_minio(tags)
+    handler.parse_status = FakeParseStatusIndex()
+
+    assert handler.get_parser_id("bucket", "f.csv") == "p1"
+    assert set(handler.parse_status.rows["bucket", "f.csv"]) == {"v1", "v2"}
+    assert handler.minio.get_object_tags.call_count == 2
+
+    # indexed objects are not looked up in the object store again
+    handler.minio.reset_mock()
+    assert handler.get_parser_id("bucket", "f.csv") == "p1"
+    handler.minio.list_objects.assert_not_called()
+    handler.minio.get_object_tags.assert_not_called()
+
+    # the parsed version is tagged without reading its tags first
+    obj = MagicMock(
+        bucket_name="bucket",
+        object_name="f.csv",
+        version_id="v3",
+        last_modified=T0 + timedelta(days=5),
+    )
+    handler.set_tags(obj, "p3", "successful")
+    assert handler.get_parser_id("bucket", "f.csv") == "p3"
+    handler.minio.get_object_tags.assert_not_called()
+    handler.minio.stat_object.assert_not_called()
+    assert tags["v3"]["parsing_status"] == "successful"
+    assert tags["v3"]["parser_id"] == "p3"
+
+
+def test__ParserJobHandler_set_tags__backfills_unknown_objects():
+    tags = {"v1": {"parser_id": "p1", "parsing_status": "successful"}}
+    handler = ParserJobHandler.__new__(ParserJobHandler)
+    handler.minio = fake_minio(tags)
+    handler.parse_status = FakeParseStatusIndex()
+
+    obj = MagicMock(
+        bucket_name="bucket", object_name="f.csv", version_id="v2", last_modified=T0
+    )
+    handler.set_tags(obj, "p2", "failed")
+    # all versions are indexed, not only the tagged one
+    rows = handler.parse_status.rows["bucket", "f.csv"]
+    assert set(rows) == {"v1", "v2"}
+    assert rows["v2"].parsing_status == "failed"
+    assert handler.get_parser_id("bucket", "f.csv") == "p1"
+
+
+def test__ParserJobHandler_act__late_chunk_fails(monkeypatch):
+    journal = MagicMock()
+    monkeypatch.setattr(run_file_ingest, "journal", journal)
+    rawdata = (
+        "2024-01-01 00:00:00,1\n"
+        "2024-01-01 00:10:00,2\n"
+        # the second chunk has more columns than names
+        "2024-01-01 00:20:00,3,4\n"
+    )
+    thing = MagicMock(uuid="thing-uuid")
+    thing.s3_store.filename_pattern = "*"
+    thing.s3_store.file_parser.file_parser_type.name = "csv"
+    thing.s3_store.file_parser.params = {
+        "delimiter": ",",
+        "names": ["time", "value"],
+        "timestamp_columns": [{"column": 0, "format": "%Y-%m-%d %H:%M:%S"}],
+    }
+    handler = ParserJobHandler.__new__(ParserJobHandler)
+    handler.things = MagicMock(**{"from_s3_bucket_name.return_value": thing})
+    handler.minio = MagicMock()
+    handler.minio.stat_object.return_value = MagicMock(
+        bucket_name="bucket",
+        object_name="f.csv",
+        version_id="v1",
+        last_modified=T0,
+        size=len(rawdata),
+    )
+    handler.minio.get_object.return_value.stream.return_value = [rawdata.encode()]
+    handler.parse_status = FakeParseStatusIndex()
+    handler.dbapi = MagicMock()
+    handler.streaming, handler.chunksize = True, 2
+
+    content = {"EventName": "s3:ObjectCreated:Put", "Key": "bucket/f.csv"}
+    with pytest.raises(ParsingError):
+        handler.act(content, MagicMock())
+
+    # the first chunk is stored, the file is tagged as failed and the
+    # user is told about the stored rows
+    (call,) = handler.dbapi.upsert_observations_and_datastreams.call_args_list
+    assert [o["result_number"] for o in call.args[1]] == [1, 2]
+    assert handler.parse_status.lookup("bucket", "f.csv").parsing_status == "failed"
+    (message, _), _ = journal.error.call_args
+    assert message.endswith("Data rows stored before the failure: 2")
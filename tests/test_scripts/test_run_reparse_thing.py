@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+import run_reparse_thing
+from run_reparse_thing import _Checkpoint, _utc, reparse_bulk
+
+FILES = {
+    "a.csv": "2024-01-01 00:00:00,1.0\n2024-01-01 00:10:00,2.0\n",
+    "b.csv": "2024-01-02 00:00:00,3.0\n",
+    "empty.csv": "no timestamp,4.0\n",
+    "c.csv": "2024-01-03 00:00:00,5.0\n",
+}
+
+
+class FakeMinio:
+    def __init__(self, **kwargs):
+        self.tags = {}
+
+    def stat_object(self, bucket, name):
+        return MagicMock(
+            size=len(FILES[name]), version_id=f"{name}-v", last_modified=None
+        )
+
+    def get_object(self, bucket, name, version_id=None):
+        assert version_id == f"{name}-v"
+        return MagicMock(read=lambda: FILES[name].encode())
+
+    def list_objects(self, bucket, prefix, include_version=False):
+        return []
+
+    def set_object_tags(self, bucket, name, tags, version_id=None):
+        assert version_id == f"{name}-v"
+        self.tags[name] = tags
+
+
+@pytest.fixture
+def thing():
+    thing = MagicMock()
+    thing.uuid = "thing-uuid"
+    thing.s3_store.bucket = "bucket"
+    thing.s3_store.file_parser.uuid = "parser-uuid"
+    thing.s3_store.file_parser.file_parser_type.name = "csv"
+    thing.s3_store.file_parser.params = {
+        "delimiter": ",",
+        "header": None,
+        "timestamp_columns": [{"column": 0, "format": "%Y-%m-%d %H:%M:%S"}],
+    }
+    return thing
+
+
+def test_reparse_bulk(thing, tmp_path, monkeypatch):
+    # run the workers as threads of this process
+    monkeypatch.setattr(run_reparse_thing, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(run_reparse_thing, "Minio", FakeMinio)
+    minio, dbapi, index = FakeMinio(), MagicMock(), MagicMock()
+    path = str(tmp_path / "checkpoint.json")
+
+    files = list(FILES) + ["missing.csv"]
+    start, end = reparse_bulk(
+        thing, files, minio, {}, dbapi, index, _Checkpoint(path), 2, 0, 2
+    )
+    assert (start, end) == ("2024-01-01T00:00:00", "2024-01-03T00:00:00")
+
+    # files are stored in batches of at least two observations, only
+    # the last batch may be smaller
+    stored = [
+        c.args[1] for c in dbapi.upsert_observations_and_datastreams.call_args_list
+    ]
+    sizes = [len(obs) for obs in stored]
+    assert all(n >= 2 for n in sizes[:-1])
+    values = sorted(o["result_number"] for obs in stored for o in obs)
+    assert values == [1.0, 2.0, 3.0, 5.0]
+
+    assert set(minio.tags) == {"a.csv", "b.csv", "c.csv"}
+    assert minio.tags["a.csv"]["parsing_status"] == "successful"
+    # the status of the parsed versions is recorded, after a backfill
+    assert index.lookup_or_backfill.call_count == 3
+    assert index.record.call_count == 3
+    recorded = [c.args[2][0] for c in index.record.call_args_list]
+    assert {v.version_id for v in recorded} == {"a.csv-v", "b.csv-v", "c.csv-v"}
+
+    # the failed file keeps the checkpoint, a rerun only retries it
+    with open(path) as f:
+        assert set(json.load(f)["done"]) == set(FILES)
+    dbapi.reset_mock()
+    FILES["missing.csv"] = "2024-01-04 00:00:00,6.0\n"
+    try:
+        reparse_bulk(thing, files, minio, {}, dbapi, index, _Checkpoint(path), 2, 0, 2)
+    finally:
+        del FILES["missing.csv"]
+    (call,) = dbapi.upsert_observations_and_datastreams.call_args_list
+    assert [o["result_number"] for o in call.args[1]] == [6.0]
+    # a complete run removes the checkpoint
+    assert not os.path.exists(path)
+
+
+def test_utc_compares_naive_and_aware_timestamps():
+    # naive timestamps are local time, i.e. 2023-12-31T23:30:00+00:00
+    dates = ["2024-01-01T00:00:00+00:00", "2024-01-01T00:30:00"]
+    assert min(dates, key=_utc) == "2024-01-01T00:30:00"
+    assert max(dates, key=_utc) == "2024-01-01T00:00:00+00:00"
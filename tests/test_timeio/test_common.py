@@ -2,10 +2,12 @@
 
 from unittest import mock, TestCase
 import os
+import threading
+import warnings
 
 import pytest
 
-from timeio.common import get_envvar, get_envvar_as_bool, no_default
+from timeio.common import collect_warnings, get_envvar, get_envvar_as_bool, no_default
 
 TEST_ENV = {
     "VAR_STRING": "test",
@@ -130,3 +132,30 @@ def test_get_envar_as_bool__custom_false_list(value, false_list, expected):
     with mock.patch.dict(os.environ, {"TEST_VAR": value}, clear=True):
         result = get_envvar_as_bool("TEST_VAR", false_list=false_list)
     assert is_equal(result, expected)
+
+
+def test_collect_warnings_per_thread():
+    class MyWarning(UserWarning):
+        pass
+
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def work(name):
+        with collect_warnings(MyWarning) as collected:
+            barrier.wait()
+            for _ in range(3):
+                warnings.warn(name, MyWarning)
+            barrier.wait()
+        results[name] = [str(w.message) for w in collected]
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {"a": ["a"] * 3, "b": ["b"] * 3}
+
+    # outside of a collection the warnings are shown as usual
+    with pytest.warns(MyWarning):
+        warnings.warn("c", MyWarning)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeio.databases import DBapi
+from timeio.parser import CsvParser
+
+
+@pytest.fixture()
+def dbapi(monkeypatch):
+    monkeypatch.setattr(DBapi, "ping_dbapi", lambda self: None)
+
+    def _dbapi(**kwargs):
+        api = DBapi("http://dbapi", "token", **kwargs)
+        api.session = api.idempotent_session = MagicMock()
+        return api
+
+    return _dbapi
+
+
+def _batch(n_rows: int, n_cols: int):
+    df = pd.DataFrame(
+        np.arange(n_rows * n_cols, dtype=float).reshape(n_rows, n_cols),
+        index=pd.date_range("2025-01-01", periods=n_rows, freq="min"),
+    )
+    return CsvParser({}).to_observations(df, origin="test")
+
+
+def _sent_observations(session, compressed=False):
+    result = []
+    for call in session.request.call_args_list:
+        data = call.kwargs["data"]
+        if compressed:
+            data = gzip.decompress(data)
+        result.append(json.loads(data)["observations"])
+    return result
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 10, 1000])
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_upsert_observations_batches(dbapi, batch_size, max_workers):
+    api = dbapi(batch_size=batch_size, max_workers=max_workers)
+    batch = _batch(10, 3)
+    api.upsert_observations("thing", batch)
+
+    sent = _sent_observations(api.session)
+    assert all(len(s) <= batch_size for s in sent)
+    assert len(sent) == -(-len(batch) // batch_size)
+    received = sorted((o for s in sent for o in s), key=json.dumps)
+    assert received == sorted(batch.to_payload(), key=json.dumps)
+
+
+def test_upsert_observations_list(dbapi):
+    api = dbapi(batch_size=4)
+    observations = _batch(5, 2).to_payload()
+    api.upsert_observations("thing", observations)
+    sent = _sent_observations(api.session)
+    assert [len(s) for s in sent] == [4, 4, 2]
+    assert [o for s in sent for o in s] == observations
+
+
+def test_upsert_observations_compressed(dbapi):
+    api = dbapi(compress=True)
+    batch = _batch(5, 2)
+    api.upsert_observations("thing", batch)
+
+    call = api.session.request.call_args
+    assert call.kwargs["headers"]["Content-Encoding"] == "gzip"
+    assert call.kwargs["timeout"] == api.timeout
+    assert _sent_observations(api.session, compressed=True) == [batch.to_payload()]
+
+
+def test_upsert_observations_raises(dbapi):
+    api = dbapi(batch_size=2, max_workers=2)
+    api.session.request.return_value.raise_for_status.side_effect = RuntimeError()
+    with pytest.raises(RuntimeError):
+        api.upsert_observations("thing", _batch(10, 1))
+
+
+def test_only_idempotent_requests_are_retried(dbapi):
+    api = DBapi("http://dbapi", "token")
+    retry = api.session.get_adapter("http://dbapi").max_retries
+    assert not retry.is_retry("POST", 503)
+    assert retry.is_retry("GET", 503)
+    retry = api.idempotent_session.get_adapter("http://dbapi").max_retries
+    assert retry.is_retry("POST", 503)
+
+    api = dbapi()
+    api.session, api.idempotent_session = MagicMock(), MagicMock()
+    api.insert_mqtt_message("thing", {"a": 1})
+    api.upsert_observations("thing", _batch(2, 1))
+    api.upsert_qc_labels("thing", [])
+    assert api.session.request.call_count == 1
+    assert api.idempotent_session.request.call_count == 2
@@ -181,3 +181,41 @@ def test_uba_fetch_api_data(mock_aqi, mock_meas, mock_comps, mock_thing):
     mock_comps.assert_called_once()
     mock_meas.assert_called_once()
     mock_aqi.assert_called_once()
+
+
+@patch("timeio.ext_api.request_with_handling")
+def test_uba_catalogues_are_cached(mock_request, mock_response, monkeypatch):
+    mock_request.return_value = mock_response(
+        data={"data": {"A": [10, 1, "station_1"], "B": [20, 2, "station_2"]}}
+    )
+    now = [0.0]
+    monkeypatch.setattr(ext_api.time, "monotonic", lambda: now[0])
+    syncer = ext_api.UbaApiSyncer(catalogue_ttl=60)
+    assert syncer.get_station_info("station_1") == [{"scope": 10, "component": 1}]
+    assert syncer.get_station_info("station_2") == [{"scope": 20, "component": 2}]
+    assert syncer.get_station_info("station_3") == []
+    assert mock_request.call_count == 1
+    now[0] = 61
+    syncer.get_station_info("station_1")
+    assert mock_request.call_count == 2
+
+
+@patch.object(ext_api.UbaApiSyncer, "get_station_info")
+@patch.object(ext_api.UbaApiSyncer, "request_measure_endpoint")
+def test_uba_combine_measure_responses_keeps_order(mock_req, mock_info):
+    mock_info.return_value = [{"scope": 10, "component": c} for c in range(20)]
+    mock_req.side_effect = lambda station, component, *args: {
+        "k": ["a", "b", component, "2025-01-01 00:00:00"]
+    }
+    syncer = ext_api.UbaApiSyncer(max_workers=4)
+    result = syncer.combine_measure_responses(
+        "station_1",
+        "2025-01-01",
+        "2025-01-02",
+        0,
+        1,
+        {c: f"C{c}" for c in range(20)},
+        {10: "hourly"},
+    )
+    assert [r["value"] for r in result] == list(range(20))
+    assert result[3]["measure"] == "C3 hourly"
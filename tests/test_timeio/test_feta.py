@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import pytest
+
+from timeio import feta
+from timeio.feta import Thing, ThingCache
+
+
+@pytest.fixture()
+def factory(monkeypatch):
+    calls = []
+
+    def from_mqtt_user_name(name, dsn=None):
+        calls.append(name)
+        thing = MagicMock()
+        thing.uuid = f"uuid-{name}"
+        return thing
+
+    monkeypatch.setattr(ThingCache, "_connection", lambda self: None)
+    monkeypatch.setattr(Thing, "from_mqtt_user_name", from_mqtt_user_name)
+    return calls
+
+
+def test_thing_cache_hit(factory):
+    cache = ThingCache("dsn")
+    thing = cache.from_mqtt_user_name("a")
+    assert cache.from_mqtt_user_name("a") is thing
+    assert factory == ["a"]
+
+
+def test_thing_cache_ttl(factory, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(feta.time, "monotonic", lambda: now[0])
+    cache = ThingCache("dsn", ttl=10)
+    cache.from_mqtt_user_name("a")
+    now[0] = 9
+    cache.from_mqtt_user_name("a")
+    now[0] = 11
+    cache.from_mqtt_user_name("a")
+    assert factory == ["a", "a"]
+
+
+def test_thing_cache_maxsize(factory):
+    cache = ThingCache("dsn", maxsize=2)
+    for name in ["a", "b", "a", "c", "a", "b"]:
+        cache.from_mqtt_user_name(name)
+    # 'b' was evicted as least recently used, when 'c' was added
+    assert factory == ["a", "b", "c", "b"]
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ({"thing": "uuid-a"}, ["a", "b", "a"]),
+        ({"uuid": "uuid-b"}, ["a", "b", "b"]),
+        ("garbage", ["a", "b", "a", "b"]),
+    ],
+)
+def test_thing_cache_on_thing_update(factory, content, expected):
+    cache = ThingCache("dsn")
+    cache.from_mqtt_user_name("a")
+    cache.from_mqtt_user_name("b")
+    cache.on_thing_update(content)
+    cache.from_mqtt_user_name("a")
+    cache.from_mqtt_user_name("b")
+    assert factory == expected
+
+
+def test_get_pool(monkeypatch):
+    pool_cls = MagicMock()
+    pool_cls.return_value.closed = False
+    monkeypatch.setattr(feta, "ConnectionPool", pool_cls)
+    monkeypatch.setattr(feta, "_pools", {})
+    pool = feta.get_pool("dsn", max_size=2)
+    assert feta.get_pool("dsn") is pool
+    pool_cls.assert_called_once()
+    assert pool_cls.call_args.kwargs["max_size"] == 2
+    assert pool_cls.call_args.kwargs["kwargs"] == {"autocommit": True}
+
+
+def test_fetch_borrows_from_pool(monkeypatch):
+    pool = feta.ConnectionPool("", open=False)
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"id": 1, "uuid": "uuid-a"}]
+    borrowed = []
+
+    @contextmanager
+    def connection():
+        borrowed.append(conn)
+        yield conn
+        borrowed.remove(conn)
+
+    monkeypatch.setattr(pool, "connection", connection)
+    thing = Thing.from_uuid("uuid-a", dsn=pool)
+    assert thing.uuid == "uuid-a"
+    assert thing._conn is pool
+    assert borrowed == []
+    cursor.execute.assert_called_once()
@@ -215,3 +215,22 @@ def test_organization_create_existing(mock_grafana_api, mock_grafana_organizatio
     org = mock_grafana_organization.create("org_1")
     mock_grafana_api.organization.create_organization.assert_not_called()
     assert org == {"id": 1, "name": "org_1"}
+
+
+def test_dashboard_observation_panel_is_aggregated(mock_grafana_dashboard):
+    thing = MagicMock(uuid="thing_uuid")
+    panel = mock_grafana_dashboard._observation_panel(thing, {"uid": "ds"})
+    query = panel["targets"][0]["rawSql"]
+    assert "'thing_uuid'" in query
+    assert "$__interval_ms" in query
+    assert "LIMIT 1000000" not in query
+    overridden = [o["matcher"]["options"] for o in panel["fieldConfig"]["overrides"]]
+    assert overridden == ["B", "max", "min"]
+
+
+def test_dashboard_observation_sql_reads_rollups(mock_grafana_dashboard):
+    query = mock_grafana_dashboard._observation_sql("thing_uuid")
+    assert "FROM observation_hourly" in query
+    assert "FROM observation_daily" in query
+    # the means of the rollups are weighted by their numerical values
+    assert query.count("sum(r.mean * r.count_number)") == 2
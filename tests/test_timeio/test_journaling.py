@@ -0,0 +1,72 @@
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from timeio.journaling import Journal
+
+
+@pytest.fixture
+def journal_env(monkeypatch):
+    monkeypatch.setenv("JOURNALING", "true")
+    monkeypatch.setenv("DB_API_BASE_URL", "http://fake-db")
+    monkeypatch.setenv("DB_API_AUTH_TOKEN", "token")
+
+
+def test_background_journal(journal_env):
+    posted = []
+    release = threading.Event()
+
+    def urlopen(req, timeout):
+        assert timeout == 10
+        if isinstance(req, str):
+            # the health check holds the writer until all messages are queued
+            release.wait()
+            resp = MagicMock(status=200)
+            resp.__enter__.return_value = resp
+            return resp
+        posted.append((req.full_url, json.loads(req.data)))
+        return MagicMock(status=200)
+
+    with patch("timeio.journaling.request.urlopen", side_effect=urlopen) as mock:
+        journal = Journal("Test", background=True)
+        mock.assert_not_called()
+
+        for _ in range(3):
+            journal.warning("flaky value", "a")
+        journal.warning("flaky value", "b")
+        journal.error("broken", "a")
+        # not merged with the first run, that would reorder the journal
+        journal.warning("flaky value", "a")
+        assert posted == []
+
+        release.set()
+        assert journal.flush(timeout=5)
+
+    assert [(url, data["level"], data["message"]) for url, data in posted] == [
+        (
+            "http://fake-db/things/a/journal",
+            "WARNING",
+            "flaky value (repeated 3 times)",
+        ),
+        ("http://fake-db/things/b/journal", "WARNING", "flaky value"),
+        ("http://fake-db/things/a/journal", "ERROR", "broken"),
+        ("http://fake-db/things/a/journal", "WARNING", "flaky value"),
+    ]
+
+
+def test_background_journal_drops_when_full(journal_env, monkeypatch):
+    monkeypatch.setenv("JOURNAL_QUEUE_SIZE", "2")
+    release = threading.Event()
+    with patch("timeio.journaling.request.urlopen") as mock:
+        resp = mock.return_value
+        resp.status = 200
+        resp.__enter__.side_effect = lambda: release.wait() and resp
+        journal = Journal("Test", background=True)
+        for i in range(5):
+            journal.info(f"message {i}", "a")
+        assert journal._dropped == 3
+        release.set()
+        assert journal.flush(timeout=5)
+    assert mock.call_count == 1 + 2
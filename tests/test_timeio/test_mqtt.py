@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import asyncio
+import socket
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from paho.mqtt.client import MQTTMessage
+
+from timeio.errors import UserInputError
+from timeio.mqtt import AbstractHandler, AsyncAbstractHandler, _OrderedWorkerPool
+
+
+class Handler(AbstractHandler):
+    def __init__(self):
+        super().__init__(
+            topic="topic/#",
+            mqtt_broker="broker:1883",
+            mqtt_user="user",
+            mqtt_password="pw",
+            mqtt_client_id="cid",
+            mqtt_qos=1,
+            mqtt_clean_session=False,
+        )
+        self.mqtt_client = MagicMock()
+        self.handled = []
+
+    def ordering_key(self, content, message):
+        return content["key"]
+
+    def act(self, content, message):
+        time.sleep(content["sleep"])
+        self.handled.append((content["key"], content["n"]))
+
+
+def _message(mid, payload):
+    msg = MQTTMessage(mid=mid, topic=b"topic/a")
+    msg.qos = 1
+    msg.payload = payload.encode()
+    return msg
+
+
+def test_ordered_worker_pool_keeps_order_per_key():
+    pool = _OrderedWorkerPool(max_workers=4, queue_size=2)
+    result = {"a": [], "b": []}
+    for i in range(20):
+        key = "ab"[i % 2]
+        pool.submit(key, lambda k, n: result[k].append(n), key, i)
+    pool.shutdown()
+    assert result == {"a": list(range(0, 20, 2)), "b": list(range(1, 20, 2))}
+
+
+def test_ordered_worker_pool_runs_keys_concurrently():
+    pool = _OrderedWorkerPool(max_workers=2, queue_size=1)
+    barrier = threading.Barrier(2, timeout=5)
+    # deadlocks (BrokenBarrierError) if both keys run in the same worker
+    keys = ["a", "b"]
+    while hash(keys[0]) % 2 == hash(keys[1]) % 2:
+        keys[1] += "b"
+    for key in keys:
+        pool.submit(key, barrier.wait)
+    pool.shutdown()
+    assert barrier.n_waiting == 0 and not barrier.broken
+
+
+def test_handler_with_workers_acks_after_act(monkeypatch):
+    monkeypatch.setenv("MQTT_WORKERS", "2")
+    handler = Handler()
+    handler._pool = _OrderedWorkerPool(handler._workers, 10)
+    handler.on_message(
+        handler.mqtt_client, None, _message(1, '{"key": "a", "n": 1, "sleep": 0.2}')
+    )
+    handler.on_message(
+        handler.mqtt_client, None, _message(2, '{"key": "a", "n": 2, "sleep": 0}')
+    )
+    handler.mqtt_client.ack.assert_not_called()
+    handler._pool.shutdown()
+    assert handler.handled == [("a", 1), ("a", 2)]
+    assert [c.args for c in handler.mqtt_client.ack.call_args_list] == [(1, 1), (2, 1)]
+
+
+class AsyncHandler(AsyncAbstractHandler):
+    def __init__(self):
+        super().__init__(
+            topic="topic/#",
+            mqtt_broker="broker:1883",
+            mqtt_user="user",
+            mqtt_password="pw",
+            mqtt_client_id="cid",
+            mqtt_qos=1,
+            mqtt_clean_session=False,
+        )
+        self.mqtt_client = MagicMock()
+        self.handled = []
+        self.running = 0
+        self.max_running = 0
+
+    def ordering_key(self, content, message):
+        return content["key"]
+
+    async def act(self, content, message):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(content["sleep"])
+        self.running -= 1
+        self.handled.append((content["key"], content["n"]))
+
+
+def test_async_handler(monkeypatch):
+    monkeypatch.setenv("MQTT_CONCURRENCY", "3")
+    handler = AsyncHandler()
+
+    async def main():
+        handler._init_loop()
+        for n in range(8):
+            key = "a" if n < 2 else f"k{n}"
+            sleep = 0.05 if n == 0 else 0.01
+            payload = f'{{"key": "{key}", "n": {n}, "sleep": {sleep}}}'
+            handler.on_message(handler.mqtt_client, None, _message(n + 1, payload))
+        handler.mqtt_client.ack.assert_not_called()
+        await asyncio.gather(*handler._tasks)
+
+    asyncio.run(main())
+    assert handler.max_running == 3
+    assert len(handler.handled) == 8
+    # same key, processed in order, although the first one took longer
+    assert [n for k, n in handler.handled if k == "a"] == [0, 1]
+    assert handler.mqtt_client.ack.call_count == 8
+    assert handler._tails == {}
+
+
+def test_async_handler_backpressure(monkeypatch):
+    monkeypatch.setenv("MQTT_CONCURRENCY", "2")
+    handler = AsyncHandler()
+    sock, peer = socket.socketpair()
+
+    async def main():
+        handler._init_loop()
+        handler._on_socket_open(handler.mqtt_client, None, sock)
+        handler._misc.cancel()
+        for n in range(2):
+            payload = f'{{"key": "k{n}", "n": {n}, "sleep": 0.01}}'
+            handler.on_message(handler.mqtt_client, None, _message(n + 1, payload))
+            # the socket is not read, while all slots are taken
+            assert handler._reading is (n == 0)
+        await asyncio.gather(*handler._tasks)
+        await asyncio.sleep(0)
+        assert handler._reading
+        handler._on_socket_close(handler.mqtt_client, None, sock)
+
+    try:
+        asyncio.run(main())
+    finally:
+        sock.close()
+        peer.close()
+    assert not handler._reading
+    assert len(handler.handled) == 2
+
+
+def test_subscription_errors_are_handled_like_act_errors():
+    handler = Handler()
+    handler.enable_manual_ack()
+
+    def callback(content, message):
+        if content["fail"] == "user":
+            raise UserInputError("bad update")
+        raise RuntimeError("unexpected")
+
+    handler.subscribe("topic/a", callback)
+    handler.on_message(handler.mqtt_client, None, _message(1, '{"fail": "user"}'))
+    # user errors are logged, the message is acknowledged
+    assert [c.args for c in handler.mqtt_client.ack.call_args_list] == [(1, 1)]
+    with pytest.raises(SystemExit):
+        handler.on_message(handler.mqtt_client, None, _message(2, '{"fail": "other"}'))
+    assert handler.handled == []
@@ -1,6 +1,7 @@
+import asyncio
 import json
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from paho.mqtt.client import MQTTMessage
 from run_mqtt_ingest import ParseMqttDataHandler
 
@@ -20,10 +21,12 @@ def mock_env(monkeypatch):
     monkeypatch.setenv("TOPIC_DATA_PARSED", "topic/parsed")
 
 
-@patch("run_mqtt_ingest.DBapi")
-@patch("run_mqtt_ingest.Thing")
+@patch("run_mqtt_ingest.AsyncDBapi", return_value=AsyncMock())
+@patch("run_mqtt_ingest.ThingCache")
 @patch("run_mqtt_ingest.get_parser")
-def test_act_parses_and_publishes(mock_get_parser, mock_Thing, mock_DBapi, mock_env):
+def test_act_parses_and_publishes(
+    mock_get_parser, mock_ThingCache, mock_DBapi, mock_env
+):
     handler = ParseMqttDataHandler()
     msg = MQTTMessage(topic=b"user/topic")
     msg.payload = b"{}"
@@ -31,17 +34,16 @@ def test_act_parses_and_publishes(mock_get_parser, mock_Thing, mock_DBapi, mock_
     mock_thing = MagicMock()
     mock_thing.uuid = "UUID"
     mock_thing.mqtt.mqtt_device_type.name = "campbell_cr6"
-    mock_Thing.from_mqtt_user_name.return_value = mock_thing
+    mock_ThingCache.return_value.from_mqtt_user_name.return_value = mock_thing
 
     parser_instance = MagicMock()
     parser_instance.do_parse.return_value = ["parsed"]
     parser_instance.to_observations.return_value = [{"result_number": 1}]
     mock_get_parser.return_value = parser_instance
 
-    handler.dbapi.upsert_observations = MagicMock()
     handler.mqtt_client = MagicMock()
 
-    handler.act({}, msg)
+    asyncio.run(handler.act({}, msg))
 
     handler.dbapi.upsert_observations_and_datastreams.assert_called_once_with(
         "UUID", [{"result_number": 1}], mutable=False
@@ -51,3 +53,59 @@ def test_act_parses_and_publishes(mock_get_parser, mock_Thing, mock_DBapi, mock_
     assert handler.pub_topic in kwargs["topic"] or args[0] == handler.pub_topic
     payload = json.loads(kwargs.get("payload") or args[1])
     assert payload["thing_uuid"] == "UUID"
+
+
+@patch("run_mqtt_ingest.AsyncDBapi", return_value=AsyncMock())
+@patch("run_mqtt_ingest.ThingCache")
+@patch("run_mqtt_ingest.get_parser")
+def test_batching_groups_per_thing_and_acks_after_store(
+    mock_get_parser, mock_ThingCache, mock_DBapi, mock_env, monkeypatch
+):
+    monkeypatch.setenv("MQTT_BATCH_SIZE", "3")
+    monkeypatch.setenv("MQTT_BATCH_WINDOW", "5")
+    handler = ParseMqttDataHandler()
+    handler.mqtt_client = MagicMock()
+
+    def from_mqtt_user_name(name):
+        thing = MagicMock()
+        thing.uuid = f"UUID-{name}"
+        return thing
+
+    mock_ThingCache.return_value.from_mqtt_user_name.side_effect = from_mqtt_user_name
+    parser_instance = MagicMock()
+    parser_instance.do_parse.side_effect = lambda content, origin: content
+    parser_instance.to_observations.side_effect = lambda data, uuid: [data]
+    mock_get_parser.return_value = parser_instance
+
+    messages = []
+
+    async def main():
+        handler._init_loop()
+        for i, user in enumerate(["a", "b", "a"]):
+            msg = MQTTMessage(mid=i + 1, topic=f"mqtt_ingest/{user}/data".encode())
+            msg.qos = 1
+            msg.payload = json.dumps({"n": i}).encode()
+            handler.on_message(handler.mqtt_client, None, msg)
+            messages.append(msg)
+            handler.mqtt_client.ack.assert_not_called()
+            handler.dbapi.upsert_observations_and_datastreams.assert_not_called()
+        await asyncio.gather(*handler._tasks)
+        # the batch is complete, once all messages are queued
+        for _ in range(500):
+            if handler.mqtt_client.ack.called:
+                break
+            await asyncio.sleep(0.01)
+        handler._batcher.cancel()
+
+    asyncio.run(main())
+
+    upserts = handler.dbapi.upsert_observations_and_datastreams.call_args_list
+    assert sorted(c.args for c in upserts) == [
+        ("UUID-a", [{"n": 0}, {"n": 2}]),
+        ("UUID-b", [{"n": 1}]),
+    ]
+    assert handler.dbapi.insert_mqtt_messages.call_count == 2
+    assert handler.mqtt_client.publish.call_count == 2
+    assert [c.args for c in handler.mqtt_client.ack.call_args_list] == [
+        (m.mid, 1) for m in messages
+    ]
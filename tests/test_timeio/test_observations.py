@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeio.observations import ObservationBatch, isoformat
+from timeio.parser import CsvParser
+
+
+@pytest.mark.parametrize(
+    "index",
+    [
+        pd.DatetimeIndex(["2021-09-09 05:45:00", "2021-09-09 06:00:00"]),
+        pd.DatetimeIndex(["2025-09-04 15:32:32.064", "2025-09-04 15:32:33"]),
+        pd.DatetimeIndex(["2025-09-04 15:32:32.000000001"]),
+        pd.DatetimeIndex(
+            ["2025-03-30 00:00:00", "2025-03-30 12:00:00"], tz="Europe/Berlin"
+        ),
+        pd.DatetimeIndex(["2025-01-01 00:00:00"], tz="Asia/Kathmandu"),
+        pd.DatetimeIndex(["2025-01-01 00:00:00"], tz="UTC"),
+        pd.DatetimeIndex([]),
+    ],
+)
+def test_isoformat(index):
+    expected = [ts.isoformat() for ts in index]
+    assert isoformat(index).tolist() == expected
+
+
+def _to_observations_reference(data: pd.DataFrame) -> list[dict]:
+    """Row wise result of the former `PandasParser.to_observations`"""
+    data = data.copy()
+    data.index = data.index.map(lambda ts: ts.isoformat())
+    result = []
+    for col, chunk in reversed(list(data.items())):
+        chunk = chunk.dropna()
+        for ts, val in chunk.items():
+            result.append({"result_time": ts, "datastream_pos": str(col), "v": val})
+    return result
+
+
+def test_to_observations():
+    index = pd.DatetimeIndex(
+        ["2025-01-01 00:00:00", "2025-01-01 00:10:00.5", "2025-01-01 00:20:00"],
+        tz="Europe/Berlin",
+    )
+    df = pd.DataFrame(
+        {
+            "a": [1.5, np.nan, 3.25],
+            "b": [1, 2, 3],
+            "c": [True, False, True],
+            "d": ["x", None, 'q"uote'],
+        },
+        index=index,
+    )
+    batch = CsvParser({}).to_observations(df, origin="test", parser_uuid="uuid")
+    assert isinstance(batch, ObservationBatch)
+
+    expected = _to_observations_reference(df)
+    obs = list(batch)
+    assert len(batch) == len(obs) == len(expected)
+    assert batch.datastream_positions == ["d", "c", "b", "a"]
+    for o, e in zip(obs, expected):
+        assert o["result_time"] == e["result_time"]
+        assert o["datastream_pos"] == e["datastream_pos"]
+        field = {0: "result_number", 1: "result_string"}[o["result_type"]]
+        assert o[field] == e["v"]
+        params = json.loads(o["parameters"])
+        assert params["column_header"] == o["datastream_pos"]
+        assert params["parser_id"] == "uuid"
+
+    assert [batch[i] for i in range(len(batch))] == obs
+    assert batch[-1] == obs[-1]
+    assert batch[1:3] == obs[1:3]
+    assert json.loads(batch.to_json()) == json.loads(json.dumps(obs))
+
+
+def test_to_observations_empty():
+    batch = CsvParser({}).to_observations(
+        pd.DataFrame(index=pd.DatetimeIndex([])), origin="test"
+    )
+    assert len(batch) == 0
+    assert list(batch) == []
+    assert batch.to_json() == "[]"
+
+
+@pytest.mark.parametrize("value", [np.inf, -np.inf])
+def test_to_json_rejects_infinite_values(value):
+    index = pd.DatetimeIndex(["2025-01-01", "2025-01-02"], tz="UTC")
+    parser = CsvParser({})
+    numbers = parser.to_observations(pd.DataFrame({"a": [1.0, value]}, index), "")
+    mixed = parser.to_observations(
+        pd.DataFrame({"a": ["x", value]}, dtype=object, index=index), ""
+    )
+    for batch in (numbers, mixed):
+        # like json.dumps(..., allow_nan=False), as JSON has no infinity
+        with pytest.raises(ValueError):
+            batch.to_json()
+
+
+def test_concat():
+    parser = CsvParser({})
+    frames = [
+        pd.DataFrame(
+            {"a": [1.0, 2.0], "b": ["x", "y"]},
+            index=pd.DatetimeIndex(["2025-01-01", "2025-01-02"], tz="UTC"),
+        ),
+        pd.DataFrame({"a": [3.0]}, index=pd.DatetimeIndex(["2025-01-03"], tz="UTC")),
+    ]
+    batches = [parser.to_observations(df, origin="test") for df in frames]
+    batch = ObservationBatch.concat(batches)
+    assert list(batch) == list(batches[0]) + list(batches[1])
+    assert json.loads(batch.to_json()) == list(batch)
+
+    naive = parser.to_observations(
+        pd.DataFrame({"a": [1.0]}, index=pd.DatetimeIndex(["2025-01-01"])), "test"
+    )
+    with pytest.raises(ValueError):
+        ObservationBatch.concat([batches[0], naive])
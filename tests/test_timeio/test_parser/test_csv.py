@@ -521,3 +521,88 @@ def test_unix_miliseconds_timestamp():
     assert obs[0]["result_time"] == "2026-06-30T22:00:00+00:00"
     assert obs[1]["result_time"] == "2026-07-01T22:00:00+00:00"
     assert obs[2]["result_time"] == "2026-07-02T22:00:00+00:00"
+
+
+def _byte_chunks(rawdata: str, size: int):
+    data = rawdata.encode("utf-8")
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 100])
+@pytest.mark.parametrize("bytesize", [1, 7, 4096])
+@pytest.mark.parametrize(
+    "rawdata, settings",
+    [
+        (RAWDATA_SKIP_WITH_HEADER, {"skiprows": 2, "header": 0, "skipfooter": 2}),
+        (RAWDATA_SKIP_WITH_HEADER, {"header": 2, "skipfooter": 2}),
+        (RAWDATA_SKIP_WITHOUT_HEADER, {"skiprows": 1, "skipfooter": 2}),
+        (RAWDATA_WITH_TZ.replace("\n", "\r\n"), {"header": 0}),
+    ],
+)
+def test_iter_parse(rawdata, settings, chunksize, bytesize):
+    base_settings = {
+        "comment": "#",
+        "delimiter": ",",
+        "decimal": ".",
+        "timestamp_columns": [{"column": 0, "format": "%Y-%m-%d %H:%M:%S%z"}],
+    }
+    if "+01:00" not in rawdata:
+        base_settings["timestamp_columns"][0]["format"] = "%Y-%m-%d %H:%M:%S"
+
+    expected = CsvParser({**base_settings, **settings}).do_parse(
+        rawdata, "project", "thing"
+    )
+
+    parser = CsvParser({**base_settings, **settings})
+    chunks = list(
+        parser.iter_parse(
+            _byte_chunks(rawdata, bytesize), "project", "thing", chunksize=chunksize
+        )
+    )
+    assert all(len(c) <= chunksize for c in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+    assert parser.start_date == expected.index.min().isoformat()
+    assert parser.end_date == expected.index.max().isoformat()
+
+
+def test_iter_parse_empty():
+    parser = CsvParser(
+        {"timestamp_columns": [{"column": 0, "format": "%Y-%m-%d %H:%M:%S"}]}
+    )
+    with pytest.raises(EmptyDataError):
+        list(parser.iter_parse(iter([b""]), "project", "thing"))
+
+
+RAWDATA_DTYPE_DRIFT = """2024-01-01 00:00:00,1,1.5,abc
+2024-01-01 00:10:00,2,2.5,def
+2024-01-01 00:20:00,,err,42
+2024-01-01 00:30:00,4,3.5,
+"""
+
+
+def test_iter_parse_dtype_drift():
+    settings = {
+        "delimiter": ",",
+        "timestamp_columns": [{"column": 0, "format": "%Y-%m-%d %H:%M:%S"}],
+    }
+    expected = CsvParser(settings).do_parse(RAWDATA_DTYPE_DRIFT, "project", "thing")
+
+    parser = CsvParser(settings)
+    first, second = parser.iter_parse(
+        _byte_chunks(RAWDATA_DTYPE_DRIFT, 4096), "project", "thing", chunksize=2
+    )
+    # missing values turn the integers into floats, text turns the
+    # floats into objects and the text column stays an object column
+    assert first.dtypes.tolist() == ["int64", "float64", "object"]
+    assert second.dtypes.tolist() == ["float64", "object", "object"]
+
+    def observations(df):
+        return sorted(
+            (o["result_time"], o["datastream_pos"], o["result_type"], v)
+            for o in parser.to_observations(df, origin="test")
+            for k, v in o.items()
+            if k.startswith("result_") and k not in ("result_time", "result_type")
+        )
+
+    chunked = observations(first) + observations(second)
+    assert sorted(chunked) == observations(expected)
@@ -1,8 +1,12 @@
+import struct
 from pathlib import Path
 
 import pytest
 import pandas as pd
 
+from timeio.errors import ParsingError, ParsingWarning
+from timeio.parser import soilcan_parser
+from timeio.parser.dbd import read_dbd_file
 from timeio.parser.soilcan_parser import SoilcanParser
 
 DBD_FILE = Path(__file__).parent / "data" / "000_20230824T000020.DBD"
@@ -45,3 +49,43 @@ def test_parse_soilcan_header(type, expected):
     parser = SoilcanParser({"type": type, "header": True})
     df = parser.do_parse(rawdata, "project", "thing")
     assert df.columns[:3].to_list() == expected
+
+
+def wrapped_ring_buffer(data: bytes) -> bytes:
+    # let the first table start at record 5 and end at record 4
+    data = bytearray(data)
+    struct.pack_into(">II", data, 0x64, 5, 4)
+    return bytes(data)
+
+
+@pytest.mark.parametrize("header", [True, False])
+@pytest.mark.parametrize(
+    "type", ["operating-parameters", "sensor-data", "weighing-data"]
+)
+@pytest.mark.parametrize("transform", [bytes, wrapped_ring_buffer])
+def test_native_decoding_equals_dump_dbd(type, header, transform):
+    rawdata = transform(DBD_FILE.read_bytes())
+    parser = SoilcanParser({"type": type, "header": header})
+    expected = parser._parse_dumped_data(rawdata, "project", "thing")
+    df = parser.do_parse(rawdata, "project", "thing")
+    pd.testing.assert_frame_equal(df, expected)
+    assert parser.start_date == expected.index.min().isoformat()
+    assert parser.end_date == expected.index.max().isoformat()
+
+
+def test_read_dbd_file():
+    tables = read_dbd_file(DBD_FILE)
+    assert [t.schedule for t in tables] == ["Alarm_G", "Data_10Min_H", "Data_1Min_I"]
+    assert [len(t.records) for t in tables] == [1439, 144, 1439]
+    assert tables[0].channels[4].fmt == "F2"
+
+
+def test_native_decoding_falls_back_to_dump_dbd(monkeypatch):
+    def fail(rawdata):
+        raise ParsingError("unknown format")
+
+    monkeypatch.setattr(soilcan_parser, "read_dbd", fail)
+    parser = SoilcanParser({"type": "sensor-data", "header": False})
+    with pytest.warns(ParsingWarning, match="falling back"):
+        df = parser.do_parse(DBD_FILE.read_bytes(), "project", "thing")
+    assert df.iloc[0, :2].to_list() == [-72.9, -67.1]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from timeio.partitioning import (
+    convert_observation,
+    create_partitions,
+    partition_name,
+    partitions,
+)
+
+UTC = timezone.utc
+
+
+class Result(list):
+    def fetchone(self):
+        return self[0] if self else None
+
+    def fetchall(self):
+        return list(self)
+
+
+def fake_connection(responses: dict):
+    """
+    A connection, which answers each query with the rows of the first
+    key of `responses` found in the query.
+    """
+    queries = []
+
+    def execute(query, params=None):
+        query = query if isinstance(query, str) else query.as_string()
+        queries.append(query)
+        for key, rows in responses.items():
+            if key in query:
+                return Result(rows)
+        return Result()
+
+    conn = MagicMock()
+    conn.execute.side_effect = execute
+    conn.transaction.return_value = nullcontext()
+    return conn, queries
+
+
+BOUNDS = [
+    (
+        "observation_legacy",
+        "FOR VALUES FROM (MINVALUE) TO ('2024-03-01 01:00:00+01')",
+    ),
+    (
+        "observation_p2024_03",
+        "FOR VALUES FROM ('2024-03-01 01:00:00+01') TO ('2024-04-01 02:00:00+02')",
+    ),
+    ("observation_default", "DEFAULT"),
+]
+
+
+def test_partitions():
+    conn, _ = fake_connection({"pg_get_expr": BOUNDS})
+    assert partitions(conn, "my_schema") == {
+        "observation_legacy": (None, datetime(2024, 3, 1, tzinfo=UTC)),
+        "observation_p2024_03": (
+            datetime(2024, 3, 1, tzinfo=UTC),
+            datetime(2024, 4, 1, tzinfo=UTC),
+        ),
+        "observation_default": None,
+    }
+
+
+def test_create_partitions():
+    conn, queries = fake_connection(
+        {
+            "pg_get_expr": BOUNDS,
+            "pg_get_userbyid": [("owner",)],
+            # one month already covered by the legacy partition
+            "date_trunc('month'": [
+                (datetime(2024, 2, 1, tzinfo=UTC),),
+                (datetime(2024, 5, 1, tzinfo=UTC),),
+            ],
+        }
+    )
+    created = create_partitions(conn, "my_schema", months_ahead=1)
+
+    now = datetime.now(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    assert created[0] == "observation_p2024_05"
+    assert partition_name(now) in created
+    assert len(created) == 3
+    assert "observation_p2024_02" not in created
+
+    # each partition belongs to the owner of the table
+    owner = [q for q in queries if q.endswith('OWNER TO "owner"')]
+    assert len(owner) == 3
+    assert owner[0] == 'ALTER TABLE "my_schema"."observation_p2024_05" OWNER TO "owner"'
+
+    attach = [q for q in queries if "ATTACH PARTITION" in q]
+    assert len(attach) == 3
+    assert '"my_schema"."observation_p2024_05"' in attach[0]
+    assert "'2024-05-01 00:00:00+00:00'" in attach[0]
+    assert "'2024-06-01 00:00:00+00:00'" in attach[0]
+    # rows of the new month are moved out of the default partition
+    moves = [q for q in queries if q.startswith("WITH moved")]
+    assert len(moves) == 3
+    assert '"my_schema"."observation_default"' in moves[0]
+
+
+def test_convert_observation_partitioned_already():
+    conn, queries = fake_connection({"relkind FROM pg_class": [("p",)]})
+    assert convert_observation(conn, "my_schema") is False
+    assert len(queries) == 1
+
+
+@pytest.mark.parametrize("empty", [True, False])
+def test_convert_observation(empty):
+    view = "SELECT o.id FROM observation o"
+    conn, queries = fake_connection(
+        {
+            "relkind FROM pg_class": [("r",)],
+            "max(result_time)": [(datetime(2024, 2, 10, tzinfo=UTC),)],
+            "pg_get_userbyid": [("owner", "my_schema.observation_id_seq", empty)],
+            "pg_get_constraintdef": [
+                ("obs_uniq", "u", "UNIQUE (datastream_id, result_time)"),
+                (
+                    "obs_fk",
+                    "f",
+                    "FOREIGN KEY (datastream_id) REFERENCES datastream(id)",
+                ),
+            ],
+            "pg_get_indexdef": [
+                ("idx_result_time", "CREATE INDEX idx_result_time ON observation"),
+            ],
+            "pg_get_triggerdef": [
+                (
+                    "obs_trigger",
+                    "CREATE TRIGGER obs_trigger AFTER INSERT ON observation",
+                ),
+            ],
+            "role_table_grants": [("reader", "SELECT"), ("PUBLIC", "SELECT")],
+            "pg_get_viewdef": [("my_schema", "my_view", "v", view)],
+            "pg_get_expr": [],
+        }
+    )
+    assert convert_observation(conn, "my_schema", months_ahead=0) is True
+
+    def index(prefix: str) -> int:
+        return next(i for i, q in enumerate(queries) if q.startswith(prefix))
+
+    assert index("CREATE INDEX CONCURRENTLY") < index("ALTER TABLE")
+    assert index("LOCK TABLE") < index("ALTER TABLE observation RENAME")
+    rename = index("ALTER TABLE observation RENAME")
+    create = index("CREATE TABLE observation ")
+    assert rename < index('ALTER INDEX "idx_result_time"') < create
+    assert rename < index('DROP TRIGGER "obs_trigger"') < create
+    assert "PARTITION BY RANGE (result_time)" in queries[create]
+    assert create < index('ALTER TABLE observation ADD CONSTRAINT "obs_uniq"')
+    assert create < index("CREATE INDEX idx_result_time ON observation")
+    assert create < index("CREATE TRIGGER obs_trigger")
+    assert 'GRANT SELECT ON observation TO "reader"' in queries
+    assert "GRANT SELECT ON observation TO PUBLIC" in queries
+    assert f'CREATE OR REPLACE VIEW "my_schema"."my_view" AS {view}' in queries
+
+    # the legacy table keeps everything up to the end of the current month
+    check = queries[index("ALTER TABLE")]
+    month = datetime.now(UTC).replace(day=1)
+    cutoff = (
+        month.replace(year=month.year + 1, month=1)
+        if month.month == 12
+        else month.replace(month=month.month + 1)
+    )
+    assert (
+        f"CHECK (result_time < '{cutoff:%Y-%m}-01 00:00:00+00:00'::timestamptz)"
+        in check
+    )
+    if empty:
+        assert 'DROP TABLE "observation_legacy"' in queries
+        assert not any("MINVALUE" in q for q in queries)
+    else:
+        attach = queries[
+            index('ALTER TABLE observation ATTACH PARTITION "observation_legacy"')
+        ]
+        assert "FROM (MINVALUE)" in attach
+    assert index('CREATE TABLE "observation_default" PARTITION OF') > create
+    assert partition_name(month) in queries[-1]
@@ -0,0 +1,129 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from paho.mqtt.client import MQTTMessage
+
+from run_qc import QcHandler
+
+
+@pytest.fixture
+def mock_env(monkeypatch):
+    monkeypatch.setenv("TOPIC", "data_parsed")
+    monkeypatch.setenv("MQTT_BROKER", "broker:1883")
+    monkeypatch.setenv("MQTT_USER", "user")
+    monkeypatch.setenv("MQTT_PASSWORD", "pw")
+    monkeypatch.setenv("MQTT_CLIENT_ID", "cid")
+    monkeypatch.setenv("MQTT_QOS", "1")
+    monkeypatch.setenv("MQTT_CLEAN_SESSION", "true")
+    monkeypatch.setenv("TOPIC_QC_DONE", "qc_done")
+    monkeypatch.setenv("TOPIC_QC_DONE_QOS", "1")
+    monkeypatch.setenv("DATABASE_DSN", "dsn")
+    monkeypatch.setenv("DB_API_BASE_URL", "http://fake-db")
+    monkeypatch.setenv("DB_API_AUTH_TOKEN", "token")
+
+
+def trigger(mid: int, **content) -> MQTTMessage:
+    msg = MQTTMessage(mid=mid, topic=b"data_parsed")
+    msg.qos = 1
+    msg.payload = json.dumps(content).encode()
+    return msg
+
+
+@patch("run_qc.DBapi")
+@patch("run_qc.Database")
+def test_coalesce_triggers(mock_Database, mock_DBapi, mock_env, monkeypatch):
+    monkeypatch.setenv("QC_COALESCE_WINDOW", "600")
+    handler = QcHandler()
+    handler.mqtt_client = MagicMock()
+    handler.run_qc = MagicMock()
+
+    messages = [
+        trigger(
+            1,
+            thing_uuid="a",
+            start_date="2024-01-02T00:00:00+00:00",
+            end_date="2024-01-03T00:00:00+00:00",
+        ),
+        trigger(
+            2,
+            version=2,
+            project_uuid="p",
+            qc_settings_name="s",
+            start_date="2024-01-01T00:00:00+00:00",
+            end_date="2024-01-02T00:00:00+00:00",
+        ),
+        trigger(
+            3,
+            thing_uuid="a",
+            start_date="2024-01-01T00:00:00+00:00",
+            end_date="2024-01-02T12:00:00+00:00",
+        ),
+    ]
+    for msg in messages:
+        handler.on_message(handler.mqtt_client, None, msg)
+
+    handler.run_qc.assert_not_called()
+    handler.mqtt_client.ack.assert_not_called()
+
+    # the maximal latency is exceeded
+    handler.coalesce_max_latency = 0.0
+    for run in handler._next_due():
+        handler._run_pending(run)
+
+    assert [c.args[0] for c in handler.run_qc.call_args_list] == [
+        {
+            "thing_uuid": "a",
+            "start_date": "2024-01-01T00:00:00+00:00",
+            "end_date": "2024-01-03T00:00:00+00:00",
+        },
+        {
+            "version": 2,
+            "project_uuid": "p",
+            "qc_settings_name": "s",
+            "start_date": "2024-01-01T00:00:00+00:00",
+            "end_date": "2024-01-02T00:00:00+00:00",
+        },
+    ]
+    acks = {c.args for c in handler.mqtt_client.ack.call_args_list}
+    assert acks == {(1, 1), (2, 1), (3, 1)}
+    assert not handler._pending
+
+
+@patch("run_qc.DBapi")
+@patch("run_qc.Database")
+def test_no_coalescing_by_default(mock_Database, mock_DBapi, mock_env):
+    handler = QcHandler()
+    handler.mqtt_client = MagicMock()
+    handler.run_qc = MagicMock()
+
+    handler.on_message(handler.mqtt_client, None, trigger(1, thing_uuid="a"))
+    handler.run_qc.assert_called_once_with({"thing_uuid": "a"})
+    assert not handler._pending
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        {"thing_uuid": "a", "start_date": "2024-01-01T00:00:00+00:00"},
+        {"version": 2, "project_uuid": "p", "start_date": "x", "end_date": "y"},
+        {"thing_uuid": "a", "start_date": "no date", "end_date": "no date"},
+        {"version": 3},
+    ],
+)
+@patch("run_qc.DBapi")
+@patch("run_qc.Database")
+def test_malformed_triggers_are_not_coalesced(
+    mock_Database, mock_DBapi, mock_env, monkeypatch, content
+):
+    monkeypatch.setenv("QC_COALESCE_WINDOW", "600")
+    handler = QcHandler()
+    handler.mqtt_client = MagicMock()
+    handler.run_qc = MagicMock(side_effect=ValueError("malformed"))
+    handler._log_act_error = MagicMock()
+
+    handler.on_message(handler.mqtt_client, None, trigger(1, **content))
+    handler.run_qc.assert_called_once_with(content)
+    handler._log_act_error.assert_called_once()
+    handler.mqtt_client.ack.assert_called_once_with(1, 1)
+    assert not handler._pending
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import saqc
+
+from timeio.qc.saqc import STAMPLATEScheme
+
+
+class RowwiseScheme(STAMPLATEScheme):
+    """The former row-wise translation, kept as reference."""
+
+    def toInternal(self, flags):
+        data = {}
+        for key, series in flags.items():
+            df = self.fromSTAannotations(series)
+            history = saqc.core.History(index=df.index)
+            for (anno, measure, user_label), values in df.groupby(
+                ["annotation", "measure", "userLabel"]
+            ):
+                column = pd.Series(np.nan, index=df.index)
+                column.loc[values.index] = self(anno)
+                kwargs = {"label": user_label}
+                history.append(column, meta={"func": measure, "kwargs": kwargs})
+            data[key] = history
+        return saqc.Flags(data)
+
+    def toExternal(self, flags, attrs=None):
+        UNFLAGGED = saqc.UNFLAGGED  # noqa
+        out = saqc.DictOfSeries()
+
+        tflags = super(STAMPLATEScheme, self).toExternal(flags, attrs=attrs)
+        for field in tflags.columns:
+            series = tflags[field]
+            df = pd.DataFrame(
+                {
+                    "annotationType": "SaQC",
+                    "annotation": series,
+                    "version": saqc.__version__,
+                    "measure": "",
+                    "userLabel": "",
+                }
+            )
+            history = flags.history[field]
+            for col in history.columns:
+                valid = (history.hist[col] != UNFLAGGED) & history.hist[col].notna()
+                meta = history.meta[col]
+                df.loc[valid, "measure"] = meta["func"]
+                df.loc[valid, "userLabel"] = meta["kwargs"].get("label", None)
+                series = pd.Series(index=df.index, dtype=object)
+                if not df.empty:
+                    series = df.apply(self.toSTAannotations, axis=1)
+                out[field] = series
+        return out
+
+
+def run_qc(scheme: STAMPLATEScheme, n: int) -> saqc.SaQC:
+    rng = np.random.default_rng(42)
+    index = pd.date_range("2020-01-01", periods=n, freq="1min")
+    data = pd.Series(rng.normal(100, 30, n), index=index)
+    qc = saqc.SaQC(
+        data=saqc.DictOfSeries(a=data, b=data + 10),
+        flags=saqc.DictOfSeries(
+            a=pd.Series(None, index=index), b=pd.Series(None, index=index)
+        ),
+        scheme=scheme,
+    )
+    qc = qc.flagRange("a", min=50, max=150, label="range")
+    qc = qc.flagRange("a", min=20, max=180, flag=99.0, label="wide")
+    qc = qc.flagMissing("b")
+    qc = qc.flagRange("b", min=40, max=160)
+    return qc
+
+
+@pytest.mark.parametrize("n", [0, 1, 500])
+def test_to_external_matches_rowwise(n):
+    flags = run_qc(STAMPLATEScheme(), n)._flags
+    expected = RowwiseScheme().toExternal(flags)
+    result = STAMPLATEScheme().toExternal(flags)
+    assert list(result.keys()) == list(expected.keys())
+    for field in expected.keys():
+        assert result[field].index.equals(expected[field].index)
+        assert result[field].tolist() == expected[field].tolist()
+
+
+def test_to_internal_matches_rowwise():
+    scheme = STAMPLATEScheme()
+    labels = scheme.toExternal(run_qc(scheme, 500)._flags)
+    labels["a"].iloc[:3] = None
+
+    expected = RowwiseScheme().toInternal(labels)
+    result = scheme.toInternal(labels)
+    for field in labels.keys():
+        assert result[field].equals(expected[field])
+        assert sorted(map(str, result.history[field].meta)) == sorted(
+            map(str, expected.history[field].meta)
+        )
+
+
+@pytest.mark.skipif(
+    "TIMEIO_BENCHMARK" not in os.environ, reason="set TIMEIO_BENCHMARK to run"
+)
+def test_benchmark_1m_rows():
+    n = 1_000_000
+    flags = run_qc(STAMPLATEScheme(), n)._flags
+
+    timings = {}
+    for scheme in (RowwiseScheme(), STAMPLATEScheme()):
+        t0 = time.perf_counter()
+        labels = scheme.toExternal(flags)
+        t1 = time.perf_counter()
+        scheme.toInternal(labels)
+        t2 = time.perf_counter()
+        timings[type(scheme).__name__] = (t1 - t0, t2 - t1)
+
+    old, new = timings["RowwiseScheme"], timings["STAMPLATEScheme"]
+    print(
+        f"\ntoExternal: {old[0]:.2f}s -> {new[0]:.2f}s ({old[0] / new[0]:.1f}x)"
+        f"\ntoInternal: {old[1]:.2f}s -> {new[1]:.2f}s ({old[1] / new[1]:.1f}x)"
+    )
+    assert sum(new) < sum(old)
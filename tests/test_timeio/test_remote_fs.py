@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import io
+import stat
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import minio
+from paramiko import SFTPAttributes
+
+from timeio.remote_fs import MANIFEST_PATH, FtpFS, MinioFS, sync_incremental
+
+
+class FakeSftp:
+    """In-memory SFTP client, files maps paths to (mtime, content) or a dir mtime"""
+
+    def __init__(self, files: dict):
+        self.tree = files
+        self.listed = []
+
+    def chdir(self, path):
+        pass
+
+    def getcwd(self):
+        return "/"
+
+    def listdir_attr(self, path):
+        self.listed.append(path)
+        prefix = "" if path == "." else path + "/"
+        result = []
+        for name, entry in self.tree.items():
+            if not name.startswith(prefix) or "/" in name[len(prefix) :]:
+                continue
+            attrs = SFTPAttributes()
+            attrs.filename = name[len(prefix) :]
+            if isinstance(entry, tuple):
+                attrs.st_mode = stat.S_IFREG
+                attrs.st_mtime, attrs.st_size = entry[0], len(entry[1])
+            else:
+                attrs.st_mode = stat.S_IFDIR
+                attrs.st_mtime, attrs.st_size = entry, 0
+            result.append(attrs)
+        return result
+
+    def open(self, path, mode="r"):
+        fo = io.BytesIO(self.tree[path][1])
+        fo.prefetch = lambda size: None
+        return fo
+
+    def close(self):
+        pass
+
+
+class FakeMinio:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        self.objects[object_name] = data.read(length)
+        self.uploads.append(object_name)
+        return SimpleNamespace(etag=f"etag-{object_name}")
+
+    def get_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise minio.S3Error(None, "NoSuchKey", "", "", "", "")
+        return MagicMock(data=self.objects[object_name])
+
+    def list_objects(self, bucket_name, recursive):
+        return []
+
+
+def _sync(tree, client, **kwargs):
+    sftp = FakeSftp(tree)
+    connection = MagicMock()
+    connection.open_sftp.side_effect = lambda: sftp
+    src = FtpFS(connection, sftp, list_files=False)
+    sync_incremental(src, MinioFS(client, "bucket"), "thing", **kwargs)
+    return sftp
+
+
+def test_sync_incremental():
+    tree = {
+        "a": 100.0,
+        "a/1.csv": (100.0, b"1"),
+        "a/b": 100.0,
+        "a/b/2.csv": (100.0, b"22"),
+        "3.csv": (100.0, b"333"),
+    }
+    client = FakeMinio()
+    _sync(tree, client, settle_time=0)
+    assert sorted(client.uploads) == sorted(
+        ["a/1.csv", "a/b/2.csv", "3.csv"] + [MANIFEST_PATH]
+    )
+    assert client.objects["a/b/2.csv"] == b"22"
+
+    # nothing changed, the settled subtree 'a' is not listed again
+    client.uploads.clear()
+    sftp = _sync(tree, client, settle_time=0)
+    assert sftp.listed == ["."]
+    assert client.uploads == [MANIFEST_PATH]
+
+    # changes in the root are detected, settled subtrees are
+    # assumed to be unchanged, if their own mtime did not change
+    client.uploads.clear()
+    tree["3.csv"] = (200.0, b"333")
+    tree["a/b/4.csv"] = (200.0, b"4")
+    tree["a/b"] = 200.0
+    sftp = _sync(tree, client, settle_time=0)
+    assert sftp.listed == ["."]
+    assert sorted(client.uploads) == sorted(["3.csv", MANIFEST_PATH])
+
+    # until the next full scan
+    client.uploads.clear()
+    sftp = _sync(tree, client, settle_time=0, full_scan_interval=-1)
+    assert sftp.listed == [".", "a", "a/b"]
+    assert sorted(client.uploads) == sorted(["a/b/4.csv", MANIFEST_PATH])
+
+
+def test_sync_incremental_lists_active_subtrees():
+    now = time.time()
+    tree = {
+        "a": now - 100,
+        "a/b": now - 100,
+        "a/b/1.csv": (now - 100, b"1"),
+    }
+    client = FakeMinio()
+    _sync(tree, client, settle_time=3600)
+    tree["a/b/2.csv"] = (now, b"2")
+    tree["a/b"] = now
+    client.uploads.clear()
+    sftp = _sync(tree, client, settle_time=3600)
+    assert sftp.listed == [".", "a", "a/b"]
+    assert sorted(client.uploads) == sorted(["a/b/2.csv", MANIFEST_PATH])
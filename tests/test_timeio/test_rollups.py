@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+from contextlib import nullcontext
+from unittest.mock import MagicMock
+
+import pytest
+
+from timeio.rollups import refresh_rollups
+
+
+def fake_connection(changed_hours: list[int], backfill: list[int] | None = None):
+    """
+    A connection, whose log drains return the numbers of `changed_hours`
+    one after another, `backfill` are the queued datastreams or None if
+    the schema has no backfill queue.
+    """
+    queries = []
+    transactions = []
+    changed_hours = list(changed_hours)
+    cursor = MagicMock()
+    cursor.__enter__.return_value = cursor
+
+    def execute(query, params=None):
+        query = query if isinstance(query, str) else query.as_string()
+        queries.append(query)
+        if query.startswith("WITH d AS"):
+            cursor.rowcount = changed_hours.pop(0)
+        elif "FROM pg_tables" in query:
+            cursor.fetchone.return_value = None if backfill is None else (1,)
+        elif "RETURNING datastream_id" in query:
+            cursor.fetchall.return_value = [(i,) for i in backfill]
+
+    cursor.execute.side_effect = execute
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    conn.transaction.side_effect = lambda: transactions.append(1) or nullcontext()
+    return conn, queries, transactions
+
+
+@pytest.mark.parametrize("changed_hours", [0, 3])
+def test_refresh_rollups(changed_hours):
+    conn, queries, _ = fake_connection([changed_hours])
+    assert refresh_rollups(conn, "my_schema") == changed_hours
+
+    statements = [q.split()[0:3] for q in queries[1:]]
+    if changed_hours:
+        # the changed hours are deleted before they are recomputed,
+        # and the days are aggregated from the fresh hours
+        assert statements == [
+            ["CREATE", "TEMP", "TABLE"],
+            ["WITH", "d", "AS"],
+            ["DELETE", "FROM", '"my_schema"."observation_hourly"'],
+            ["INSERT", "INTO", '"my_schema".observation_hourly'],
+            ["DELETE", "FROM", '"my_schema"."observation_daily"'],
+            ["INSERT", "INTO", '"my_schema".observation_daily'],
+        ]
+    else:
+        assert len(statements) == 2
+    assert '"my_schema".observation_rollup_log' in queries[2]
+    assert "LIMIT %s" in queries[2]
+
+
+def test_refresh_rollups_in_batches():
+    conn, queries, transactions = fake_connection([5, 5, 2])
+    assert refresh_rollups(conn, "my_schema", batch_size=5, backfill=0) == 12
+    # one transaction per batch, the last one was not full
+    assert len(transactions) == 3
+    assert len([q for q in queries if q.startswith("WITH d AS")]) == 3
+
+
+@pytest.mark.parametrize("backfill", [[], [1, 2]])
+def test_refresh_rollups_backfill(backfill):
+    conn, queries, _ = fake_connection([0], backfill=backfill)
+    refresh_rollups(conn, "my_schema", backfill=2)
+    logged = [q for q in queries if q.startswith('INSERT INTO "my_schema"')]
+    assert len(logged) == (1 if backfill else 0)
+    # the hours are logged before the log is drained
+    drain = next(i for i, q in enumerate(queries) if q.startswith("WITH d AS"))
+    assert all(queries.index(q) < drain for q in logged)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import json
 import logging
-from unittest.mock import patch
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
 
 import pytest
 
@@ -129,6 +131,7 @@ def test__SmsCvSyncer_table_create_query(data, expected):
     assert result.as_string() == expected
 
 
+@pytest.mark.filterwarnings("ignore:Deprecated method")
 @pytest.mark.parametrize(
     "table_dict, data, expected",
     [
@@ -191,6 +194,7 @@ def test__SmsCvSyncer_table_upsert_query(table_dict, data, expected):
     assert result.as_string() == expected
 
 
+@pytest.mark.filterwarnings("ignore:Deprecated method")
 @pytest.mark.parametrize(
     "table_dict, exception, errmsg",
     [
@@ -253,3 +257,112 @@ def test__SmsCvSyncer_get_data_from_url(the_internet, url, expected):
         result = syncer.get_data_from_url(url, "")
 
     assert result == expected
+
+
+def test__SmsCvSyncer_table_upsert_query__warns_deprecated():
+    syncer = object.__new__(SmsCVSyncer)  # hack to bypass init
+    with pytest.deprecated_call():
+        syncer._table_upsert_query({"name": "foo", "keys": {"id": {}}}, [])
+
+
+def test__SmsCvSyncer_table_merge_query():
+    table_dict = {
+        "name": "some_table",
+        "keys": {"id": {"path": ["id"]}, "term": {"path": ["attributes", "term"]}},
+    }
+    result = SmsCVSyncer._table_merge_query(table_dict, "_sync_some_table")
+    assert result.as_string() == (
+        'INSERT INTO "some_table" ("id", "term") '
+        'SELECT "id", "term" FROM "_sync_some_table" '
+        "ON CONFLICT (id) DO UPDATE SET "
+        '"term" = EXCLUDED."term" '
+        'WHERE ("some_table"."term") IS DISTINCT FROM (EXCLUDED."term")'
+    )
+
+
+class CursorMock:
+    """Records the executed queries and the rows written by COPY."""
+
+    def __init__(self):
+        self.queries = []
+        self.copied = []
+        self.state = None
+
+    def execute(self, query, params=None):
+        query = query.as_string()
+        self.queries.append(query)
+        if query.startswith('INSERT INTO "sms_cv_sync_state"'):
+            self.state = params[1:4]
+
+    def fetchone(self):
+        return self.state
+
+    @contextmanager
+    def copy(self, query):
+        self.queries.append(query.as_string())
+        yield MagicMock(write_row=self.copied.append)
+
+
+TABLE_DICT = {
+    "name": "sms_cv_unit",
+    "endpoint": "units",
+    "keys": {"id": {"path": ["id"]}, "term": {"path": ["attributes", "term"]}},
+}
+
+THE_INTERNET = {
+    "http://cv/units": {
+        "data": [
+            {"id": "1", "attributes": {"term": "m"}},
+            {"id": "2", "attributes": {"term": "s"}},
+        ],
+        "links": {"next": "http://cv/units?page=2"},
+    },
+    "http://cv/units?page=2": {
+        "data": [
+            {"id": "2", "attributes": {"term": "duplicate"}},
+            {"id": "3", "attributes": {"term": "kg"}},
+        ],
+    },
+}
+
+
+def urlopen_mock(req):
+    if req.get_header("If-none-match") == "v1":
+        raise HTTPError(req.full_url, 304, "Not Modified", {}, None)
+    return MagicMock(
+        read=lambda: json.dumps(THE_INTERNET[req.full_url]),
+        headers={"ETag": "v1"},
+    )
+
+
+def test__SmsCvSyncer_upsert_table():
+    syncer = object.__new__(SmsCVSyncer)  # hack to bypass init
+    syncer.logger = logging.getLogger("dummy")
+    c = CursorMock()
+    with patch("timeio.sms.urlopen", urlopen_mock):
+        syncer.upsert_table(c, "http://cv/", TABLE_DICT)
+
+        # the rows are streamed with COPY, without duplicated ids
+        assert 'COPY "_sync_sms_cv_unit" ("id", "term") FROM STDIN' in c.queries
+        assert c.copied == [(1, "m"), (2, "s"), (3, "kg")]
+        assert sum(q.startswith('INSERT INTO "sms_cv_unit"') for q in c.queries) == 1
+        # validators of paginated listings are not stored
+        etag, last_modified, content_hash = c.state
+        assert etag is None and content_hash
+
+        # the content did not change, so nothing is merged
+        c.queries.clear()
+        syncer.upsert_table(c, "http://cv/", TABLE_DICT)
+        assert not any(q.startswith('INSERT INTO "sms_cv_unit"') for q in c.queries)
+        assert c.state[2] == content_hash
+
+
+def test__SmsCvSyncer_upsert_table__not_modified():
+    syncer = object.__new__(SmsCVSyncer)  # hack to bypass init
+    syncer.logger = logging.getLogger("dummy")
+    c = CursorMock()
+    c.state = ("v1", None, "some-hash")
+    with patch("timeio.sms.urlopen", urlopen_mock):
+        syncer.upsert_table(c, "http://cv/", TABLE_DICT)
+    assert c.copied == []
+    assert not any(q.startswith("COPY") for q in c.queries)
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
+import psycopg
 import pytest
 from timeio.sms import SmsMaterializedViewsSyncer
 from psycopg import sql
 
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 # fmt: off
 class ConnOrCursorMock:
@@ -62,3 +63,132 @@ def test_SmsMaterializedViewsSyncer_collect_materialized_views(query_result, exp
             syncer.collect_materialized_views()
 
     assert syncer.materialized_views == expected
+
+
+@pytest.mark.parametrize(
+    "upstream, expected",
+    [
+        ({}, []),
+        ({"a": set(), "b": set()}, [["a", "b"]]),
+        ({"a": set(), "b": {"a"}, "c": set()}, [["a", "c"], ["b"]]),
+        ({"a": {"b"}, "b": {"c"}, "c": set()}, [["c"], ["b"], ["a"]]),
+        # upstream views, which are not refreshed, are ignored
+        ({"a": {"x"}}, [["a"]]),
+    ],
+)
+def test_SmsMaterializedViewsSyncer_refresh_levels(upstream, expected):
+    assert SmsMaterializedViewsSyncer._refresh_levels(upstream) == expected
+
+
+def test_SmsMaterializedViewsSyncer_refresh_levels__raises_on_cycle():
+    with pytest.raises(ValueError, match="Cyclic"):
+        SmsMaterializedViewsSyncer._refresh_levels({"a": {"b"}, "b": {"a"}})
+
+
+def test_SmsMaterializedViewsSyncer_collect_dependencies():
+    edges = [
+        ("public", "sms_a", "public", "foreign_table_sms_a", "f"),
+        ("public", "sms_b", "public", "sms_a", "m"),
+        ("public", "sms_b", "public", "some_view", "v"),
+        ("public", "some_view", "public", "some_table", "r"),
+    ]
+    with patch("psycopg.connect", ConnOrCursorMock):
+        syncer = SmsMaterializedViewsSyncer("host=Fake password=foo")
+        syncer.materialized_views = ["sms_a", "sms_b"]
+        with patch.object(ConnOrCursorMock, "execute", return_value=edges):
+            syncer.collect_dependencies()
+
+    assert syncer.upstream == {"sms_a": set(), "sms_b": {"sms_a"}}
+    assert syncer.sources == {
+        "sms_a": {(("public", "foreign_table_sms_a"), "f")},
+        "sms_b": {(("public", "some_table"), "r")},
+    }
+
+
+class StateConnMock(ConnOrCursorMock):
+    """Keeps the stored refresh state in a class attribute."""
+
+    state = {}
+
+    def execute(self, *args, **kwargs):
+        return MagicMock(fetchall=lambda: list(self.state.items()))
+
+    def cursor(self, *args, **kwargs):
+        return MagicMock(executemany=lambda query, rows: self.state.update(rows))
+
+
+def test_SmsMaterializedViewsSyncer_refresh_changed_views():
+    signatures = {"fa": "1", "fb": "1", "fc": "1"}
+    refreshed = []
+    StateConnMock.state = {}
+    with patch("psycopg.connect", StateConnMock):
+        syncer = SmsMaterializedViewsSyncer("host=Fake password=foo")
+    syncer.materialized_views = ["sms_a", "sms_b", "sms_c"]
+    syncer.upstream = {"sms_a": set(), "sms_b": {"sms_a"}, "sms_c": set()}
+    syncer.sources = {
+        "sms_a": {(("public", "fa"), "f")},
+        "sms_b": {(("public", "fb"), "f")},
+        "sms_c": {(("public", "fc"), "f")},
+    }
+    syncer._source_signature = lambda source, kind: signatures[source[1]]
+    syncer._refresh_view = lambda view: refreshed.append(view) or view != "sms_c"
+
+    with patch("psycopg.connect", StateConnMock):
+        # all views are new, upstream views are refreshed first
+        assert syncer.refresh_changed_views() == ["sms_a", "sms_b"]
+        assert refreshed.index("sms_a") < refreshed.index("sms_b")
+        assert set(StateConnMock.state) == {"sms_a", "sms_b"}
+
+        # the failed view is retried, the others are unchanged
+        refreshed.clear()
+        assert syncer.refresh_changed_views() == []
+        assert refreshed == ["sms_c"]
+
+        # a changed source also refreshes all downstream views
+        signatures["fa"] = "2"
+        assert syncer.refresh_changed_views() == ["sms_a", "sms_b"]
+
+        # sources, which cannot be checked, are always refreshed
+        signatures["fb"] = None
+        assert syncer.refresh_changed_views() == ["sms_b"]
+
+
+def test_SmsMaterializedViewsSyncer_refresh_sta_observation_links():
+    queries = []
+
+    class LinkConnMock(ConnOrCursorMock):
+        def execute(self, query, *args, **kwargs):
+            if isinstance(query, str):
+                return MagicMock(fetchall=lambda: [("schema_a",), ("schema_b",)])
+            queries.append(query.as_string())
+            if "schema_a" in queries[-1]:
+                raise psycopg.errors.UndefinedTable()
+            return MagicMock(fetchone=lambda: (3,))
+
+    with patch("psycopg.connect", LinkConnMock):
+        syncer = SmsMaterializedViewsSyncer("host=Fake password=foo")
+        # a failing schema does not stop the others
+        syncer.refresh_sta_observation_links()
+    assert queries == [
+        'SELECT "schema_a".refresh_sta_observation_link()',
+        'SELECT "schema_b".refresh_sta_observation_link()',
+    ]
+
+
+@pytest.mark.parametrize(
+    "columns, expected",
+    [
+        (
+            ["id", "remote_xmin"],
+            'SELECT count(*), sum(hashxidextended("remote_xmin", 0)) '
+            'FROM "public"."foreign_table_sms_device"',
+        ),
+        # without the remote xmin, the source is always refreshed
+        (["id"], None),
+    ],
+)
+def test_SmsMaterializedViewsSyncer_foreign_table_signature(columns, expected):
+    query = SmsMaterializedViewsSyncer._source_signature_query(
+        ("public", "foreign_table_sms_device"), "f", columns
+    )
+    assert (None if query is None else query.as_string()) == expected